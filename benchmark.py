@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from extractors import extract_departments, extract_doctor_details, extract_listing
+from preprocess_csv import csv_directory, process_csv_directory
+from sitemap import load_registry
+
+# Offline inputs: saved pages and the bundled CSV export
+FIXTURE_DIR = "fixtures"
+DEFAULT_RESULTS_FILE = "benchmark_results.json"
+DEFAULT_BASELINE_FILE = "benchmark_baseline.json"
+
+# A metric regresses when it is this much worse than the baseline (0.10 = 10%)
+DEFAULT_THRESHOLD = 0.10
+
+# Function to read every .html fixture in a directory as (path, bytes) pairs
+def load_pages(directory):
+    pages = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".html"):
+            path = os.path.join(directory, filename)
+            with open(path, "rb") as f:
+                pages.append((path, f.read()))
+    return pages
+
+# Function to time fn over `repeat` runs and keep the fastest, which is the least
+# disturbed by other load on the machine
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Function to measure doctor profile pages/sec of the doctor_detail_script extractor
+def bench_doctor_pages(args):
+    pages = load_pages(os.path.join(FIXTURE_DIR, "doctor_pages"))
+    loops = args.parse_loops
+
+    def run():
+        for _ in range(loops):
+            for path, content in pages:
+                extract_doctor_details(content, path, "Medanta, IN")
+
+    seconds = best_of(run, args.repeat)
+    return {"pages_per_sec": (len(pages) * loops / seconds, "higher")}
+
+# Function to measure pages/sec of the listing extractors doctor_list_script and the
+# department scraper use: the sitemap's doctors list and the speciality cards
+def bench_listing_pages(args):
+    xpath = load_registry()[0]["sections"]["doctors"]
+    with open(os.path.join(FIXTURE_DIR, "sitemap.html"), "rb") as f:
+        sitemap = f.read()
+    speciality = load_pages(os.path.join(FIXTURE_DIR, "speciality_pages"))
+    with open(os.path.join(FIXTURE_DIR, "speciality.html"), "rb") as f:
+        speciality.append(("speciality.html", f.read()))
+    loops = args.parse_loops
+
+    sitemap_seconds = best_of(lambda: [extract_listing(sitemap, xpath) for _ in range(loops)], args.repeat)
+    speciality_seconds = best_of(lambda: [extract_departments(content) for _ in range(loops) for _, content in speciality], args.repeat)
+    return {
+        "sitemap_pages_per_sec": (loops / sitemap_seconds, "higher"),
+        "speciality_pages_per_sec": (len(speciality) * loops / speciality_seconds, "higher"),
+    }
+
+# Function to measure CSV rows/sec of preprocess_csv turning the export into Q/A text
+def bench_preprocess(args):
+    rows = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "training_data.txt")
+
+        def run():
+            nonlocal rows
+            rows, _ = process_csv_directory(csv_directory, output_path, workers=1)
+
+        seconds = best_of(run, args.repeat)
+    return {"rows_per_sec": (rows / seconds, "higher")}
+
+# Function to measure tokens/sec of fine_tunning.load_dataset building the token
+# shards from scratch (a fresh shard directory, so nothing is reused)
+def bench_tokenization(args):
+    from transformers import GPT2Tokenizer
+
+    from fine_tunning import load_dataset, train_path
+    from token_shards import load_index
+
+    tokenizer = GPT2Tokenizer.from_pretrained(args.tokenizer)
+    tokens = 0
+    seconds = None
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as shard_dir:
+            start = time.perf_counter()
+            load_dataset(train_path, tokenizer, shard_dir=shard_dir)
+            elapsed = time.perf_counter() - start
+            tokens = sum(entry["tokens"] for entry in load_index(shard_dir)["files"].values())
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    return {"tokens_per_sec": (tokens / seconds, "higher")}
+
+# Function to measure deployment_model load time and generation latency over a few
+# templated prompts (the lookup index and response cache are not involved). The first,
+# untimed load pays for the imports, which otherwise depend on the benchmark order.
+def bench_generation(args):
+    from deployment_model import DEFAULT_PROMPT, WARMUP_PROMPT, generate_answer, load_model
+
+    load_model(args.model_dir)
+    start = time.perf_counter()
+    model, tokenizer = load_model(args.model_dir)
+    load_seconds = time.perf_counter() - start
+    prompts = [DEFAULT_PROMPT, WARMUP_PROMPT]
+    generate_answer(model, tokenizer, WARMUP_PROMPT, args.max_length)
+
+    latencies = []
+    for _ in range(args.repeat):
+        for prompt in prompts:
+            start = time.perf_counter()
+            generate_answer(model, tokenizer, prompt, args.max_length)
+            latencies.append(time.perf_counter() - start)
+    return {
+        "load_ms": (load_seconds * 1000, "lower"),
+        "latency_median_ms": (statistics.median(latencies) * 1000, "lower"),
+        "latency_mean_ms": (statistics.mean(latencies) * 1000, "lower"),
+    }
+
+BENCHMARKS = {
+    "doctor_pages": bench_doctor_pages,
+    "listing_pages": bench_listing_pages,
+    "preprocess": bench_preprocess,
+    "tokenization": bench_tokenization,
+    "generation": bench_generation,
+}
+
+# Function to run the selected benchmarks; a benchmark that cannot run (missing model,
+# fixtures or package) is reported and left out of the results, where the comparison
+# with a baseline that has its metrics counts them as regressions
+def run_benchmarks(names, args):
+    metrics = {}
+    for name in names:
+        print(f"Running {name}...")
+        try:
+            for metric, (value, better) in BENCHMARKS[name](args).items():
+                metrics[f"{name}.{metric}"] = {"value": value, "better": better}
+        except Exception as e:
+            print(f"Error running benchmark {name}: {e}")
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": list(names),
+        "metrics": metrics,
+    }
+
+def save_results(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Function to compare results with a baseline; returns one row per metric with its
+# relative change (positive = better) and whether it regressed past the threshold.
+# Baseline metrics missing from the results (current value None) are regressions,
+# unless their benchmark was left out of this run with --only.
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    rows = []
+    for metric, current in results["metrics"].items():
+        previous = baseline["metrics"].get(metric)
+        if previous is None or not previous["value"]:
+            rows.append((metric, current["value"], None, None, False))
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["better"] == "lower":
+            change = -change
+        rows.append((metric, current["value"], previous["value"], change, change < -threshold))
+
+    # The benchmark failed, stopped reporting the metric or no longer exists
+    selected = set(results.get("benchmarks", BENCHMARKS))
+    for metric, previous in baseline["metrics"].items():
+        name = metric.split(".", 1)[0]
+        if metric not in results["metrics"] and (name in selected or name not in BENCHMARKS):
+            rows.append((metric, None, previous["value"], None, True))
+    return rows
+
+def print_comparison(rows, threshold):
+    print(f"{'metric':<40} {'current':>12} {'baseline':>12} {'change':>8}")
+    for metric, value, previous, change, regressed in rows:
+        current = f"{value:.1f}" if value is not None else "missing"
+        baseline = f"{previous:.1f}" if previous is not None else "n/a"
+        delta = f"{change:+.1%}" if change is not None else ("new" if value is not None else "-")
+        print(f"{metric:<40} {current:>12} {baseline:>12} {delta:>8}" + ("  REGRESSION" if regressed else ""))
+    regressions = sum(row[4] for row in rows)
+    print(f"{regressions} regression(s) beyond {threshold:.0%}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing, preprocessing, tokenization and generation offline.")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE, help="Where the JSON results are written")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="Stored results to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (the best one is kept)")
+    parser.add_argument("--parse-loops", type=int, default=50, help="Passes over the HTML fixtures per timed run")
+    parser.add_argument("--tokenizer", default="./fine_tuned_gpt2", help="Tokenizer used for the tokenization benchmark")
+    parser.add_argument("--model-dir", default="./fine_tuned_gpt2", help="Model used for the generation benchmark")
+    parser.add_argument("--max-length", type=int, default=50)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args)
+    save_results(results, args.output)
+    print(f"Results saved to {args.output}.")
+
+    if args.update_baseline:
+        save_results(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}.")
+    elif os.path.exists(args.baseline):
+        rows = compare_results(results, load_results(args.baseline), args.threshold)
+        print_comparison(rows, args.threshold)
+        if any(row[4] for row in rows):
+            sys.exit(1)
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one.")
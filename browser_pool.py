@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import functools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+try:
+    import psutil
+except ImportError:  # Browser memory is then not reported
+    psutil = None
+
+# Pages a session serves before its browser is restarted, which bounds its memory growth
+DEFAULT_PAGES_PER_SESSION = 25
+DEFAULT_POOL_SIZE = 3
+
+# Requests the listing pages do not need: images, media, fonts, stylesheets and trackers.
+# Blocked through the DevTools protocol (Network.setBlockedURLs) before any page loads.
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.avif",
+    "*.mp4", "*.webm", "*.mp3",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.css",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+]
+
+# Function to build headless Chrome options: no images, no GPU, and page loads that
+# return at DOMContentLoaded instead of waiting for every subresource
+def headless_options():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    options.page_load_strategy = "eager"
+    return options
+
+# Function to start a headless Chrome with the resource block list installed
+def start_browser(blocked_urls=BLOCKED_URL_PATTERNS):
+    driver = webdriver.Chrome(options=headless_options())
+    if blocked_urls:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(blocked_urls)})
+    return driver
+
+# Function to get the resident memory in MB of every Chrome/chromedriver process
+# started by this process
+def browser_rss_mb():
+    if psutil is None:
+        return None
+    try:
+        children = psutil.Process(os.getpid()).children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for child in children:
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+# Samples browser memory in the background and keeps the peak
+class MemorySampler:
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_mb = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            rss = browser_rss_mb()
+            if rss is not None:
+                self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+# A pooled browser and the number of pages it has served
+class BrowserSession:
+    def __init__(self, blocked_urls):
+        self.driver = start_browser(blocked_urls)
+        self.pages = 0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            pass
+
+# Long-lived headless browsers checked out one page at a time. Sessions start lazily,
+# go back to the pool after each page, and are restarted after pages_per_session pages
+# or when the browser broke during a page.
+class BrowserPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE, pages_per_session=DEFAULT_PAGES_PER_SESSION, blocked_urls=BLOCKED_URL_PATTERNS):
+        self.size = size
+        self.pages_per_session = pages_per_session
+        self.blocked_urls = blocked_urls
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.started = 0
+        self.recycled = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_session(self):
+        session = BrowserSession(self.blocked_urls)
+        with self.lock:
+            self.sessions.append(session)
+            self.started += 1
+        return session
+
+    def _retire(self, session):
+        session.quit()
+        with self.lock:
+            self.sessions.remove(session)
+
+    # Function to check out a browser for one page; yields its WebDriver
+    @contextlib.contextmanager
+    def driver(self):
+        with self.slots:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                session = self._start_session()
+            broken = False
+            try:
+                yield session.driver
+            except WebDriverException:
+                broken = True
+                raise
+            finally:
+                session.pages += 1
+                if not broken and session.pages < self.pages_per_session:
+                    # Leave nothing of the previous page behind for the next one; a
+                    # browser that cannot even do that is replaced
+                    try:
+                        session.driver.delete_all_cookies()
+                        session.driver.get("about:blank")
+                    except WebDriverException:
+                        broken = True
+                if broken or session.pages >= self.pages_per_session:
+                    self._retire(session)
+                    with self.lock:
+                        self.recycled += 1
+                else:
+                    self.idle.put(session)
+
+    # Function to run scrape(url, driver) for every URL, `size` pages at a time;
+    # returns the results in URL order
+    def map(self, scrape, urls):
+        def run(url):
+            with self.driver() as driver:
+                return scrape(url, driver)
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(run, urls))
+
+    def close(self):
+        with self.lock:
+            sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            session.quit()
+        while not self.idle.empty():
+            self.idle.get_nowait()
+
+# Compare the original setup, a plain (windowed, unblocked) Chrome started for every URL,
+# with the pool on the local "Load More" fixture
+if __name__ == "__main__":
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    from departments_list import scrape_links_with_load_more
+
+    parser = argparse.ArgumentParser(description="Compare pages/minute and browser memory of one plain Chrome per URL against a pool of headless sessions.")
+    parser.add_argument("--pages", type=int, default=12, help="Listing pages scraped in each mode")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--pages-per-session", type=int, default=DEFAULT_PAGES_PER_SESSION)
+    parser.add_argument("--fixture-dir", default="fixtures")
+    parser.add_argument("--class-name", default="speciality-title font700")
+    parser.add_argument("--button", default="button.theme-button")
+    args = parser.parse_args()
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=args.fixture_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # A distinct query per page stands in for several hospitals' listings
+    urls = [f"http://127.0.0.1:{server.server_port}/speciality_load_more.html?hospital={i}" for i in range(args.pages)]
+
+    # The baseline as departments_list ran before the pool: a default webdriver.Chrome()
+    # per URL, not start_browser()'s headless, resource-blocking one
+    def scrape_with_plain_chrome(url):
+        driver = webdriver.Chrome()
+        try:
+            return scrape_links_with_load_more(url, args.class_name, args.button, driver=driver)
+        finally:
+            driver.quit()
+
+    results = {}
+    with MemorySampler() as sampler:
+        start = time.perf_counter()
+        links = [scrape_with_plain_chrome(url) for url in urls]
+        results["one Chrome per URL"] = (time.perf_counter() - start, sampler.peak_mb, sum(map(len, links)))
+
+    with MemorySampler() as sampler:
+        start = time.perf_counter()
+        with BrowserPool(args.pool_size, args.pages_per_session) as pool:
+            links = pool.map(lambda url, driver: scrape_links_with_load_more(url, args.class_name, args.button, driver=driver), urls)
+            restarts = pool.recycled
+        results[f"pool of {args.pool_size}"] = (time.perf_counter() - start, sampler.peak_mb, sum(map(len, links)))
+    server.shutdown()
+
+    for mode, (seconds, peak_mb, items) in results.items():
+        memory = f"{peak_mb:.0f} MB" if peak_mb is not None else "n/a"
+        print(f"{mode:<20} {len(urls) / seconds * 60:>7.1f} pages/min  peak browser RSS {memory:>8}  {items} links")
+    print(f"Pool sessions restarted {restarts} times ({args.pages_per_session} pages per session).")
@@ -0,0 +1,162 @@
+import csv
+import io
+import time
+
+from frontier import canonicalize_url, entity_key
+from metrics import get_metrics
+
+# Default number of rows buffered before a COPY round trip
+DEFAULT_BATCH_SIZE = 1000
+
+# Streams rows into a table in batches: COPY into a temporary staging table, then
+# merge with INSERT ... ON CONFLICT (key) DO UPDATE, touching only rows that changed.
+# Use it as a context manager so the last partial batch is flushed on exit.
+# Callbacks registered with after_flush run once the rows added before them are committed.
+class BulkLoader:
+    def __init__(self, conn, table, columns, key, batch_size=DEFAULT_BATCH_SIZE):
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.key = key
+        self.batch_size = batch_size
+        self.staging = f"{table}_staging"
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, quoting=csv.QUOTE_ALL)
+        self.buffered = 0
+        self.rows_loaded = 0
+        self.rows_changed = 0
+        self.seconds = 0.0
+        self.staging_ready = False
+        self.pending_callbacks = []
+
+        column_list = ", ".join(self.columns)
+        updates = [column for column in self.columns if column != key]
+        self.copy_query = f"COPY {self.staging} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+        # Of several staged rows with the same key, the one added last wins
+        self.merge_query = f"""
+        INSERT INTO {table} ({column_list})
+        SELECT DISTINCT ON ({key}) {column_list} FROM {self.staging}
+        ORDER BY {key}, staging_seq DESC
+        ON CONFLICT ({key}) DO UPDATE SET
+            {", ".join(f"{column} = EXCLUDED.{column}" for column in updates)}
+        WHERE ({", ".join(f"{table}.{column}" for column in updates)})
+            IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in updates)});
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def _create_staging_table(self, cur):
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {self.staging} AS "
+            f"SELECT {', '.join(self.columns)} FROM {self.table} WITH NO DATA;"
+        )
+        # Numbers the rows in the order COPY wrote them
+        cur.execute(f"ALTER TABLE {self.staging} ADD COLUMN IF NOT EXISTS staging_seq BIGSERIAL;")
+        self.staging_ready = True
+
+    # Function to queue one row (a tuple in column order), flushing full batches
+    def add(self, row):
+        self.writer.writerow(row)
+        self.buffered += 1
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    # Function to run callback once every row added so far is committed, e.g. to record
+    # a page as seen only after its rows are in the table; dropped if that batch fails
+    def after_flush(self, callback):
+        if self.buffered:
+            self.pending_callbacks.append(callback)
+        else:
+            callback()
+
+    def _run_callbacks(self):
+        callbacks, self.pending_callbacks = self.pending_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    # Function to COPY the buffered rows into staging and merge them into the table
+    def flush(self):
+        if not self.buffered:
+            return
+        start = time.perf_counter()
+        self.buffer.seek(0)
+        try:
+            with self.conn.cursor() as cur:
+                if not self.staging_ready:
+                    self._create_staging_table(cur)
+                cur.execute(f"TRUNCATE {self.staging};")
+                cur.copy_expert(self.copy_query, self.buffer)
+                cur.execute(self.merge_query)
+                changed = cur.rowcount
+            self.conn.commit()
+            self.rows_loaded += self.buffered
+            self.rows_changed += changed
+            metrics = get_metrics()
+            metrics.inc("db_rows_total", self.buffered, table=self.table)
+            metrics.inc("db_rows_changed_total", changed, table=self.table)
+            metrics.observe("db_flush_seconds", time.perf_counter() - start, table=self.table)
+        except Exception:
+            self.conn.rollback()
+            self.staging_ready = False
+            self.pending_callbacks = []
+            raise
+        finally:
+            self.buffered = 0
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        self.seconds += time.perf_counter() - start
+        self._run_callbacks()
+
+    # Function to print rows loaded, rows changed and load throughput
+    def report(self):
+        rate = self.rows_loaded / self.seconds if self.seconds else 0.0
+        metrics = get_metrics()
+        metrics.set("db_rows_per_second", rate, table=self.table)
+        metrics.event("db_load", table=self.table, rows=self.rows_loaded, changed=self.rows_changed, seconds=round(self.seconds, 6), rows_per_sec=round(rate, 1))
+        print(f"Loaded {self.rows_loaded} {self.table} records ({self.rows_changed} new or changed) in {self.seconds:.2f}s ({rate:.0f} rows/sec).")
+
+# Function to bring rows saved from raw hrefs (before links were canonicalized) in line
+# with current loads: one row per entity, keyed by the entity's smallest canonical link
+# (the one the frontier picks). The newest row of an entity is kept, the others are
+# deleted. Returns the number of rows changed or deleted.
+def migrate_canonical_links(conn, table, key):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT id, {key} FROM {table} WHERE {key} IS NOT NULL ORDER BY id;")
+        rows = cur.fetchall()
+
+    entities = {}
+    for row_id, link in rows:
+        url = canonicalize_url(link)
+        entity = entities.setdefault(entity_key(url), {"link": url, "ids": []})
+        entity["link"] = min(entity["link"], url)
+        entity["ids"].append((row_id, link))
+
+    deletes = []
+    updates = []
+    for entity in entities.values():
+        (newest, link), older = entity["ids"][-1], entity["ids"][:-1]
+        deletes += [row_id for row_id, _ in older]
+        if link != entity["link"]:
+            updates.append((entity["link"], newest))
+    if not deletes and not updates:
+        return 0
+
+    try:
+        with conn.cursor() as cur:
+            if deletes:
+                cur.execute(f"DELETE FROM {table} WHERE id = ANY(%s);", (deletes,))
+            cur.executemany(f"UPDATE {table} SET {key} = %s WHERE id = %s;", updates)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(deletes) + len(updates)
@@ -0,0 +1,219 @@
+import argparse
+import collections
+import json
+import os
+import re
+import shutil
+
+from frontier import ENTITY_SEGMENTS
+
+# Corpus encodings: "tokens" adds domain tokens (template phrases, hospital names, URL
+# prefixes) to the tokenizer, "refs" replaces every URL with a short reference that is
+# expanded back after decoding, "both" does both. Deployment only loads the URL
+# references, so dedup (and numpy) is imported by the functions that read corpora.
+ENCODINGS = ["none", "tokens", "refs", "both"]
+
+# Saved next to the model (and copied into its exports) so deployment can expand references
+URL_REFS_FILE = "url_refs.json"
+
+# A URL in the corpus; trailing sentence punctuation is not part of it
+URL_PATTERN = re.compile(r"https?://\S+?(?=[.,;:!?)]*(?:\s|$))")
+
+# What a URL becomes with the "refs" encoding, e.g. <ref42>
+REF_PREFIX = "<ref"
+REF_PATTERN = re.compile(r"<ref(\d+)>")
+# The end of a text that may be the start of a reference still being generated
+PARTIAL_REF = re.compile(r"<(?:r(?:e(?:f\d*)?)?)?$")
+
+# Fixed text of preprocess_csv's Q/A templates, split where names, hospitals and URLs
+# are filled in. The variable parts keep their leading space, so they tokenize as usual.
+TEMPLATE_PHRASES = [
+    "Question: What is the specialization and degree of Dr.",
+    "Question: What is the treatment offered at",
+    "? Answer:",
+    " specializes in",
+    " and holds the degree",
+    ". Find more at",
+    " offers treatment for",
+    ". Learn more at",
+]
+
+# Hospital names as the templates print them ("... from <hospital>?", "... offered at <hospital>?")
+HOSPITAL_PATTERN = re.compile(r"(?:of Dr\. .+? from|offered at) (.+?)\? Answer:")
+
+# A URL up to the path segment introducing its entity, e.g. https://host/<branch>/speciality/
+URL_PREFIX_PATTERN = re.compile(r"^(https?://.*?/(?:" + "|".join(ENTITY_SEGMENTS) + r")/)")
+
+# Hospital names and URL prefixes seen fewer times than this are left to the BPE
+DEFAULT_MIN_COUNT = 5
+
+# Compact references for the URLs of a corpus: URL number i is written <ref{i}>
+class UrlRefs:
+    def __init__(self, urls=()):
+        self.urls = list(urls)
+        self.ids = {url: i for i, url in enumerate(self.urls)}
+
+    def __len__(self):
+        return len(self.urls)
+
+    def add(self, url):
+        if url not in self.ids:
+            self.ids[url] = len(self.urls)
+            self.urls.append(url)
+        return self.ids[url]
+
+    # Function to replace every URL in a text with its reference, numbering new URLs
+    def encode(self, text):
+        return URL_PATTERN.sub(lambda m: f"{REF_PREFIX}{self.add(m.group(0))}>", text)
+
+    # Function to put the URLs back into decoded text; unknown references are left as they are
+    def expand(self, text):
+        def url(match):
+            i = int(match.group(1))
+            return self.urls[i] if i < len(self.urls) else match.group(0)
+
+        return REF_PATTERN.sub(url, text)
+
+    # Function to tell whether text ends in what may become a reference with more tokens,
+    # so streamed output does not show a reference before it can be expanded
+    def is_partial(self, text):
+        return PARTIAL_REF.search(text) is not None
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, URL_REFS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.urls, f, indent=4, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, URL_REFS_FILE), "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+# Function to load the URL references a model was trained with, or None if it has none
+def load_url_refs(model_dir):
+    if not os.path.exists(os.path.join(model_dir, URL_REFS_FILE)):
+        return None
+    return UrlRefs.load(model_dir)
+
+# Function to copy a model's URL references into an export of it
+def copy_url_refs(model_dir, output_dir):
+    path = os.path.join(model_dir, URL_REFS_FILE)
+    if os.path.exists(path):
+        shutil.copyfile(path, os.path.join(output_dir, URL_REFS_FILE))
+
+# Function to pick the domain tokens for a corpus: the template phrases, plus hospital
+# names and (unless URLs become references) URL prefixes and entity path segments seen
+# at least min_count times
+def domain_tokens(paths, refs=False, min_count=DEFAULT_MIN_COUNT):
+    from dedup import iter_records
+
+    hospitals = collections.Counter()
+    prefixes = collections.Counter()
+    for path in paths:
+        for record in iter_records(path):
+            hospitals.update(HOSPITAL_PATTERN.findall(record))
+            if not refs:
+                for url in URL_PATTERN.findall(record):
+                    match = URL_PREFIX_PATTERN.match(url)
+                    if match:
+                        prefixes[match.group(1)] += 1
+
+    tokens = list(TEMPLATE_PHRASES)
+    tokens += [" " + name for name, count in hospitals.most_common() if count >= min_count]
+    if refs:
+        tokens.append(" " + REF_PREFIX)
+    else:
+        tokens += [" " + prefix for prefix, count in prefixes.most_common() if count >= min_count]
+        tokens += [f"/{segment}/" for segment in sorted(set(ENTITY_SEGMENTS.values()))]
+    return tokens
+
+# Function to add domain tokens to a tokenizer; returns the ones that were new
+def extend_tokenizer(tokenizer, tokens):
+    vocab = tokenizer.get_vocab()
+    new = [token for token in tokens if token not in vocab]
+    tokenizer.add_tokens(new)
+    return new
+
+# Function to grow the model's embeddings for added tokens, starting each one at the mean
+# embedding of the pieces the original tokenizer split it into (instead of at random)
+def init_token_embeddings(model, tokenizer, base_tokenizer, tokens):
+    import torch
+
+    model.resize_token_embeddings(len(tokenizer), mean_resizing=False)
+    embeddings = model.get_input_embeddings().weight
+    with torch.no_grad():
+        for token in tokens:
+            pieces = base_tokenizer.encode(token, add_special_tokens=False)
+            embeddings[tokenizer.convert_tokens_to_ids(token)] = embeddings[pieces].mean(dim=0)
+
+# Function to write a corpus with its URLs replaced by references, record by record
+def encode_corpus(input_path, output_path, url_refs):
+    from dedup import iter_records
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        for i, record in enumerate(iter_records(input_path)):
+            if i:
+                out.write("\n")
+            out.write(url_refs.encode(record))
+
+# Function to get the path an encoded copy of a corpus file is written to
+def encoded_path(path, encoding):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{encoding}{ext}"
+
+# Function to prepare training files and tokenizer for an encoding. Returns the files to
+# tokenize (encoded copies when URLs become references), the URL references (or None)
+# and the tokens added to the tokenizer.
+def apply_encoding(encoding, paths, tokenizer, min_count=DEFAULT_MIN_COUNT):
+    url_refs = None
+    if encoding in ("refs", "both"):
+        url_refs = UrlRefs()
+        encoded = []
+        for path in paths:
+            encode_corpus(path, encoded_path(path, encoding), url_refs)
+            encoded.append(encoded_path(path, encoding))
+        paths = encoded
+    added = []
+    if encoding in ("tokens", "both"):
+        added = extend_tokenizer(tokenizer, domain_tokens(paths, url_refs is not None, min_count))
+    return paths, url_refs, added
+
+# Function to get the number of records and their average token count
+def tokens_per_example(paths, tokenizer):
+    from dedup import iter_records
+
+    records = tokens = 0
+    for path in paths:
+        for record in iter_records(path):
+            records += 1
+            tokens += len(tokenizer.encode(record, add_special_tokens=False))
+    return records, tokens / records if records else 0.0
+
+# Report the average tokens per Q/A record under every encoding
+if __name__ == "__main__":
+    import copy
+
+    from transformers import GPT2Tokenizer
+
+    parser = argparse.ArgumentParser(description="Compare tokens per training example with and without the domain-token and URL-reference encodings.")
+    parser.add_argument("files", nargs="*", default=["training_data.txt"])
+    parser.add_argument("--tokenizer", default="gpt2", help="Base tokenizer (name or directory)")
+    parser.add_argument("--min-count", type=int, default=DEFAULT_MIN_COUNT, help="Occurrences a hospital name or URL prefix needs to become a token")
+    parser.add_argument("--block-size", type=int, default=128)
+    args = parser.parse_args()
+
+    base = GPT2Tokenizer.from_pretrained(args.tokenizer)
+    baseline = None
+    for encoding in ENCODINGS:
+        tokenizer = copy.deepcopy(base)
+        paths, url_refs, added = apply_encoding(encoding, args.files, tokenizer, args.min_count)
+        records, average = tokens_per_example(paths, tokenizer)
+        baseline = baseline or average
+        extra = f", {len(added)} tokens added" if added else ""
+        extra += f", {len(url_refs)} URLs referenced" if url_refs is not None else ""
+        print(f"{encoding:<7} {average:6.1f} tokens/example ({(1 - average / baseline) * 100:4.1f}% fewer), "
+              f"{args.block_size / average:4.2f} examples per {args.block_size}-token block{extra}")
+        if paths != args.files:
+            for path in paths:
+                os.remove(path)
+    print(f"{records} examples in {', '.join(args.files)}.")
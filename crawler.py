@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import conditional_get
+from metrics import record_error, record_request
+from throttle import DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES, HostThrottle
+
+# Default crawl settings
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PER_HOST_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_TIMEOUT = 10
+
+# Returned by crawl() instead of a handler result when the page did not change
+UNCHANGED = object()
+
+# Spaces out request start times so a host never sees more than N requests per second
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Keep-alive session, adaptive throttle (concurrency, retries, circuit breaker) and
+# rate limiter for a single host
+class HostPool:
+    def __init__(self, host, initial_concurrency, requests_per_second, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES):
+        self.throttle = HostThrottle(host, initial_concurrency, max_concurrency, max_retries)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.throttle.concurrency.maximum)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+# Fetches many URLs in parallel while respecting per-host limits. Each host starts at
+# per_host_concurrency parallel requests and adapts between 1 and
+# max_per_host_concurrency to its latency and 429/503 responses.
+class Crawler:
+    def __init__(
+        self,
+        max_workers=DEFAULT_MAX_WORKERS,
+        per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+        requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+        timeout=DEFAULT_TIMEOUT,
+        cache=None,
+        force=False,
+        max_per_host_concurrency=DEFAULT_MAX_CONCURRENCY,
+        max_retries=DEFAULT_MAX_RETRIES,
+    ):
+        self.max_workers = max_workers
+        self.per_host_concurrency = per_host_concurrency
+        self.max_per_host_concurrency = max_per_host_concurrency
+        self.max_retries = max_retries
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.cache = cache
+        self.force = force
+        self.hosts = {}
+        self.hosts_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Function to get (or lazily create) the pool for the URL's host
+    def host_pool(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.hosts_lock:
+            pool = self.hosts.get(host)
+            if pool is None:
+                pool = HostPool(host, self.per_host_concurrency, self.requests_per_second, self.max_per_host_concurrency, self.max_retries)
+                self.hosts[host] = pool
+            return pool
+
+    # Function to fetch a single URL through its host pool, retrying transient failures;
+    # returns the Page and the callback that records it in the response cache
+    def fetch(self, url):
+        pool = self.host_pool(url)
+        send = lambda: conditional_get(pool.session, url, self.cache, self.timeout, self.force)
+        (page, commit), seconds = pool.throttle.run(send, before=pool.rate_limiter.wait)
+        size = len(page.content) if page.status_code != 304 else 0
+        record_request(url, page.status_code, size, seconds, changed=page.changed)
+        return page, commit
+
+    def _fetch_and_handle(self, url, handler):
+        try:
+            page, commit = self.fetch(url)
+            if not page.changed:
+                return UNCHANGED, commit
+            return handler(url, page), commit
+        except Exception as e:
+            print(f"Error fetching {url}: {e}")
+            record_error("crawl", e, url=url)
+            return None, None
+
+    # Function to fetch all URLs and yield (url, handler result, commit) triples as they
+    # complete; pages whose content did not change since the cached copy yield UNCHANGED
+    # unparsed. commit records the page in the response cache: callers run it only once
+    # the result is stored for good, so a page whose result was lost is fetched again
+    # on the next run. Failed pages yield None and no commit.
+    def crawl(self, urls, handler):
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {
+                executor.submit(self._fetch_and_handle, url, handler): url
+                for url in urls
+            }
+            for future in as_completed(futures):
+                yield (futures[future], *future.result())
+        finally:
+            # When the consumer stops early (e.g. a failed database write closes this
+            # generator), URLs not fetched yet are dropped instead of fetched for nothing
+            executor.shutdown(cancel_futures=True)
+
+    def close(self):
+        with self.hosts_lock:
+            for pool in self.hosts.values():
+                pool.close()
+            self.hosts.clear()
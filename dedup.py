@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import hashlib
+import os
+import re
+import time
+
+import numpy as np
+
+from frontier import entity_key
+
+# MinHash / LSH settings: NUM_PERM = BANDS * ROWS_PER_BAND
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = 4
+SHINGLE_WORDS = 3
+DEFAULT_THRESHOLD = 0.8
+
+# Every Q/A record starts with this; lines that do not are continuations of the
+# previous record (e.g. degrees scraped with embedded newlines)
+RECORD_PREFIX = "Question: "
+
+# Smallest prime above 2^32 for the universal hash family, and its fixed random
+# coefficients; a, x < 2^32 and b < p keep a * x + b inside uint64
+HASH_PRIME = np.uint64((1 << 32) + 15)
+_rng = np.random.RandomState(1)
+HASH_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+HASH_B = _rng.randint(0, (1 << 32) + 15, size=NUM_PERM, dtype=np.uint64)
+
+# Share of records held out for validation by default, and the key of the split hash
+DEFAULT_VALIDATION_SHARE = 0.1
+SPLIT_KEY = b"validation-split"
+
+URL = re.compile(r"https?://\S+")
+
+REPEATED_TITLE = re.compile(r"\b(?:Dr\.\s+){2,}")
+WHITESPACE = re.compile(r"\s+")
+
+# Function to normalize a record for comparison: collapse whitespace and case, and
+# fold "Dr. Dr." (from prefixing scraped names that already had the title)
+def normalize(record):
+    record = WHITESPACE.sub(" ", record).strip()
+    return REPEATED_TITLE.sub("Dr. ", record).casefold()
+
+# Function to get a compact exact-match key
+def exact_key(normalized):
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+# Function to compute the MinHash signature of a record's word shingles
+def minhash_signature(normalized):
+    words = normalized.split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # (a * x + b) mod p for every permutation and shingle
+    permuted = (np.outer(hashes, HASH_A) + HASH_B) % HASH_PRIME
+    return permuted.min(axis=0)
+
+# Near-duplicate index: signatures are bucketed per band, so only records sharing at
+# least one band are compared, and a match needs estimated Jaccard >= threshold
+class LSHIndex:
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.buckets = [{} for _ in range(BANDS)]
+        self.signatures = []
+
+    def _band_keys(self, signature):
+        return [signature[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].tobytes() for b in range(BANDS)]
+
+    # Function to check a signature against the index; adds it when it is new
+    def is_near_duplicate(self, signature):
+        keys = self._band_keys(signature)
+        checked = set()
+        for band, key in enumerate(keys):
+            for candidate in self.buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                    return True
+
+        position = len(self.signatures)
+        self.signatures.append(signature)
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, []).append(position)
+        return False
+
+# Function to tell whether a record goes to the validation split. The choice hashes the
+# entity the record's URL points at (or the record itself), so a record keeps its side
+# as the corpus grows and a doctor listed twice never lands on both sides.
+def is_validation(record, normalized, share=DEFAULT_VALIDATION_SHARE):
+    match = URL.search(record)
+    key = entity_key(match.group(0).rstrip(".,;:!?)")) if match else normalized
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8, key=SPLIT_KEY).digest()
+    return int.from_bytes(digest, "little") < share * 2 ** 64
+
+# Function to read Q/A records, joining continuation lines onto their record
+def iter_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        record = None
+        for line in f:
+            line = line.rstrip("\n")
+            if record is not None and not line.startswith(RECORD_PREFIX):
+                record += "\n" + line
+                continue
+            if record is not None:
+                yield record
+            record = line
+        if record is not None:
+            yield record
+
+# Function to count tokens with a Hugging Face tokenizer, or whitespace words without one
+def token_counter(tokenizer_path=None):
+    if tokenizer_path is None:
+        return lambda text: len(text.split())
+    from transformers import GPT2TokenizerFast
+
+    tokenizer = GPT2TokenizerFast.from_pretrained(tokenizer_path)
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+# Function to drop exact and near-duplicate records, keeping the first occurrence; with
+# validation_path, a deterministic share of the kept records is written there instead
+def deduplicate(input_path, output_path, threshold=DEFAULT_THRESHOLD, near=True, tokenizer_path=None, validation_path=None, validation_share=DEFAULT_VALIDATION_SHARE):
+    count_tokens = token_counter(tokenizer_path)
+    seen = set()
+    index = LSHIndex(threshold)
+    stats = {"records": 0, "exact": 0, "near": 0, "tokens": 0, "tokens_removed": 0, "validation": 0}
+
+    paths = [output_path] + ([validation_path] if validation_path else [])
+    with contextlib.ExitStack() as stack:
+        outputs = [stack.enter_context(open(path + ".tmp", "w", encoding="utf-8")) for path in paths]
+        written = [0] * len(outputs)
+        for record in iter_records(input_path):
+            stats["records"] += 1
+            tokens = count_tokens(record)
+            stats["tokens"] += tokens
+
+            normalized = normalize(record)
+            key = exact_key(normalized)
+            if key in seen:
+                stats["exact"] += 1
+                stats["tokens_removed"] += tokens
+                continue
+            seen.add(key)
+
+            if near and index.is_near_duplicate(minhash_signature(normalized)):
+                stats["near"] += 1
+                stats["tokens_removed"] += tokens
+                continue
+
+            side = 1 if validation_path and is_validation(record, normalized, validation_share) else 0
+            if written[side]:
+                outputs[side].write("\n")
+            outputs[side].write(record)
+            written[side] += 1
+    for path in paths:
+        os.replace(path + ".tmp", path)
+    stats["validation"] = written[1] if validation_path else 0
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove exact and near-duplicate Q/A records from the training corpus.")
+    parser.add_argument("input", nargs="?", default="training_data.txt")
+    parser.add_argument("--output", help="Output file (default: rewrite the input in place)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Estimated Jaccard similarity at which records count as near-duplicates")
+    parser.add_argument("--exact-only", action="store_true", help="Skip the MinHash/LSH near-duplicate pass")
+    parser.add_argument("--tokenizer", help="Count removed tokens with this tokenizer (default: whitespace words)")
+    parser.add_argument("--validation-output", help="Hold out a share of the kept records in this file (e.g. validation_data.txt)")
+    parser.add_argument("--validation-share", type=float, default=DEFAULT_VALIDATION_SHARE, help="Share of records held out with --validation-output")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = deduplicate(args.input, args.output or args.input, args.threshold, not args.exact_only, args.tokenizer, args.validation_output, args.validation_share)
+    elapsed = time.perf_counter() - start
+
+    unit = "tokens" if args.tokenizer else "words"
+    kept = stats["records"] - stats["exact"] - stats["near"]
+    share = stats["tokens_removed"] / stats["tokens"] * 100 if stats["tokens"] else 0.0
+    print(f"Kept {kept} of {stats['records']} records ({stats['exact']} exact, {stats['near']} near duplicates removed) in {elapsed:.2f}s.")
+    print(f"Removed {stats['tokens_removed']} of {stats['tokens']} {unit} ({share:.1f}%).")
+    if args.validation_output:
+        print(f"Held out {stats['validation']} of {kept} records in {args.validation_output}.")
@@ -1,87 +1,273 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import TimeoutException
+import argparse
 import json
+import re
 import time
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import requests
+
+from browser_pool import DEFAULT_PAGES_PER_SESSION, DEFAULT_POOL_SIZE, BrowserPool, start_browser
+from extractors import extract_departments
+from frontier import entity_key
+from metrics import configure as configure_metrics, get_metrics, record_error, record_request
+
+# Upper bound for any single wait, and the floor for the adaptive wait after a click
+MAX_WAIT = 10
+MIN_WAIT = 1.0
+
+# Counts in-flight fetch/XHR requests so we can tell when the page's network is idle
+TRACK_REQUESTS_SCRIPT = """
+if (window.__pendingRequests === undefined) {
+    window.__pendingRequests = 0;
+    const originalFetch = window.fetch;
+    window.fetch = function () {
+        window.__pendingRequests++;
+        return originalFetch.apply(this, arguments).finally(() => { window.__pendingRequests--; });
+    };
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        window.__pendingRequests++;
+        this.addEventListener("loadend", () => { window.__pendingRequests--; });
+        return originalSend.apply(this, arguments);
+    };
+}
+"""
+
+# URLs of every fetch/XHR the page has made so far
+XHR_URLS_SCRIPT = """
+return performance.getEntriesByType("resource")
+    .filter(entry => entry.initiatorType === "fetch" || entry.initiatorType === "xmlhttprequest")
+    .map(entry => entry.name);
+"""
+
+# Query parameters commonly used for "Load More" pagination
+PAGE_PARAMS = ("page", "pageNo", "page_no", "pageNumber", "p")
+
+# Function to turn a class list such as "speciality-title font700" into a CSS selector
+def class_selector(class_name):
+    return "div." + ".".join(class_name.split())
+
+# Function to wait until clicking loaded new items (True) or nothing more will load (False)
+def wait_for_new_items(driver, item_selector, previous_count, load_more_button_selector, timeout):
+    def settled(driver):
+        if len(driver.find_elements(By.CSS_SELECTOR, item_selector)) > previous_count:
+            return "loaded"
+        network_idle = driver.execute_script("return window.__pendingRequests === 0;")
+        if network_idle and not driver.find_elements(By.CSS_SELECTOR, load_more_button_selector):
+            return "done"
+        return False
 
-# Function to scrape links after clicking "Load More"
-def scrape_links_with_load_more(url, class_name, load_more_button_selector):
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.05).until(settled) == "loaded"
+    except TimeoutException:
+        return False
+
+# Function to scrape links after clicking "Load More"; pass a driver checked out of a
+# browser_pool.BrowserPool to reuse a running browser, otherwise a headless one (with the
+# pool's resource block list) is started and quit
+def scrape_links_with_load_more(url, class_name, load_more_button_selector, max_wait=MAX_WAIT, discover_endpoint=False, driver=None):
+    metrics = get_metrics()
+    own_driver = driver is None
     try:
         # Set up Selenium WebDriver
-        driver = webdriver.Chrome()
+        if own_driver:
+            driver = start_browser()
+        start = time.perf_counter()
         driver.get(url)
+        driver.execute_script(TRACK_REQUESTS_SCRIPT)
 
-        # Wait for the page to load
-        wait = WebDriverWait(driver, 10)
+        # Wait for the first items to render
+        item_selector = class_selector(class_name)
+        try:
+            WebDriverWait(driver, max_wait, poll_frequency=0.05).until(
+                lambda d: d.find_elements(By.CSS_SELECTOR, item_selector)
+            )
+        except TimeoutException:
+            print(f"No items matching '{item_selector}' appeared within {max_wait}s.")
 
-        # Continuously click the "Load More" button
-        #driver.find_element_by_xpath("/html/body/section/div/div/div[4]/button").click()
+        # Click "Load More" until the button disappears or a click loads nothing;
+        # the wait after each click adapts to how long previous batches took
+        clicks = 0
+        load_times = []
+        endpoint = None
         while True:
-            try:
-                # Scroll to the bottom to ensure the button is in view
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)  # Give time for scrolling
-
-                # Check if the button exists
-                load_more_button = wait.until(EC.presence_of_element_located((By.XPATH, '/html/body/section/div/div/div[4]/button')))
-                if load_more_button.is_displayed():
-                    print("Clicking 'Load More' button...")
-                    ActionChains(driver).move_to_element(load_more_button).click(load_more_button).perform()
-                    time.sleep(2)  # Allow time for new content to load
-                else:
-                    print("'Load More' button is not visible.")
-                    break
+            buttons = driver.find_elements(By.CSS_SELECTOR, load_more_button_selector)
+            if not buttons or not buttons[0].is_displayed():
+                print("'Load More' button is gone.")
+                break
+
+            count = len(driver.find_elements(By.CSS_SELECTOR, item_selector))
+            known_xhr_urls = set(driver.execute_script(XHR_URLS_SCRIPT)) if discover_endpoint and not clicks else None
+            timeout = max_wait if not load_times else min(max_wait, max(MIN_WAIT, 3 * sum(load_times) / len(load_times)))
 
-            except Exception as e:
-                print("No more 'Load More' buttons to click or an error occurred:", e)
+            click_start = time.perf_counter()
+            driver.execute_script("arguments[0].scrollIntoView({block: 'center'}); arguments[0].click();", buttons[0])
+            clicks += 1
+            if not wait_for_new_items(driver, item_selector, count, load_more_button_selector, timeout):
+                print("Last click did not load any new items.")
                 break
+            load_times.append(time.perf_counter() - click_start)
+            metrics.observe("load_more_click_seconds", load_times[-1])
 
-        # Parse the final page content with BeautifulSoup
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        driver.quit()
+            # After the first click, look for the request that fetched the new items
+            if known_xhr_urls is not None:
+                new_urls = [u for u in driver.execute_script(XHR_URLS_SCRIPT) if u not in known_xhr_urls]
+                template = pagination_template(new_urls[-1]) if new_urls else None
+                if template:
+                    endpoint, next_page = new_urls[-1], template[1] + 1
+                    print(f"Discovered pagination endpoint: {endpoint}")
+                    break
 
-        # Find all div elements with the given class name
-        div_elements = soup.find_all("div", class_=class_name)
+        # Parse the final page content once and extract the name and links
+        page_source = driver.page_source
+        if own_driver:
+            driver.quit()
+            driver = None
+        with metrics.timer("parse_seconds", page="speciality"):
+            links = extract_departments(page_source, class_name)
+        metrics.inc("http_response_bytes_total", len(page_source.encode("utf-8")), host=urlsplit(url).netloc.lower())
 
-        # Extract name and links
-        links = []
-        for div in div_elements:
-            anchor = div.find("a")  # Find the <a> tag inside the div
-            if anchor and anchor.has_attr("href"):
-                name = anchor.text.strip() if anchor.text else "Unnamed"
-                href = anchor["href"].strip()
-                links.append({"Name": name, "Link": href})
+        # Finish over plain HTTP once the pagination endpoint is known
+        if endpoint:
+            links = merge_links(links, scrape_links_via_endpoint(endpoint, class_name, first_page=next_page))
 
+        elapsed = time.perf_counter() - start
+        average = sum(load_times) / len(load_times) if load_times else 0.0
+        print(f"Clicked 'Load More' {clicks} times, loaded {len(links)} items in {elapsed:.2f}s ({average:.2f}s per click).")
         print(f"Scraped {len(links)} links successfully.")
+        metrics.inc("load_more_clicks_total", clicks)
+        metrics.inc("scraped_items_total", len(links), section="departments")
+        metrics.event("load_more", url=url, clicks=clicks, items=len(links), seconds=round(elapsed, 6), endpoint=endpoint)
         return links
 
     except Exception as e:
         print(f"Error scraping links: {e}")
+        record_error("scrape_links_with_load_more", e, url=url)
+        if own_driver and driver is not None:
+            driver.quit()
         return []
 
+# Function to build a "{page}" URL template from one pagination request, e.g.
+# .../load-more?page=2 or .../speciality_pages/2.html; returns (template, page) or None
+def pagination_template(endpoint_url):
+    parts = urlsplit(endpoint_url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    for index, (key, value) in enumerate(query):
+        if key in PAGE_PARAMS and value.isdigit():
+            query[index] = (key, "__PAGE__")
+            template = urlunsplit(parts._replace(query=urlencode(query))).replace("__PAGE__", "{page}")
+            return template, int(value)
+
+    match = re.search(r"(\d+)(\.\w+)?$", parts.path)
+    if match:
+        path = parts.path[:match.start(1)] + "{page}" + parts.path[match.end(1):]
+        return urlunsplit(parts._replace(path=path)), int(match.group(1))
+    return None
+
+# Function to pull the HTML fragment out of a pagination response (raw HTML or JSON)
+def response_fragment(response):
+    if "json" not in response.headers.get("Content-Type", ""):
+        return response.text
+    data = response.json()
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, str) and "<" in value:
+                return value
+    return ""
+
+# Function to append links whose page is not already in the list
+def merge_links(links, new_links):
+    seen = {entity_key(link["Link"]) for link in links}
+    merged = list(links)
+    for link in new_links:
+        key = entity_key(link["Link"])
+        if key not in seen:
+            seen.add(key)
+            merged.append(link)
+    return merged
+
+# Function to scrape the listing by calling its pagination endpoint directly, no browser.
+# Pages are requested from first_page (default: the page number in endpoint_url) on.
+def scrape_links_via_endpoint(endpoint_url, class_name, landing_url=None, first_page=None, max_pages=500):
+    template = pagination_template(endpoint_url)
+    if template is None:
+        print(f"Could not find a page number in {endpoint_url}.")
+        return []
+    template, discovered_page = template
+    page = discovered_page if first_page is None else first_page
+
+    start = time.perf_counter()
+    links = []
+    requests_made = 0
+    with requests.Session() as session:
+        # Items rendered into the landing page itself
+        if landing_url:
+            request_start = time.perf_counter()
+            response = session.get(landing_url, timeout=MAX_WAIT)
+            record_request(landing_url, response.status_code, len(response.content), time.perf_counter() - request_start)
+            response.raise_for_status()
+            requests_made += 1
+            links = merge_links(links, extract_departments(response.content, class_name))
+
+        for page in range(page, page + max_pages):
+            request_start = time.perf_counter()
+            response = session.get(template.format(page=page), timeout=MAX_WAIT)
+            record_request(response.url, response.status_code, len(response.content), time.perf_counter() - request_start)
+            requests_made += 1
+            if response.status_code != 200:
+                break
+            fragment = response_fragment(response)
+            new_links = extract_departments(fragment, class_name) if fragment.strip() else []
+            # Resolve relative hrefs against the endpoint the fragment came from
+            new_links = [{"Name": link["Name"], "Link": urljoin(endpoint_url, link["Link"])} for link in new_links]
+            before = len(links)
+            links = merge_links(links, new_links)
+            if len(links) == before:
+                break
+
+    elapsed = time.perf_counter() - start
+    print(f"Fetched {requests_made} pages from the pagination endpoint, loaded {len(links)} items in {elapsed:.2f}s.")
+    return links
+
 # Main function
 if __name__ == "__main__":
-    # URL of the webpage to scrape
-    url = "https://www.medanta.org/hospitals-near-me/gurugram-hospital/speciality/"  # Replace with the actual URL
-
+    parser = argparse.ArgumentParser(description="Scrape the speciality listing behind its 'Load More' button.")
+    # URL(s) of the webpage to scrape; several are scraped in parallel by a browser pool
+    parser.add_argument("--url", nargs="+", default=["https://www.medanta.org/hospitals-near-me/gurugram-hospital/speciality/"])
     # Class name to locate the divs containing the links
-    target_class_name = "speciality-title font700"
-
+    parser.add_argument("--class-name", default="speciality-title font700")
     # CSS selector for the "Load More" button
-    load_more_button_selector = "button.theme-button"  # Replace if different
+    parser.add_argument("--button", default="button.theme-button")
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT, help="Upper bound in seconds for any single wait")
+    parser.add_argument("--endpoint", help="Known pagination XHR URL (e.g. ...?page=2); skips the browser entirely")
+    parser.add_argument("--first-page", type=int, help="First page number to request from --endpoint (default: the one in the URL)")
+    parser.add_argument("--discover", action="store_true", help="Find the pagination XHR after one click and fetch the rest without the browser")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="Headless browsers used when several URLs are given")
+    parser.add_argument("--pages-per-session", type=int, default=DEFAULT_PAGES_PER_SESSION, help="Pages a pooled browser serves before it is restarted")
+    parser.add_argument("--metrics-dir", help="Write request/parse metrics here as metrics.jsonl and metrics.prom (default: $METRICS_DIR)")
+    args = parser.parse_args()
+    configure_metrics(args.metrics_dir)
 
     # Scrape links
-    scraped_links = scrape_links_with_load_more(url, target_class_name, load_more_button_selector)
+    if args.endpoint:
+        scraped_links = scrape_links_via_endpoint(args.endpoint, args.class_name, landing_url=args.url[0], first_page=args.first_page)
+    else:
+        # Every browser comes from the pool, headless and with the block list installed
+        with BrowserPool(min(args.pool_size, len(args.url)), args.pages_per_session) as pool:
+            results = pool.map(lambda url, driver: scrape_links_with_load_more(url, args.class_name, args.button, args.max_wait, args.discover, driver=driver), args.url)
+        scraped_links = []
+        for links in results:
+            scraped_links = merge_links(scraped_links, links)
 
     # Save the links to a JSON file
     if scraped_links:
         try:
             with open("department_list.json", "w", encoding="utf-8") as file:
                 json.dump(scraped_links, file, indent=4, ensure_ascii=False)
-            print("Links saved to 'scraped_specialities.json'.")
+            print("Links saved to 'department_list.json'.")
         except Exception as e:
             print(f"Error saving to JSON file: {e}")
     else:
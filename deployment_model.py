@@ -1,9 +1,170 @@
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+import time
 
-model = GPT2LMHeadModel.from_pretrained("./fine_tuned_gpt2")
-tokenizer = GPT2Tokenizer.from_pretrained("./fine_tuned_gpt2")
+# Taken before the remaining imports so the startup report covers them
+STARTED_AT = time.perf_counter()
 
-prompt = "What is the specialization and degree of Dr. Dr. Arvinder Singh Soin from Medanta, IN?"
-inputs = tokenizer.encode(prompt, return_tensors="pt")
-outputs = model.generate(inputs, max_length=50, num_return_sequences=1)
-print(tokenizer.decode(outputs[0], skip_special_tokens=True))
+import argparse
+import contextlib
+import functools
+
+from response_cache import ResponseCache
+
+# Directory the fine-tuned model and tokenizer are saved to
+MODEL_DIR = "./fine_tuned_gpt2"
+
+# Inference backends and where export_model.py writes each one
+BACKEND_DIRS = {
+    "fp32": MODEL_DIR,
+    "int8": "./fine_tuned_gpt2_int8",
+    "onnx": "./fine_tuned_gpt2_onnx",
+}
+
+DEFAULT_PROMPT = "What is the specialization and degree of Dr. Arvinder Singh Soin from Medanta, IN?"
+
+# Prompt answered once after loading when warm-up is requested
+WARMUP_PROMPT = "Question: What is the treatment offered at Medanta, IN? Answer:"
+
+# Accumulates wall time per startup phase (imports, weight load, tokenizer load, ...)
+class StartupTimings:
+    def __init__(self):
+        self.phases = {}
+        self.ready_at = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def report(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+
+# Minimal generation streamer: generate() hands it the prompt first and then each new
+# token, so the second call marks the first generated token
+class FirstTokenTimer:
+    def __init__(self):
+        self.calls = 0
+        self.first_token_at = None
+
+    def put(self, value):
+        self.calls += 1
+        if self.calls == 2:
+            self.first_token_at = time.perf_counter()
+
+    def end(self):
+        pass
+
+# Function to load the fine-tuned model and tokenizer once, ready for inference, on the
+# fp32 PyTorch, dynamically int8-quantized PyTorch or ONNX Runtime backend. With fast,
+# fp32 checkpoints the lean runtime can serve are memory-mapped by fast_gpt2 without
+# importing transformers at all. transformers itself is only imported on first use.
+def load_model(model_dir=None, backend="fp32", fast=False, timings=None):
+    model_dir = model_dir or BACKEND_DIRS[backend]
+    timings = timings or StartupTimings()
+    if fast and backend == "fp32":
+        with timings.phase("import"):
+            import fast_gpt2
+        if fast_gpt2.supports(model_dir):
+            with timings.phase("weights"):
+                model = fast_gpt2.FastGPT2.from_pretrained(model_dir)
+            with timings.phase("tokenizer"):
+                tokenizer = fast_gpt2.FastTokenizer.from_pretrained(model_dir)
+            return model, tokenizer
+
+    with timings.phase("import"):
+        from transformers import GPT2LMHeadModel, GPT2Tokenizer
+    with timings.phase("weights"):
+        if backend == "int8":
+            from export_model import load_int8_model
+
+            model = load_int8_model(model_dir)
+        elif backend == "onnx":
+            from optimum.onnxruntime import ORTModelForCausalLM
+
+            model = ORTModelForCausalLM.from_pretrained(model_dir)
+        else:
+            model = GPT2LMHeadModel.from_pretrained(model_dir)
+            model.eval()
+    with timings.phase("tokenizer"):
+        tokenizer = GPT2Tokenizer.from_pretrained(model_dir)
+    return model, tokenizer
+
+# Function to answer a single prompt; with a cache, repeated prompts are not regenerated
+# (as long as the model's generation config decodes deterministically). url_refs expands
+# the URL references of a model trained with corpus_encoding's "refs" encoding.
+def generate_answer(model, tokenizer, prompt, max_length=50, cache=None, streamer=None, url_refs=None):
+    def generate():
+        inputs = tokenizer.encode(prompt, return_tensors="pt")
+        outputs = model.generate(inputs, max_length=max_length, num_return_sequences=1, streamer=streamer)
+        # Domain tokens must not be padded with spaces when decoded
+        answer = tokenizer.decode(outputs[0], skip_special_tokens=True, spaces_between_special_tokens=False)
+        return url_refs.expand(answer) if url_refs is not None else answer
+
+    if cache is None:
+        return generate()
+    params = {"max_length": max_length, "do_sample": bool(model.generation_config.do_sample)}
+    return cache.get_or_generate(prompt, params, generate)
+
+# Function to answer templated questions from the lookup index and everything else
+# with the model; load_model is only called when the index cannot answer
+def answer_question(prompt, index=None, load=load_model, max_length=50, cache=None, streamer=None, url_refs=None):
+    completion = index.complete(prompt) if index is not None else None
+    if completion is not None:
+        return prompt + completion
+    model, tokenizer = load()
+    return generate_answer(model, tokenizer, prompt, max_length, cache, streamer, url_refs)
+
+if __name__ == "__main__":
+    from corpus_encoding import load_url_refs
+    from lookup_index import LOOKUP_SOURCES, LazyLookupIndex
+
+    parser = argparse.ArgumentParser(description="Answer one question with the fine-tuned GPT-2 model.")
+    parser.add_argument("prompts", nargs="*", default=[DEFAULT_PROMPT])
+    parser.add_argument("--backend", choices=list(BACKEND_DIRS), default="fp32")
+    parser.add_argument("--model-dir", help="Model directory (default: the backend's export directory)")
+    parser.add_argument("--max-length", type=int, default=50)
+    parser.add_argument("--lookup", choices=LOOKUP_SOURCES, default="csv", help="Answer templated questions from this data instead of the model (indexed on the first one)")
+    parser.add_argument("--lookup-path", help="CSV directory or Parquet dataset root for --lookup")
+    parser.add_argument("--no-cache", action="store_true", help="Regenerate repeated prompts instead of reusing the response")
+    parser.add_argument("--no-fast-start", action="store_true", help="Load fp32 checkpoints through transformers instead of the lean memory-mapped runtime")
+    parser.add_argument("--warmup", action="store_true", help="Run one generation right after loading, before the first real prompt")
+    parser.add_argument("--timings", action="store_true", help="Print a breakdown of the startup phases")
+    args = parser.parse_args()
+
+    timings = StartupTimings()
+    timings.add("startup imports", time.perf_counter() - STARTED_AT)
+    index = LazyLookupIndex(args.lookup, args.lookup_path) if args.lookup != "none" else None
+    model_dir = args.model_dir or BACKEND_DIRS[args.backend]
+    cache = None if args.no_cache else ResponseCache(model_dir)
+    url_refs = load_url_refs(model_dir)
+
+    @functools.lru_cache(maxsize=None)
+    def load():
+        model, tokenizer = load_model(model_dir, args.backend, not args.no_fast_start, timings)
+        if args.warmup:
+            with timings.phase("warmup"):
+                generate_answer(model, tokenizer, WARMUP_PROMPT, max_length=len(tokenizer.encode(WARMUP_PROMPT)) + 1)
+        timings.ready_at = time.perf_counter()
+        return model, tokenizer
+
+    for i, prompt in enumerate(args.prompts):
+        answer_started = time.perf_counter()
+        streamer = FirstTokenTimer() if i == 0 else None
+        answer = answer_question(prompt, index, load, args.max_length, cache, streamer, url_refs)
+        print(answer)
+        if i == 0:
+            first_answer_seconds = time.perf_counter() - STARTED_AT
+            if streamer.first_token_at is not None:
+                # From the prompt reaching the loaded model to its first generated token
+                timings.add("first token", streamer.first_token_at - max(answer_started, timings.ready_at))
+    if cache is not None and len(args.prompts) > 1:
+        print(f"Response cache: {cache.stats()}")
+    if args.timings:
+        if index is not None and index.loaded:
+            timings.add("lookup index", index.build_seconds)
+        print(f"Startup: {timings.report()}; time to first answer {first_answer_seconds * 1000:.0f} ms")
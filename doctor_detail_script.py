@@ -1,8 +1,23 @@
+import argparse
 import json
-import requests
-from bs4 import BeautifulSoup
+import time
 import psycopg2
 
+from bulk_loader import BulkLoader, DEFAULT_BATCH_SIZE, migrate_canonical_links
+from crawler import (
+    Crawler,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PER_HOST_CONCURRENCY,
+    DEFAULT_REQUESTS_PER_SECOND,
+    UNCHANGED,
+)
+from extractors import MISSING, extract_doctor_details
+from frontier import DEFAULT_FRONTIER_PATH, Frontier, canonicalize_url
+from http_cache import DEFAULT_CACHE_PATH, ResponseCache
+from metrics import configure as configure_metrics, get_metrics, record_error, record_request
+from parquet_dataset import export_tables
+from throttle import DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES, throttled_get
+
 # PostgreSQL Configuration
 DB_CONFIG = {
     "dbname": "postgres",
@@ -34,57 +49,124 @@ def create_doctors_table(conn):
             link TEXT
         );
         """
+        # Keep only the newest row per link so re-crawls can upsert on it
+        dedupe_query = """
+        DELETE FROM doctors a USING doctors b
+        WHERE a.link = b.link AND a.id < b.id;
+        """
+        index_query = "CREATE UNIQUE INDEX IF NOT EXISTS doctors_link_key ON doctors (link);"
         with conn.cursor() as cur:
             cur.execute(query)
+            cur.execute(dedupe_query)
+            cur.execute(index_query)
             conn.commit()
+        # Links are stored canonicalized; rewrite rows saved from raw hrefs
+        migrated = migrate_canonical_links(conn, "doctors", "link")
+        if migrated:
+            print(f"Canonicalized the links of {migrated} existing doctor rows.")
         print("Doctors table created successfully.")
     except Exception as e:
         print(f"Error creating table: {e}")
 
-# Function to insert doctor details into the database
+# Columns of the doctors table, in the order of the scraped tuples
+DOCTOR_COLUMNS = ("name", "specialization", "degree", "hospital_name", "link")
+
+# Function to start a loader that streams doctor tuples into the table in
+# COPY batches and upserts them on link
+def doctor_loader(conn, batch_size=DEFAULT_BATCH_SIZE):
+    return BulkLoader(conn, "doctors", DOCTOR_COLUMNS, "link", batch_size)
+
+# Function to insert doctor details into the database; existing links are
+# updated only when one of their fields actually changed
 def insert_doctor_details(conn, doctor_details):
     try:
-        query = """
-        INSERT INTO doctors (name, specialization, degree, hospital_name, link)
-        VALUES (%s, %s, %s, %s, %s);
-        """
-        with conn.cursor() as cur:
-            cur.executemany(query, doctor_details)
-            conn.commit()
-        print(f"Inserted {len(doctor_details)} doctor records successfully.")
+        with doctor_loader(conn) as loader:
+            loader.add_many(doctor_details)
+        loader.report()
     except Exception as e:
         print(f"Error inserting data: {e}")
+        record_error("insert_doctor_details", e)
+
+# Hospital used for links saved before the registry recorded one per entry
+DEFAULT_HOSPITAL_NAME = "Medanta, IN"
+
+# Function to extract doctor details from a downloaded page
+def parse_doctor_details(url, page_content, hospital_name=DEFAULT_HOSPITAL_NAME):
+    metrics = get_metrics()
+    start = time.perf_counter()
+    doctor_details = extract_doctor_details(page_content, url, hospital_name)
+    seconds = time.perf_counter() - start
+    metrics.observe("parse_seconds", seconds, page="doctor")
+    if metrics.enabled:
+        misses = sum(value == MISSING for doctor in doctor_details for value in doctor[:3])
+        metrics.event("parse", page="doctor", url=url, seconds=round(seconds, 6), records=len(doctor_details), selector_misses=misses)
+    return doctor_details
 
 # Function to extract doctor details from a webpage
-def fetch_doctor_details(url):
+def fetch_doctor_details(url, hospital_name=DEFAULT_HOSPITAL_NAME):
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Hardcode hospital name here
-        hospital_name = "Medanta, IN"
-        
-        # Use CSS selectors to extract doctor details
-        doctors = []
-        doctor_containers = soup.select("div.dr-details")  # Update this selector based on the actual HTML structure
-        
-        for container in doctor_containers:
-            name = container.find("h1", class_="dr-details-name").text.strip() if container.find("h1", class_="dr-details-name") else "N/A"
-            specialization = container.select_one("#overview > div > div > div.dr-details > p:nth-child(3)").text.strip() if container.select_one("#overview > div > div > div.dr-details > p:nth-child(3)") else "N/A"
-            degree = container.select_one("#overview > div > div > div.dr-details > p:nth-child(4)").text.strip() if container.select_one("#overview > div > div > div.dr-details > p:nth-child(4)") else "N/A"
-            doctors.append((name, specialization, degree, hospital_name, url))
-        
-        return doctors
+        start = time.perf_counter()
+        response = throttled_get(url, timeout=10)
+        record_request(url, response.status_code, len(response.content), time.perf_counter() - start)
+        return parse_doctor_details(url, response.content, hospital_name)
     except Exception as e:
         print(f"Error fetching doctor details from {url}: {e}")
+        record_error("fetch_doctor_details", e, url=url)
         return []
 
+# Function to fetch many doctor pages concurrently over pooled connections; yields the
+# (doctor tuples, commit) of every fetched page, where commit records the page in the
+# response cache. With a cache, pages that did not change are not parsed and yield no
+# tuples. hospital_names maps a link to its hospital (DEFAULT_HOSPITAL_NAME otherwise);
+# pages fetched successfully are marked as crawled in the frontier, if one is given.
+def crawl_doctor_details(links, max_workers=DEFAULT_MAX_WORKERS, per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, cache=None, full=False, hospital_names=None, max_per_host_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES, frontier=None):
+    hospital_names = hospital_names or {}
+    unchanged = 0
+    with Crawler(max_workers, per_host_concurrency, requests_per_second, cache=cache, force=full, max_per_host_concurrency=max_per_host_concurrency, max_retries=max_retries) as crawler:
+        handler = lambda url, page: parse_doctor_details(url, page.content, hospital_names.get(url, DEFAULT_HOSPITAL_NAME))
+        for url, doctor_details, commit in crawler.crawl(links, handler):
+            if doctor_details is None:
+                continue
+            if frontier is not None:
+                frontier.mark_crawled(url)
+            if doctor_details is UNCHANGED:
+                unchanged += 1
+                doctor_details = []
+            yield doctor_details, commit
+    if cache is not None:
+        print(f"Skipped {unchanged} unchanged pages.")
+
+# Function to stream crawled pages into the loader. A page is recorded in the response
+# cache only after the batch holding its rows was committed, so pages whose rows never
+# reached the table count as changed on the next run.
+def load_doctor_pages(loader, pages):
+    for doctor_details, commit in pages:
+        loader.add_many(doctor_details)
+        loader.after_flush(commit)
+
 # Main Function
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape doctor profiles into PostgreSQL.")
+    parser.add_argument("--links-file", default="hospital_data.json", help="JSON file with a 'doctors' list of links")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Total number of concurrent fetches")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST_CONCURRENCY, help="Initial concurrent requests per host (adapts to the host's latency and 429/503s)")
+    parser.add_argument("--max-per-host", type=int, default=DEFAULT_MAX_CONCURRENCY, help="Upper bound for the adaptive per-host concurrency")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries for timeouts, connection errors and 429/5xx responses")
+    parser.add_argument("--rps", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="Maximum requests per second per host (0 disables the limit)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="On-disk HTTP response cache used for incremental re-crawls")
+    parser.add_argument("--full", action="store_true", help="Re-process every page even if the cached copy is unchanged")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per COPY batch written while the crawl runs")
+    parser.add_argument("--parquet-dir", help="Also export the doctors table to this partitioned Parquet dataset")
+    parser.add_argument("--metrics-dir", help="Write request/parse/DB metrics here as metrics.jsonl and metrics.prom (default: $METRICS_DIR)")
+    parser.add_argument("--frontier", default=DEFAULT_FRONTIER_PATH, help="File remembering which doctors earlier runs crawled")
+    parser.add_argument("--skip-crawled", action="store_true", help="Skip doctors crawled in earlier runs entirely (by default they are requested again and the HTTP cache skips unchanged pages)")
+    parser.add_argument("--bloom-capacity", type=int, help="Keep the frontier as a Bloom filter sized for this many doctors instead of an exact set")
+    args = parser.parse_args()
+    configure_metrics(args.metrics_dir)
+
     # Load links from JSON file
     try:
-        with open("hospital_data.json", "r", encoding="utf-8") as file:
+        with open(args.links_file, "r", encoding="utf-8") as file:
             data = json.load(file)
             doctor_links = data.get("doctors", [])
     except Exception as e:
@@ -99,17 +181,35 @@ if __name__ == "__main__":
         if conn:
             create_doctors_table(conn)
 
-            all_doctor_details = []
+            # Canonicalize the links and keep one per doctor: the same profile is
+            # listed under every speciality the doctor belongs to
+            frontier = Frontier(args.frontier, args.bloom_capacity)
+            links = frontier.add_links([entry["Link"] for entry in doctor_links], skip_crawled=args.skip_crawled and not args.full)
+            hospital_names = {canonicalize_url(entry["Link"]): entry["Hospital"] for entry in doctor_links if "Hospital" in entry}
+            print(f"Crawling {len(links)} of {len(doctor_links)} links ({frontier.report()}).")
 
-            # Visit each link and extract doctor details
-            for entry in doctor_links:
-                link = entry["Link"]
-                doctor_details = fetch_doctor_details(link)
-                all_doctor_details.extend(doctor_details)
+            # Visit every link concurrently and stream the extracted doctor
+            # details into the database in batches while the crawl runs
+            start = time.perf_counter()
+            cache = ResponseCache(args.cache)
+            pages = crawl_doctor_details(links, args.workers, args.per_host, args.rps, cache, args.full, hospital_names, args.max_per_host, args.retries, frontier)
+            try:
+                with doctor_loader(conn, args.batch_size) as loader:
+                    load_doctor_pages(loader, pages)
+                loader.report()
+                frontier.save()
+            except Exception as e:
+                print(f"Error inserting data: {e}")
+            finally:
+                # Stops the crawl right away if loading failed
+                pages.close()
+            cache.close()
+            elapsed = time.perf_counter() - start
+            print(f"Processed {len(links)} pages in {elapsed:.1f}s ({len(links) / elapsed if elapsed else 0.0:.1f} pages/sec).")
 
-            # Insert data into the database
-            if all_doctor_details:
-                insert_doctor_details(conn, all_doctor_details)
+            # Hand the full table over to preprocessing as Parquet
+            if args.parquet_dir:
+                export_tables(conn, ["doctors"], args.parquet_dir)
 
             # Close the connection
             conn.close()
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import math
+import os
+import time
+
+import numpy as np
+import torch
+
+from dedup import iter_records
+from token_shards import DEFAULT_SHARD_DIR, file_hash, tokenizer_fingerprint
+
+# The templated records read "Question: ...? Answer: ..."; the prompt ends with this
+ANSWER_MARKER = " Answer:"
+
+DEFAULT_EVAL_BATCH_SIZE = 8
+# Records are cut to this many tokens (the templated ones are far shorter)
+DEFAULT_MAX_LENGTH = 256
+# Held-out records whose answers are generated for the exact-match score
+DEFAULT_EXACT_MATCH_EXAMPLES = 100
+
+# Function to split a record into its prompt (up to and including "Answer:") and the
+# answer; records without the marker have no answer
+def split_record(record):
+    position = record.find(ANSWER_MARKER)
+    if position < 0:
+        return record, ""
+    position += len(ANSWER_MARKER)
+    return record[:position], record[position:]
+
+# Held-out records tokenized once: each record's token IDs and where its answer starts.
+# Cached in the token shard directory next to the training shards, keyed by the file's
+# content hash and the tokenizer, so later runs and evaluations skip the tokenizer.
+class EvalSet:
+    def __init__(self, records, answer_starts):
+        self.records = records
+        self.answer_starts = answer_starts
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_file(cls, path, tokenizer, cache_dir=DEFAULT_SHARD_DIR, max_length=DEFAULT_MAX_LENGTH):
+        key = hashlib.sha256(f"{tokenizer_fingerprint(tokenizer)}:{max_length}".encode("utf-8")).hexdigest()[:8]
+        cache_path = os.path.join(cache_dir, f"eval-{file_hash(path)[:16]}-{key}.npz")
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                offsets = data["offsets"]
+                # offsets is [0] for a file without records; np.split would give one empty record
+                records = np.split(data["tokens"], offsets[1:-1]) if len(offsets) > 1 else []
+                return cls(records, data["answer_starts"])
+
+        records = []
+        answer_starts = []
+        for record in iter_records(path):
+            prompt, answer = split_record(record)
+            prompt_ids = tokenizer.encode(prompt, add_special_tokens=False)
+            ids = (prompt_ids + tokenizer.encode(answer, add_special_tokens=False))[:max_length]
+            if len(ids) < 2:
+                continue
+            records.append(np.asarray(ids, dtype=np.int64))
+            answer_starts.append(min(len(prompt_ids), len(ids)) if answer else len(ids))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        offsets = np.cumsum([0] + [len(ids) for ids in records])
+        tokens = np.concatenate(records) if records else np.zeros(0, dtype=np.int64)
+        with open(cache_path + ".tmp", "wb") as f:
+            np.savez(f, tokens=tokens, offsets=offsets, answer_starts=np.asarray(answer_starts, dtype=np.int64))
+        os.replace(cache_path + ".tmp", cache_path)
+        return cls(records, np.asarray(answer_starts, dtype=np.int64))
+
+# Batched held-out evaluation: perplexity over every record token, the share of answer
+# tokens predicted correctly with the true prefix given, and the share of answers the
+# model reproduces exactly when decoding greedily from the question. Records are batched
+# by length so little compute goes to padding.
+class Evaluator:
+    def __init__(self, eval_set, pad_token_id, batch_size=DEFAULT_EVAL_BATCH_SIZE, exact_match_examples=DEFAULT_EXACT_MATCH_EXAMPLES):
+        self.eval_set = eval_set
+        self.pad_token_id = pad_token_id
+        self.batch_size = batch_size
+        lengths = [len(ids) for ids in eval_set.records]
+        self.by_length = sorted(range(len(eval_set)), key=lengths.__getitem__)
+        answered = [i for i in range(len(eval_set)) if eval_set.answer_starts[i] < lengths[i]][:exact_match_examples]
+        self.exact_match_indices = sorted(answered, key=lambda i: eval_set.answer_starts[i])
+
+    def batches(self, indices):
+        for start in range(0, len(indices), self.batch_size):
+            yield indices[start:start + self.batch_size]
+
+    # Function to pad a batch of records on the right (on the left for generation, so
+    # every prompt ends in the last column); returns input IDs and attention mask
+    def pad(self, records, left=False):
+        width = max(len(ids) for ids in records)
+        input_ids = torch.full((len(records), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(records), width), dtype=torch.long)
+        for row, ids in enumerate(records):
+            columns = slice(width - len(ids), width) if left else slice(0, len(ids))
+            input_ids[row, columns] = torch.as_tensor(ids)
+            attention_mask[row, columns] = 1
+        return input_ids, attention_mask
+
+    def perplexity(self, model, device):
+        nll = 0.0
+        tokens = 0
+        answer_correct = 0
+        answer_tokens = 0
+        for batch in self.batches(self.by_length):
+            input_ids, attention_mask = self.pad([self.eval_set.records[i] for i in batch])
+            input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+            logits = model(input_ids=input_ids, attention_mask=attention_mask).logits[:, :-1].float()
+            targets = input_ids[:, 1:]
+            mask = attention_mask[:, 1:].bool()
+            losses = torch.nn.functional.cross_entropy(logits.transpose(1, 2), targets, reduction="none")
+            nll += losses[mask].sum().item()
+            tokens += int(mask.sum())
+
+            # Targets at position >= answer start - 1 are the answer tokens
+            positions = torch.arange(targets.shape[1], device=device)
+            starts = torch.as_tensor(self.eval_set.answer_starts[batch], device=device)
+            in_answer = mask & (positions[None, :] >= starts[:, None] - 1)
+            answer_correct += int(((logits.argmax(dim=-1) == targets) & in_answer).sum())
+            answer_tokens += int(in_answer.sum())
+        return nll / max(1, tokens), answer_correct / answer_tokens if answer_tokens else 0.0
+
+    def exact_match(self, model, device):
+        matches = 0
+        for batch in self.batches(self.exact_match_indices):
+            records = [self.eval_set.records[i] for i in batch]
+            starts = [int(self.eval_set.answer_starts[i]) for i in batch]
+            input_ids, attention_mask = self.pad([ids[:start] for ids, start in zip(records, starts)], left=True)
+            answer_lengths = [len(ids) - start for ids, start in zip(records, starts)]
+            outputs = model.generate(
+                input_ids=input_ids.to(device),
+                attention_mask=attention_mask.to(device),
+                max_new_tokens=max(answer_lengths),
+                do_sample=False,
+                num_beams=1,
+                use_cache=True,
+                pad_token_id=self.pad_token_id,
+            )
+            generated = outputs[:, input_ids.shape[1]:].tolist()
+            for ids, start, tokens in zip(records, starts, generated):
+                matches += tokens[:len(ids) - start] == ids[start:].tolist()
+        return matches / len(self.exact_match_indices) if self.exact_match_indices else 0.0
+
+    # Function to evaluate a model; returns the metrics named like the Trainer's
+    # (eval_loss, eval_perplexity, ...). The model is put back in training mode if it was.
+    def evaluate(self, model, prefix="eval"):
+        start = time.perf_counter()
+        was_training = model.training
+        model.eval()
+        device = next(model.parameters()).device
+        try:
+            with torch.inference_mode():
+                loss, answer_accuracy = self.perplexity(model, device)
+                exact_match = self.exact_match(model, device) if self.exact_match_indices else None
+        finally:
+            if was_training:
+                model.train()
+        metrics = {
+            f"{prefix}_loss": loss,
+            f"{prefix}_perplexity": math.exp(min(loss, 100.0)),
+            f"{prefix}_answer_token_accuracy": answer_accuracy,
+        }
+        if exact_match is not None:
+            metrics[f"{prefix}_exact_match"] = exact_match
+        metrics[f"{prefix}_runtime"] = time.perf_counter() - start
+        metrics[f"{prefix}_samples"] = len(self.eval_set)
+        return metrics
+
+# Evaluate a saved model on the held-out records
+if __name__ == "__main__":
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+    parser = argparse.ArgumentParser(description="Evaluate a fine-tuned model on held-out Q/A records: perplexity, answer-token accuracy and exact match.")
+    parser.add_argument("--model-dir", default="./fine_tuned_gpt2")
+    parser.add_argument("--data", default="validation_data.txt")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_EVAL_BATCH_SIZE)
+    parser.add_argument("--exact-match-examples", type=int, default=DEFAULT_EXACT_MATCH_EXAMPLES, help="Answers generated for the exact-match score (0 skips it)")
+    parser.add_argument("--max-length", type=int, default=DEFAULT_MAX_LENGTH)
+    parser.add_argument("--shard-dir", default=DEFAULT_SHARD_DIR, help="Where the tokenized records are cached")
+    args = parser.parse_args()
+
+    tokenizer = GPT2Tokenizer.from_pretrained(args.model_dir)
+    model = GPT2LMHeadModel.from_pretrained(args.model_dir)
+    start = time.perf_counter()
+    eval_set = EvalSet.from_file(args.data, tokenizer, args.shard_dir, args.max_length)
+    print(f"Loaded {len(eval_set)} records in {time.perf_counter() - start:.2f}s.")
+    evaluator = Evaluator(eval_set, tokenizer.eos_token_id, args.batch_size, args.exact_match_examples)
+    for name, value in evaluator.evaluate(model).items():
+        print(f"{name:<28} {value:.4f}" if isinstance(value, float) else f"{name:<28} {value}")
@@ -0,0 +1,183 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+from torch import nn
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+from transformers.pytorch_utils import Conv1D
+
+from corpus_encoding import copy_url_refs
+from deployment_model import BACKEND_DIRS, MODEL_DIR, load_model
+from load_test import load_prompts
+
+# File holding the quantized weights inside the int8 export directory
+INT8_WEIGHTS = "quantized_model.pt"
+
+# Held-out questions for the comparison report
+DEFAULT_QUESTIONS_FILE = "validation_data.txt"
+FALLBACK_QUESTIONS_FILE = "training_data.txt"
+
+# Function to replace GPT-2's Conv1D layers (a transposed nn.Linear) with nn.Linear,
+# which is what dynamic quantization knows how to quantize
+def conv1d_to_linear(model):
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                linear = nn.Linear(child.weight.shape[0], child.nf)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+# Function to dynamically quantize every linear layer's weights to int8
+def quantize_model(model):
+    model = conv1d_to_linear(model.eval())
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+# Function to write the int8 model: its config, tokenizer and quantized state dict
+def export_int8(model_dir=MODEL_DIR, output_dir=BACKEND_DIRS["int8"]):
+    model = quantize_model(GPT2LMHeadModel.from_pretrained(model_dir))
+    os.makedirs(output_dir, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    GPT2Tokenizer.from_pretrained(model_dir).save_pretrained(output_dir)
+    copy_url_refs(model_dir, output_dir)
+    torch.save(model.state_dict(), os.path.join(output_dir, INT8_WEIGHTS))
+
+# Function to load an int8 export: rebuild the quantized module layout, then load the weights
+def load_int8_model(model_dir=BACKEND_DIRS["int8"]):
+    model = quantize_model(GPT2LMHeadModel(GPT2Config.from_pretrained(model_dir)))
+    model.load_state_dict(torch.load(os.path.join(model_dir, INT8_WEIGHTS), weights_only=True))
+    return model.eval()
+
+# Function to export an ONNX Runtime model whose graph takes past key/values as inputs,
+# so generation reuses the KV cache
+def export_onnx(model_dir=MODEL_DIR, output_dir=BACKEND_DIRS["onnx"]):
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    model = ORTModelForCausalLM.from_pretrained(model_dir, export=True, use_cache=True)
+    model.save_pretrained(output_dir)
+    GPT2Tokenizer.from_pretrained(model_dir).save_pretrained(output_dir)
+    copy_url_refs(model_dir, output_dir)
+
+EXPORTERS = {"int8": export_int8, "onnx": export_onnx}
+
+# Function to get the size on disk of a model's weight files in MB
+def weights_size_mb(model_dir):
+    suffixes = (".safetensors", ".bin", ".pt", ".onnx", ".onnx_data")
+    total = 0
+    for name in os.listdir(model_dir):
+        if name.endswith(suffixes):
+            total += os.path.getsize(os.path.join(model_dir, name))
+    return total / (1024 * 1024)
+
+# Function to get this process's current resident set size in MB (Linux only)
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+# Function to greedily answer every question on one backend and time it
+# (runs in a fresh process so the RSS numbers are not shared between backends)
+def benchmark_backend(backend, model_dir, questions, max_new_tokens):
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    model, tokenizer = load_model(model_dir, backend)
+    load_seconds = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    answers = []
+    tokens = 0
+    seconds = 0.0
+    with torch.inference_mode():
+        for question in questions:
+            inputs = tokenizer(question, return_tensors="pt")
+            start = time.perf_counter()
+            outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+            seconds += time.perf_counter() - start
+            new_tokens = outputs[0, inputs["input_ids"].shape[1]:].tolist()
+            tokens += len(new_tokens)
+            answers.append(new_tokens)
+
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "weights_mb": weights_size_mb(model_dir),
+        "rss_mb": rss_after - rss_before if rss_before is not None else None,
+        "tokens_per_second": tokens / seconds if seconds else 0.0,
+        "answers": answers,
+    }
+
+# Function to compare backends against the fp32 model: tokens/sec, memory and how often
+# they give the same answer (exactly, and as the share of tokens before they diverge)
+def compare_backends(backends, questions, max_new_tokens=32, fp32_dir=MODEL_DIR):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend in ["fp32"] + [backend for backend in backends if backend != "fp32"]:
+        model_dir = fp32_dir if backend == "fp32" else BACKEND_DIRS[backend]
+        if not os.path.isdir(model_dir):
+            print(f"Skipping {backend}: {model_dir} does not exist (run the export first).")
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(benchmark_backend, backend, model_dir, questions, max_new_tokens).result())
+
+    reference = results[0]["answers"] if results and results[0]["backend"] == "fp32" else None
+    for result in results:
+        if reference is None:
+            result["exact_agreement"] = result["token_agreement"] = None
+            continue
+        exact = 0
+        matched = 0
+        for answer, expected in zip(result["answers"], reference):
+            exact += answer == expected
+            for token, expected_token in zip(answer, expected):
+                if token != expected_token:
+                    break
+                matched += 1
+        result["exact_agreement"] = exact / len(reference) if reference else 0.0
+        result["token_agreement"] = matched / max(1, sum(len(expected) for expected in reference))
+    return results
+
+# Function to pick the held-out templated questions, falling back to a sample of the
+# training questions while there is no validation split
+def held_out_questions(path=DEFAULT_QUESTIONS_FILE, limit=50):
+    if os.path.exists(path) and os.path.getsize(path):
+        return load_prompts(path, limit)
+    return load_prompts(FALLBACK_QUESTIONS_FILE, limit * 10)[::10]
+
+def print_report(results):
+    print(f"{'backend':<8} {'tokens/sec':>10} {'weights MB':>10} {'RSS MB':>8} {'load s':>7} {'exact':>7} {'tokens':>7}")
+    for result in results:
+        rss = f"{result['rss_mb']:.0f}" if result["rss_mb"] is not None else "n/a"
+        exact = f"{result['exact_agreement']:.1%}" if result["exact_agreement"] is not None else "n/a"
+        tokens = f"{result['token_agreement']:.1%}" if result["token_agreement"] is not None else "n/a"
+        print(f"{result['backend']:<8} {result['tokens_per_second']:>10.1f} {result['weights_mb']:>10.1f} {rss:>8} {result['load_seconds']:>7.2f} {exact:>7} {tokens:>7}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export int8 and ONNX Runtime versions of the fine-tuned model and compare them with fp32.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="fp32 checkpoint to export from")
+    parser.add_argument("--formats", nargs="*", choices=list(EXPORTERS), default=list(EXPORTERS), help="Backends to export")
+    parser.add_argument("--report", action="store_true", help="Compare the exported backends with fp32 after exporting")
+    parser.add_argument("--skip-export", action="store_true", help="Only run the report on existing exports")
+    parser.add_argument("--questions-file", default=DEFAULT_QUESTIONS_FILE)
+    parser.add_argument("--questions", type=int, default=50, help="Number of held-out questions in the report")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        for backend in args.formats:
+            start = time.perf_counter()
+            try:
+                EXPORTERS[backend](args.model_dir, BACKEND_DIRS[backend])
+                print(f"Exported {backend} model to {BACKEND_DIRS[backend]} in {time.perf_counter() - start:.1f}s.")
+            except Exception as e:
+                print(f"Error exporting the {backend} model: {e}")
+
+    if args.report or args.skip_export:
+        questions = held_out_questions(args.questions_file, args.questions)
+        print(f"Comparing backends on {len(questions)} held-out questions...")
+        print_report(compare_backends(args.formats, questions, args.max_new_tokens, args.model_dir))
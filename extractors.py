@@ -0,0 +1,143 @@
+import argparse
+import os
+import time
+from functools import lru_cache
+
+from lxml import etree, html
+
+from metrics import get_metrics
+
+# Value used when a field selector does not match anything
+MISSING = "N/A"
+
+# XPath equivalent of the CSS ".class" selector
+def has_class(class_name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+# A compiled rule that turns every container match into one record
+class RecordRule:
+    def __init__(self, container_xpath, fields, default=MISSING):
+        self.container = etree.XPath(container_xpath)
+        self.fields = [(name, etree.XPath(f"string({xpath})")) for name, xpath in fields.items()]
+        self.default = default
+
+    def apply(self, tree):
+        records = []
+        for container in self.container(tree):
+            record = {}
+            for name, xpath in self.fields:
+                value = xpath(container).strip()
+                if not value:
+                    value = self.default
+                    get_metrics().inc("selector_misses_total", field=name)
+                record[name] = value
+            records.append(record)
+        return records
+
+# Doctor profile page: "#overview > div > div > div.dr-details" with the name in an h1
+# and specialization / degree in the 3rd / 4th child paragraphs
+OVERVIEW_PARAGRAPH = "./*[{}][self::p][../parent::div/parent::div/parent::*[@id='overview']]"
+
+DOCTOR_RULE = RecordRule(
+    container_xpath=f"//div[{has_class('dr-details')}]",
+    fields={
+        "name": f"(.//h1[{has_class('dr-details-name')}])[1]",
+        "specialization": OVERVIEW_PARAGRAPH.format(3),
+        "degree": OVERVIEW_PARAGRAPH.format(4),
+    },
+)
+
+# Function to compile (once per XPath) the rule for a <ul> of links
+@lru_cache(maxsize=None)
+def listing_rule(container_xpath):
+    return RecordRule(
+        container_xpath=f"({container_xpath})[1]//li[.//a]",
+        fields={"Name": "(.//a)[1]", "Link": "(.//a)[1]/@href"},
+        default="",
+    )
+
+# Function to compile (once per class list) the rule for link cards such as
+# <div class="speciality-title font700"><a href=...>Name</a></div>
+@lru_cache(maxsize=None)
+def card_rule(class_names):
+    classes = " and ".join(has_class(name) for name in class_names.split())
+    return RecordRule(
+        container_xpath=f"//div[{classes}][.//a[@href]]",
+        fields={"Name": "(.//a[@href])[1]", "Link": "(.//a[@href])[1]/@href"},
+        default="Unnamed",
+    )
+
+# Class of the department cards on the speciality listing page
+DEPARTMENT_CLASS = "speciality-title font700"
+
+# Function to parse raw page bytes (or text) into an lxml tree, once per page
+def parse_page(page_content):
+    if isinstance(page_content, str):
+        page_content = page_content.encode("utf-8")
+    return html.fromstring(page_content)
+
+# Function to extract (name, specialization, degree, hospital_name, link) tuples
+def extract_doctor_details(page_content, url, hospital_name):
+    tree = parse_page(page_content)
+    return [
+        (record["name"], record["specialization"], record["degree"], hospital_name, url)
+        for record in DOCTOR_RULE.apply(tree)
+    ]
+
+# Function to extract {"Name", "Link"} items from a sitemap-style list
+def extract_listing(page_content, container_xpath, tree=None):
+    if tree is None:
+        tree = parse_page(page_content)
+    return listing_rule(container_xpath).apply(tree)
+
+# Function to extract {"Name", "Link"} items from a speciality listing page
+def extract_departments(page_content, class_name=DEPARTMENT_CLASS):
+    return card_rule(class_name).apply(parse_page(page_content))
+
+# BeautifulSoup implementation the doctor rule replaced, kept for benchmarking
+def bs4_doctor_details(page_content, url, hospital_name):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_content, "html.parser")
+    doctors = []
+    for container in soup.select("div.dr-details"):
+        name = container.find("h1", class_="dr-details-name").text.strip() if container.find("h1", class_="dr-details-name") else "N/A"
+        specialization = container.select_one("#overview > div > div > div.dr-details > p:nth-child(3)").text.strip() if container.select_one("#overview > div > div > div.dr-details > p:nth-child(3)") else "N/A"
+        degree = container.select_one("#overview > div > div > div.dr-details > p:nth-child(4)").text.strip() if container.select_one("#overview > div > div > div.dr-details > p:nth-child(4)") else "N/A"
+        doctors.append((name, specialization, degree, hospital_name, url))
+    return doctors
+
+# Function to measure pages/sec of a parse function over a set of saved pages
+def measure_pages_per_second(parse, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path, content in pages:
+            parse(content, path, "Medanta, IN")
+    elapsed = time.perf_counter() - start
+    return len(pages) * repeat / elapsed
+
+# Benchmark the lxml extractor against the BeautifulSoup path on fixture pages
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report doctor page parse throughput.")
+    parser.add_argument("fixture_dir", nargs="?", default="fixtures/doctor_pages")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = []
+    for filename in sorted(os.listdir(args.fixture_dir)):
+        if filename.endswith(".html"):
+            path = os.path.join(args.fixture_dir, filename)
+            with open(path, "rb") as f:
+                pages.append((path, f.read()))
+
+    if not pages:
+        print(f"No .html fixtures found in {args.fixture_dir}.")
+    else:
+        for path, content in pages:
+            if extract_doctor_details(content, path, "Medanta, IN") != bs4_doctor_details(content, path, "Medanta, IN"):
+                print(f"Warning: extractor output differs from BeautifulSoup for {path}")
+
+        lxml_rate = measure_pages_per_second(extract_doctor_details, pages, args.repeat)
+        bs4_rate = measure_pages_per_second(bs4_doctor_details, pages, args.repeat)
+        print(f"BeautifulSoup (html.parser): {bs4_rate:.0f} pages/sec")
+        print(f"lxml compiled rules:         {lxml_rate:.0f} pages/sec ({lxml_rate / bs4_rate:.1f}x)")
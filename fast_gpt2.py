@@ -0,0 +1,207 @@
+import json
+import os
+import struct
+from types import SimpleNamespace
+
+import torch
+import torch.nn.functional as F
+
+# Lean GPT-2 runtime for short-lived processes: needs only torch and tokenizers (no
+# transformers import), memory-maps the safetensors checkpoint instead of copying it,
+# and decodes greedily with a KV cache, giving the same tokens as model.generate.
+
+WEIGHTS_FILE = "model.safetensors"
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+ACTIVATIONS = {
+    "gelu_new": lambda x: F.gelu(x, approximate="tanh"),
+    "gelu_pytorch_tanh": lambda x: F.gelu(x, approximate="tanh"),
+    "gelu": F.gelu,
+    "relu": F.relu,
+}
+
+# Function to map a safetensors file into memory and return its tensors as views of
+# the mapping; pages are only read from disk when a tensor is first touched
+def mmap_safetensors(path):
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
+    base = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = info["data_offsets"]
+        tensors[name] = data[base + start:base + end].view(SAFETENSORS_DTYPES[info["dtype"]]).view(info["shape"])
+    return tensors
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Function to tell whether the lean runtime can serve a checkpoint exactly: a plain
+# GPT-2 with safetensors weights and a greedy generation config
+def supports(model_dir):
+    try:
+        config = read_json(os.path.join(model_dir, "config.json"))
+    except (OSError, ValueError):
+        return False
+    generation = {}
+    if os.path.exists(os.path.join(model_dir, "generation_config.json")):
+        generation = read_json(os.path.join(model_dir, "generation_config.json"))
+    return (
+        config.get("model_type") == "gpt2"
+        and config.get("activation_function", "gelu_new") in ACTIVATIONS
+        and not config.get("scale_attn_by_inverse_layer_idx")
+        and not config.get("reorder_and_upcast_attn")
+        and not generation.get("do_sample")
+        and generation.get("num_beams", 1) == 1
+        and generation.get("repetition_penalty", 1.0) == 1.0
+        and not generation.get("no_repeat_ngram_size")
+        and os.path.exists(os.path.join(model_dir, WEIGHTS_FILE))
+    )
+
+# GPT-2 forward pass written directly against the checkpoint tensors. Conv1D weights
+# are stored (in, out), so projections are x @ weight + bias.
+class FastGPT2:
+    def __init__(self, config, tensors):
+        self.config = SimpleNamespace(**config)
+        self.generation_config = SimpleNamespace(do_sample=False)
+        self.eos_token_id = config.get("eos_token_id")
+        self.n_embd = config["n_embd"]
+        self.n_head = config["n_head"]
+        self.eps = config.get("layer_norm_epsilon", 1e-5)
+        self.scale = None if config.get("scale_attn_weights", True) else 1.0
+        self.activation = ACTIVATIONS[config.get("activation_function", "gelu_new")]
+
+        # Checkpoints saved from GPT2LMHeadModel prefix the body with "transformer."
+        weights = {name[len("transformer."):] if name.startswith("transformer.") else name: tensor for name, tensor in tensors.items()}
+        self.wte = weights["wte.weight"]
+        self.wpe = weights["wpe.weight"]
+        self.ln_f = (weights["ln_f.weight"], weights["ln_f.bias"])
+        # The LM head is tied to the token embeddings unless saved separately
+        self.lm_head = weights.get("lm_head.weight", self.wte)
+        self.layers = [
+            {name: weights[f"h.{i}.{name}"] for name in (
+                "ln_1.weight", "ln_1.bias", "attn.c_attn.weight", "attn.c_attn.bias", "attn.c_proj.weight", "attn.c_proj.bias",
+                "ln_2.weight", "ln_2.bias", "mlp.c_fc.weight", "mlp.c_fc.bias", "mlp.c_proj.weight", "mlp.c_proj.bias",
+            )}
+            for i in range(config["n_layer"])
+        ]
+
+    @classmethod
+    def from_pretrained(cls, model_dir):
+        config = read_json(os.path.join(model_dir, "config.json"))
+        return cls(config, mmap_safetensors(os.path.join(model_dir, WEIGHTS_FILE)))
+
+    def layer_norm(self, x, weight, bias):
+        return F.layer_norm(x, (self.n_embd,), weight, bias, self.eps)
+
+    def attention(self, x, layer, layer_past):
+        batch, length, _ = x.shape
+        head_dim = self.n_embd // self.n_head
+        q, k, v = (x @ layer["attn.c_attn.weight"] + layer["attn.c_attn.bias"]).split(self.n_embd, dim=-1)
+        q, k, v = (t.view(batch, length, self.n_head, head_dim).transpose(1, 2) for t in (q, k, v))
+        if layer_past is not None:
+            k = torch.cat([layer_past[0], k], dim=2)
+            v = torch.cat([layer_past[1], v], dim=2)
+        # Each new position sees the cached positions and the new ones up to itself
+        mask = None
+        if length > 1:
+            mask = torch.ones(length, k.shape[2], dtype=torch.bool).tril(k.shape[2] - length)
+        out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask, scale=self.scale)
+        out = out.transpose(1, 2).reshape(batch, length, self.n_embd)
+        return out @ layer["attn.c_proj.weight"] + layer["attn.c_proj.bias"], (k, v)
+
+    # Function to run new tokens through the model; returns the last position's logits
+    # and the updated KV cache
+    def forward(self, input_ids, past=None):
+        past_length = past[0][0].shape[2] if past else 0
+        positions = torch.arange(past_length, past_length + input_ids.shape[1])
+        x = self.wte[input_ids] + self.wpe[positions]
+        new_past = []
+        for i, layer in enumerate(self.layers):
+            attn, layer_cache = self.attention(self.layer_norm(x, layer["ln_1.weight"], layer["ln_1.bias"]), layer, past[i] if past else None)
+            new_past.append(layer_cache)
+            x = x + attn
+            h = self.layer_norm(x, layer["ln_2.weight"], layer["ln_2.bias"])
+            h = self.activation(h @ layer["mlp.c_fc.weight"] + layer["mlp.c_fc.bias"])
+            x = x + h @ layer["mlp.c_proj.weight"] + layer["mlp.c_proj.bias"]
+        x = self.layer_norm(x[:, -1:], *self.ln_f)
+        return x @ self.lm_head.T, new_past
+
+    # Function to greedily extend input_ids (1 x prompt length) up to max_length tokens,
+    # stopping at end of text; mirrors the arguments deployment_model passes to generate
+    @torch.inference_mode()
+    def generate(self, input_ids, max_length=50, num_return_sequences=1, streamer=None, **kwargs):
+        if streamer is not None:
+            streamer.put(input_ids)
+        tokens = input_ids
+        past = None
+        next_input = input_ids
+        while tokens.shape[1] < min(max_length, self.config.n_positions):
+            logits, past = self.forward(next_input, past)
+            next_input = logits[:, -1].argmax(dim=-1, keepdim=True)
+            tokens = torch.cat([tokens, next_input], dim=1)
+            if streamer is not None:
+                streamer.put(next_input[0])
+            if next_input.item() == self.eos_token_id:
+                break
+        if streamer is not None:
+            streamer.end()
+        return tokens
+
+# GPT-2 byte-level BPE tokenizer on the tokenizers library, built from tokenizer.json or
+# the vocab.json/merges.txt pair save_pretrained writes; offers the encode/decode calls
+# deployment_model makes
+class FastTokenizer:
+    def __init__(self, tokenizer, eos_token_id=None):
+        self.tokenizer = tokenizer
+        self.eos_token_id = eos_token_id
+        self.special_ids = {eos_token_id} if eos_token_id is not None else set()
+
+    @classmethod
+    def from_pretrained(cls, model_dir):
+        from tokenizers import Tokenizer, decoders, pre_tokenizers
+        from tokenizers.models import BPE
+
+        path = os.path.join(model_dir, "tokenizer.json")
+        if os.path.exists(path):
+            tokenizer = Tokenizer.from_file(path)
+        else:
+            tokenizer = Tokenizer(BPE.from_file(os.path.join(model_dir, "vocab.json"), os.path.join(model_dir, "merges.txt")))
+            tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+            tokenizer.decoder = decoders.ByteLevel()
+            tokenizer.add_special_tokens(["<|endoftext|>"])
+            # Domain tokens added before fine-tuning (see corpus_encoding.py), in ID order
+            added = os.path.join(model_dir, "added_tokens.json")
+            if os.path.exists(added):
+                tokens = sorted(read_json(added).items(), key=lambda item: item[1])
+                tokenizer.add_tokens([token for token, _ in tokens if tokenizer.token_to_id(token) is None])
+        return cls(tokenizer, tokenizer.token_to_id("<|endoftext|>"))
+
+    def encode(self, text, return_tensors=None):
+        ids = self.tokenizer.encode(text, add_special_tokens=False).ids
+        return torch.tensor([ids]) if return_tensors == "pt" else ids
+
+    # Added tokens are decoded as they are written, so spaces_between_special_tokens
+    # (which the transformers tokenizer needs set to False for them) has nothing to change
+    def decode(self, ids, skip_special_tokens=False, spaces_between_special_tokens=False):
+        ids = ids.tolist() if hasattr(ids, "tolist") else list(ids)
+        if skip_special_tokens:
+            ids = [token for token in ids if token not in self.special_ids]
+        return self.tokenizer.decode(ids, skip_special_tokens=False)
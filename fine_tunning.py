@@ -1,55 +1,203 @@
-from transformers import GPT2Tokenizer, GPT2LMHeadModel, Trainer, TrainingArguments, TextDataset, DataCollatorForLanguageModeling
+import argparse
+import os
 
-# Load tokenizer and model
-tokenizer = GPT2Tokenizer.from_pretrained("gpt2")
-model = GPT2LMHeadModel.from_pretrained("gpt2")
+from transformers import GPT2Tokenizer, GPT2LMHeadModel, Trainer, TrainingArguments, DataCollatorForLanguageModeling, EarlyStoppingCallback
+
+from corpus_encoding import DEFAULT_MIN_COUNT, ENCODINGS, apply_encoding, init_token_embeddings
+from evaluation import DEFAULT_EVAL_BATCH_SIZE, DEFAULT_EXACT_MATCH_EXAMPLES, EvalSet, Evaluator
+from preprocess_csv import peak_rss_mb
+from token_shards import DEFAULT_SHARD_DIR, ShardedBlockDataset
 
 # Tokenize your dataset
 train_path = "training_data.txt"  # Your preprocessed text file
 valid_path = "validation_data.txt"
 
-def load_dataset(path, tokenizer, block_size=128):
-    with open(path, encoding="utf-8") as f:
-        text = f.read()
-    return TextDataset(
-        tokenizer=tokenizer,
-        file_path=path,
-        block_size=block_size,
-        overwrite_cache=True,
+# Where the deployable model is saved (full fine-tune, or LoRA adapters merged into the base)
+FINAL_MODEL_DIR = "./fine_tuned_gpt2"
+
+# GPT-2 projections the LoRA adapters are attached to; they are Conv1D layers, whose
+# weights are stored transposed (fan_in x fan_out)
+LORA_TARGET_MODULES = ["c_attn", "c_proj"]
+
+# Token IDs are cached as uint16 memory-mapped shards in shard_dir and a file is
+# only re-tokenized when its content hash (or the tokenizer) changes
+def load_dataset(path, tokenizer, block_size=128, shard_dir=DEFAULT_SHARD_DIR):
+    return ShardedBlockDataset.from_files([path], tokenizer, shard_dir, block_size)
+
+# Function to wrap the model with trainable low-rank adapters; the base weights stay frozen
+# except for the embedding rows of new_token_ids (tokens added to the vocabulary)
+def add_lora_adapters(model, r=8, alpha=16, dropout=0.05, new_token_ids=None):
+    from peft import LoraConfig, get_peft_model
+
+    config = LoraConfig(
+        task_type="CAUSAL_LM",
+        r=r,
+        lora_alpha=alpha,
+        lora_dropout=dropout,
+        target_modules=LORA_TARGET_MODULES,
+        fan_in_fan_out=True,
+        trainable_token_indices={"wte": new_token_ids} if new_token_ids else None,
+    )
+    return get_peft_model(model, config)
+
+# Function to fold the trained adapters into the base weights, giving a plain GPT-2
+# checkpoint that deployment loads like a full fine-tune
+def merge_lora_adapters(model):
+    return model.merge_and_unload()
+
+# Trainer whose periodic evaluation runs the batched held-out Evaluator instead of the
+# default loop over the validation blocks; the metrics feed checkpoint selection and
+# early stopping like the default ones
+class HeldOutTrainer(Trainer):
+    def __init__(self, *args, evaluator=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evaluator = evaluator
+
+    def evaluate(self, eval_dataset=None, ignore_keys=None, metric_key_prefix="eval"):
+        if self.evaluator is None:
+            return super().evaluate(eval_dataset, ignore_keys, metric_key_prefix)
+        metrics = self.evaluator.evaluate(self.model, metric_key_prefix)
+        self.log(metrics)
+        self.control = self.callback_handler.on_evaluate(self.args, self.state, self.control, metrics)
+        return metrics
+
+# Function to print step time, peak memory and final loss of a training run
+def report_training(mode, train_result, trainer):
+    steps = trainer.state.global_step
+    runtime = train_result.metrics.get("train_runtime", 0.0)
+    losses = [entry["loss"] for entry in trainer.state.log_history if "loss" in entry]
+    final_loss = losses[-1] if losses else train_result.training_loss
+    peak_rss, _ = peak_rss_mb()
+    trainable = sum(p.numel() for p in trainer.model.parameters() if p.requires_grad)
+    total = sum(p.numel() for p in trainer.model.parameters())
+    print(f"{mode} fine-tune: {steps} steps, {runtime / steps if steps else 0.0:.3f}s/step, final loss {final_loss:.4f}, "
+          f"average loss {train_result.training_loss:.4f}, {trainable} of {total} parameters trained"
+          + (f", peak RSS {peak_rss:.0f} MB." if peak_rss is not None else "."))
+    if trainer.state.best_metric is not None:
+        print(f"Best eval loss {trainer.state.best_metric:.4f} at step {trainer.state.best_global_step} "
+              f"(checkpoint {trainer.state.best_model_checkpoint}).")
+
+# Function to build the command-line parser
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fine-tune GPT-2 on the Q/A corpus, fully or with LoRA adapters.")
+    parser.add_argument("--mode", choices=["full", "lora"], default="full", help="Train every weight, or low-rank adapters on a frozen base")
+    parser.add_argument("--base-model", default="gpt2")
+    parser.add_argument("--output-dir", default="./gpt2-finetuned", help="Checkpoint directory (adapter-only checkpoints in LoRA mode)")
+    parser.add_argument("--final-dir", default=FINAL_MODEL_DIR, help="Where the deployable (merged) model is saved")
+    parser.add_argument("--epochs", type=float, default=3)
+    parser.add_argument("--max-steps", type=int, default=-1, help="Stop after this many optimizer steps (overrides --epochs)")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--gradient-accumulation-steps", type=int, default=1)
+    parser.add_argument("--gradient-checkpointing", action="store_true", help="Recompute activations in the backward pass to save memory")
+    parser.add_argument("--learning-rate", type=float, help="Default: 5e-5 (full) or 2e-4 (LoRA)")
+    parser.add_argument("--lora-r", type=int, default=8)
+    parser.add_argument("--lora-alpha", type=int, default=16)
+    parser.add_argument("--lora-dropout", type=float, default=0.05)
+    parser.add_argument("--logging-steps", type=int, default=50)
+    parser.add_argument("--encoding", choices=ENCODINGS, default="none", help="Add domain tokens to the tokenizer and/or replace URLs with references deployment expands (see corpus_encoding.py)")
+    parser.add_argument("--eval-steps", type=int, default=100, help="Evaluate on the validation split (and checkpoint) every this many steps")
+    parser.add_argument("--eval-batch-size", type=int, default=DEFAULT_EVAL_BATCH_SIZE)
+    parser.add_argument("--exact-match-examples", type=int, default=DEFAULT_EXACT_MATCH_EXAMPLES, help="Validation answers generated for the exact-match score at each evaluation (0 skips it)")
+    parser.add_argument("--early-stopping-patience", type=int, default=3, help="Stop after this many evaluations without a lower eval loss (0 never stops early)")
+    parser.add_argument("--early-stopping-threshold", type=float, default=0.0, help="Smallest eval loss decrease that counts as an improvement")
+    parser.add_argument("--min-token-count", type=int, default=DEFAULT_MIN_COUNT, help="Occurrences a hospital name or URL prefix needs to become a domain token")
+    return parser
+
+# Function to build the Trainer arguments. Evaluation, checkpoint selection and restoring
+# the best checkpoint at the end are only switched on with a held-out evaluator.
+def training_arguments(args, evaluator=None):
+    return TrainingArguments(
+        output_dir=args.output_dir,
+        overwrite_output_dir=True,
+        num_train_epochs=args.epochs,
+        max_steps=args.max_steps,
+        per_device_train_batch_size=args.batch_size,
+        gradient_accumulation_steps=args.gradient_accumulation_steps,
+        gradient_checkpointing=args.gradient_checkpointing,
+        gradient_checkpointing_kwargs={"use_reentrant": False} if args.gradient_checkpointing else None,
+        eval_strategy="steps" if evaluator is not None else "no",
+        eval_steps=args.eval_steps,
+        # Checkpoints line up with evaluations so the best one can be restored at the end
+        save_steps=args.eval_steps if evaluator is not None else 500,
+        save_total_limit=2,
+        load_best_model_at_end=evaluator is not None,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        logging_dir="./logs",
+        logging_steps=args.logging_steps,
+        learning_rate=args.learning_rate or (2e-4 if args.mode == "lora" else 5e-5),
+    )
+
+# Function to get the Trainer callbacks: early stopping on the eval loss, when there is
+# an evaluator and a patience
+def training_callbacks(args, evaluator=None):
+    if evaluator is None or args.early_stopping_patience <= 0:
+        return []
+    return [EarlyStoppingCallback(args.early_stopping_patience, args.early_stopping_threshold)]
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    # Load tokenizer and model
+    tokenizer = GPT2Tokenizer.from_pretrained(args.base_model)
+    model = GPT2LMHeadModel.from_pretrained(args.base_model)
+
+    # Optionally encode the corpus more compactly; new tokens start from their pieces' embeddings
+    (train_file, valid_file), url_refs, added_tokens = apply_encoding(args.encoding, [train_path, valid_path], tokenizer, args.min_token_count)
+    if added_tokens:
+        init_token_embeddings(model, tokenizer, GPT2Tokenizer.from_pretrained(args.base_model), added_tokens)
+        print(f"Added {len(added_tokens)} domain tokens to the tokenizer.")
+    if url_refs is not None:
+        print(f"Replaced {len(url_refs)} URLs with references.")
+
+    if args.mode == "lora":
+        model = add_lora_adapters(model, args.lora_r, args.lora_alpha, args.lora_dropout, tokenizer.convert_tokens_to_ids(added_tokens))
+        model.print_trainable_parameters()
+
+    train_dataset = load_dataset(train_file, tokenizer)
+    valid_dataset = load_dataset(valid_file, tokenizer)
+
+    # Held-out evaluation on the split dedup.py --validation-output writes
+    eval_set = EvalSet.from_file(valid_file, tokenizer) if os.path.exists(valid_file) else None
+    evaluator = None
+    if eval_set:
+        evaluator = Evaluator(eval_set, tokenizer.eos_token_id, args.eval_batch_size, args.exact_match_examples)
+        print(f"Evaluating on {len(eval_set)} held-out records every {args.eval_steps} steps.")
+    else:
+        print(f"No validation records in {valid_file}; training without evaluation or early stopping.")
+
+    # Data collator
+    data_collator = DataCollatorForLanguageModeling(
+        tokenizer=tokenizer, mlm=False
+    )
+
+    # Training arguments
+    training_args = training_arguments(args, evaluator)
+
+    # Trainer; with a PEFT model its checkpoints hold only the adapter weights
+    trainer = HeldOutTrainer(
+        model=model,
+        args=training_args,
+        data_collator=data_collator,
+        train_dataset=train_dataset,
+        eval_dataset=valid_dataset,
+        callbacks=training_callbacks(args, evaluator),
+        evaluator=evaluator,
     )
 
-train_dataset = load_dataset(train_path, tokenizer)
-valid_dataset = load_dataset(valid_path, tokenizer)
-
-# Data collator
-data_collator = DataCollatorForLanguageModeling(
-    tokenizer=tokenizer, mlm=False
-)
-
-# Training arguments
-training_args = TrainingArguments(
-    output_dir="./gpt2-finetuned",
-    overwrite_output_dir=True,
-    num_train_epochs=3,
-    per_device_train_batch_size=4,
-    save_steps=500,
-    save_total_limit=2,
-    logging_dir="./logs",
-    learning_rate=5e-5,
-)
-
-# Trainer
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    data_collator=data_collator,
-    train_dataset=train_dataset,
-    eval_dataset=valid_dataset,
-)
-
-# Train
-trainer.train()
-
-
-model.save_pretrained("./fine_tuned_gpt2")
-tokenizer.save_pretrained("./fine_tuned_gpt2")
\ No newline at end of file
+    # Train
+    train_result = trainer.train()
+    report_training(args.mode, train_result, trainer)
+
+    if args.mode == "lora":
+        trainer.save_model(os.path.join(args.output_dir, "adapter"))
+        model = merge_lora_adapters(model)
+
+    model.save_pretrained(args.final_dir)
+    tokenizer.save_pretrained(args.final_dir)
+    # The lean runtime prefers tokenizer.json, which this tokenizer does not write; drop
+    # one left by an earlier save so it cannot miss the added tokens
+    if added_tokens and os.path.exists(os.path.join(args.final_dir, "tokenizer.json")):
+        os.remove(os.path.join(args.final_dir, "tokenizer.json"))
+    if url_refs is not None:
+        url_refs.save(args.final_dir)
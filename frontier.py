@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import posixpath
+import re
+import struct
+from array import array
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# Where the set of already-crawled entities is kept between runs
+DEFAULT_FRONTIER_PATH = "frontier.bin"
+
+# File headers of the two on-disk formats
+SET_MAGIC = b"FRSET001"
+BLOOM_MAGIC = b"FRBLOOM1"
+
+# Default false-positive rate of the Bloom filter
+DEFAULT_ERROR_RATE = 0.0001
+
+# Query parameters that only track the visit and never change the page
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|_ga|ref)$", re.IGNORECASE)
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# Path segments that introduce an entity slug, mapped to the entity kind, e.g.
+# .../speciality/cardiology/doctor/dr-x is the doctor "dr-x"
+ENTITY_SEGMENTS = {
+    "doctor": "doctor",
+    "doctors": "doctor",
+    "treatment": "treatment",
+    "treatments": "treatment",
+    "speciality": "speciality",
+    "specialities": "speciality",
+}
+
+# Function to canonicalize a URL: resolve it against base, lowercase scheme and host,
+# drop default ports, fragments, tracking parameters, dot segments, repeated and
+# trailing slashes, and sort the remaining query parameters
+def canonicalize_url(url, base=None):
+    url = url.strip()
+    if base:
+        url = urljoin(base, url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path)
+    if path:
+        path = posixpath.normpath(path)
+    path = path.rstrip("/") or "/"
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(key)]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+# Function to get the key that identifies what a URL points at. Doctor, treatment and
+# speciality pages are keyed by hospital branch, kind and slug, so a doctor listed
+# under several specialities is one entity; other pages by host, path and query.
+# The scheme and a leading "www." are ignored.
+def entity_key(url):
+    parts = urlsplit(canonicalize_url(url))
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if len(segments) >= 2 and segments[-2] in ENTITY_SEGMENTS:
+        first_kind = next(i for i, segment in enumerate(segments) if segment in ENTITY_SEGMENTS)
+        branch = "/".join(segments[:first_kind])
+        return f"{host}/{branch}|{ENTITY_SEGMENTS[segments[-2]]}|{segments[-1]}"
+    return f"{host}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+# Function to hash an entity key to 128 bits
+def key_digest(key):
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+# Exact set of 64-bit key hashes, stored on disk as a sorted array (8 bytes per entity)
+class HashSet:
+    def __init__(self, values=()):
+        self.values = set(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, digest):
+        return int.from_bytes(digest[:8], "little") in self.values
+
+    def add(self, digest):
+        self.values.add(int.from_bytes(digest[:8], "little"))
+
+    def to_bytes(self):
+        return SET_MAGIC + array("Q", sorted(self.values)).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        values = array("Q")
+        values.frombytes(data[len(SET_MAGIC):])
+        return cls(values)
+
+# Bloom filter sized for `capacity` keys at `error_rate` false positives; about 2.4
+# bytes per entity at 0.01%, for frontiers too large to keep exactly. A false positive
+# makes a new entity look crawled, so runs that skip crawled entities miss it.
+class BloomFilter:
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE, num_bits=None, num_hashes=None, bits=None, count=0):
+        self.num_bits = num_bits or max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    # Function to get the bit positions of a digest (double hashing on its two halves)
+    def positions(self, digest):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, digest):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(digest))
+
+    def add(self, digest):
+        if digest in self:
+            return
+        for p in self.positions(digest):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def to_bytes(self):
+        return BLOOM_MAGIC + struct.pack("<QIQ", self.num_bits, self.num_hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        num_bits, num_hashes, count = struct.unpack_from("<QIQ", data, len(BLOOM_MAGIC))
+        offset = len(BLOOM_MAGIC) + struct.calcsize("<QIQ")
+        return cls(None, num_bits=num_bits, num_hashes=num_hashes, bits=bytearray(data[offset:]), count=count)
+
+# Crawl frontier: canonicalizes links, drops those pointing at an entity already queued
+# in this run, and remembers crawled entities between runs in `path` (an exact hash set,
+# or a Bloom filter when bloom_capacity is given), so a run can opt into skipping them.
+# Without a path nothing is persisted.
+class Frontier:
+    def __init__(self, path=None, bloom_capacity=None, error_rate=DEFAULT_ERROR_RATE):
+        self.path = path
+        self.crawled = None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            if data.startswith(BLOOM_MAGIC):
+                self.crawled = BloomFilter.from_bytes(data)
+            elif data.startswith(SET_MAGIC):
+                self.crawled = HashSet.from_bytes(data)
+            else:
+                print(f"Ignoring {path}: not a frontier file.")
+        if self.crawled is None:
+            self.crawled = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else HashSet()
+        self.queued = set()
+        self.duplicates = 0
+        self.already_crawled = 0
+
+    def __len__(self):
+        return len(self.crawled)
+
+    def was_crawled(self, url):
+        return key_digest(entity_key(url)) in self.crawled
+
+    # Function to queue links (absolute or relative to base); returns the canonical URLs
+    # of entities not queued in this run yet and, with skip_crawled, not crawled before.
+    # Of several links to one entity the lexicographically smallest is kept, so the
+    # same URL (the database key) is chosen whatever order the lists come in.
+    def add_links(self, links, base=None, skip_crawled=False):
+        chosen = {}
+        for link in links:
+            url = canonicalize_url(link, base)
+            key = entity_key(url)
+            if key in self.queued:
+                self.duplicates += 1
+                continue
+            if key in chosen:
+                self.duplicates += 1
+                chosen[key] = min(chosen[key], url)
+                continue
+            if skip_crawled and key_digest(key) in self.crawled:
+                self.already_crawled += 1
+                self.queued.add(key)
+                continue
+            chosen[key] = url
+        self.queued.update(chosen)
+        return list(chosen.values())
+
+    # Function to record that a URL's entity was crawled successfully
+    def mark_crawled(self, url):
+        self.crawled.add(key_digest(entity_key(url)))
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(self.crawled.to_bytes())
+        os.replace(self.path + ".tmp", self.path)
+
+    def report(self):
+        return f"{self.duplicates} duplicate links, {self.already_crawled} already crawled, {len(self.crawled)} entities crawled in total"
+
+# Function to read the links of a scraped list file (a list of {"Link"} items, or a
+# dict holding such lists)
+def read_links(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    items = data if isinstance(data, list) else [item for value in data.values() if isinstance(value, list) for item in value]
+    return [item["Link"] for item in items if isinstance(item, dict) and item.get("Link")]
+
+# Report how many fetches canonicalization and entity deduplication save on the lists
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show how many links of the scraped lists point at the same page or entity.")
+    parser.add_argument("files", nargs="*", default=["hospital_data.json", "treatment_list.json", "department_list.json"])
+    args = parser.parse_args()
+
+    total_links = total_urls = total_entities = 0
+    for path in args.files:
+        if not os.path.exists(path):
+            print(f"Skipping {path}: not found.")
+            continue
+        links = read_links(path)
+        urls = {canonicalize_url(link) for link in links}
+        entities = {entity_key(url) for url in urls}
+        total_links += len(links)
+        total_urls += len(urls)
+        total_entities += len(entities)
+        print(f"{path}: {len(links)} links, {len(urls)} distinct URLs, {len(entities)} distinct entities.")
+
+    exact = HashSet(range(total_entities))
+    bloom = BloomFilter(max(1, total_entities))
+    print(f"All lists: {total_links} links -> {total_entities} fetches ({total_links - total_entities} saved). "
+          f"Frontier file: {len(exact.to_bytes())} bytes as a hash set, {len(bloom.to_bytes())} bytes as a Bloom filter.")
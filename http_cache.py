@@ -0,0 +1,101 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Default location of the on-disk response cache
+DEFAULT_CACHE_PATH = "http_cache.sqlite3"
+
+# A fetched page; changed is False when the server (304) or the content hash
+# says the body is the same as the one seen on the previous crawl
+Page = namedtuple("Page", ["url", "content", "status_code", "changed"])
+
+# Function to hash a response body
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+# Persistent URL -> (body, ETag, Last-Modified, content hash) store backed by SQLite.
+# Scripts that consume the same URL for different outputs pass their own namespace
+# so one of them refreshing the entry does not hide the change from the other.
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, namespace=""):
+        self.path = path
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    # Function to look up the cached entry for a URL (or None)
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, content_hash FROM responses WHERE url = ?",
+                (self.namespace + url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"body": row[0], "etag": row[1], "last_modified": row[2], "content_hash": row[3]}
+
+    # Function to save (or refresh) the cached entry for a URL
+    def store(self, url, body, etag, last_modified):
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT INTO responses (url, body, etag, last_modified, content_hash, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    body = excluded.body,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash,
+                    fetched_at = excluded.fetched_at
+                """,
+                (self.namespace + url, body, etag, last_modified, content_hash(body), time.time()),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# Function to GET a URL, sending If-None-Match / If-Modified-Since when it is cached.
+# Returns the Page plus a callback that records the new body in the cache; callers
+# run it only once whatever was extracted from the page has been stored. With force=True the cached
+# copy is ignored (the page always counts as changed) but still refreshed.
+def conditional_get(session, url, cache=None, timeout=10, force=False):
+    cached = cache.get(url) if cache is not None and not force else None
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        return Page(url, cached["body"], 304, False), lambda: None
+    response.raise_for_status()
+
+    body = response.content
+    changed = cached is None or cached["content_hash"] != content_hash(body)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+
+    def commit():
+        if cache is not None:
+            cache.store(url, body, etag, last_modified)
+
+    return Page(url, body, response.status_code, changed), commit
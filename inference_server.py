@@ -0,0 +1,394 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+
+from corpus_encoding import load_url_refs
+from deployment_model import BACKEND_DIRS, load_model
+from lookup_index import LOOKUP_SOURCES, load_lookup_index
+from response_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, ResponseCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+# Largest micro-batch, and how long the first request of a batch waits for others to join it
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 10
+
+DEFAULT_MAX_NEW_TOKENS = 32
+
+# One queued prompt. The batch worker appends generated tokens and pushes each new
+# piece of decoded text onto events, followed by None once the request is finished.
+class GenerationRequest:
+    def __init__(self, prompt, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.token_ids = []
+        self.decoded = ""
+        self.text = ""
+        self.source = "model"
+        self.error = None
+        self.events = queue.Queue()
+        self.submitted_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    # Function to record a generated token and publish the text it completes; with
+    # url_refs, URL references are expanded as soon as they are complete
+    def add_token(self, token_id, tokenizer, url_refs=None):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.token_ids.append(token_id)
+        self.decoded = tokenizer.decode(self.token_ids, skip_special_tokens=True, spaces_between_special_tokens=False)
+        if url_refs is not None:
+            self.decoded = url_refs.expand(self.decoded)
+            # Hold back the start of a reference until it can be expanded
+            if url_refs.is_partial(self.decoded):
+                return
+        # Hold back a partial multi-byte character until the next token completes it
+        if not self.decoded.endswith("\ufffd"):
+            self.publish()
+
+    def publish(self):
+        piece = self.decoded[len(self.text):]
+        self.text = self.decoded
+        if piece:
+            self.events.put(piece)
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.publish()
+        self.error = error
+        self.finished_at = time.perf_counter()
+        self.events.put(None)
+
+    # Function to yield the completion piece by piece as it is generated
+    def stream(self):
+        while True:
+            piece = self.events.get()
+            if piece is None:
+                break
+            yield piece
+        if self.error is not None:
+            raise RuntimeError(f"Generation failed: {self.error}")
+
+    # Function to wait for the whole completion
+    def result(self):
+        for _ in self.stream():
+            pass
+        return self.text
+
+# Groups concurrent requests into dynamic micro-batches and runs them through one
+# model on a single worker thread. Prompts are left-padded with an attention mask
+# and each step only feeds the newest token, reusing the KV cache for the rest.
+class MicroBatcher:
+    def __init__(self, model, tokenizer, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS, url_refs=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.url_refs = url_refs
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_positions = model.config.n_positions
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+
+        # Pad on the left so every prompt's last token lines up in the final column
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    # Function to queue a prompt; returns its GenerationRequest
+    def submit(self, prompt, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+        request = GenerationRequest(prompt, max_new_tokens)
+        self.pending.put(request)
+        return request
+
+    def close(self):
+        self.pending.put(None)
+        self.worker.join()
+
+    # Function to block for one request, then collect more until the batch is full
+    # or the first one has waited max_wait
+    def _next_batch(self):
+        first = self.pending.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self.pending.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                self.generate(batch)
+            except Exception as e:
+                print(f"Error generating a batch of {len(batch)} requests: {e}")
+                for request in batch:
+                    request.finish(e)
+
+    # Function to greedily decode a batch of requests, streaming tokens as they come
+    @torch.inference_mode()
+    def generate(self, batch):
+        encoded = self.tokenizer([request.prompt for request in batch], return_tensors="pt", padding=True)
+        input_ids = encoded["input_ids"]
+        attention_mask = encoded["attention_mask"]
+        # Positions count real tokens only, so left padding does not shift them
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        steps = min(max(request.max_new_tokens for request in batch), self.max_positions - input_ids.shape[1])
+        past_key_values = None
+        for _ in range(steps):
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            past_key_values = outputs.past_key_values
+            next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+
+            for request, token_id in zip(batch, next_tokens.tolist()):
+                if request.finished:
+                    continue
+                if token_id == self.tokenizer.eos_token_id:
+                    request.finish()
+                    continue
+                request.add_token(token_id, self.tokenizer, self.url_refs)
+                if len(request.token_ids) >= request.max_new_tokens:
+                    request.finish()
+            if all(request.finished for request in batch):
+                break
+
+            # Finished rows keep decoding until the batch is done; their tokens are dropped
+            input_ids = next_tokens.unsqueeze(-1)
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones((len(batch), 1))], dim=-1)
+            position_ids = position_ids[:, -1:] + 1
+
+        for request in batch:
+            request.finish()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+# HTTP front end: POST /generate {"prompt", "max_new_tokens", "stream"} and GET /health.
+# Templated questions the lookup index can answer and repeated prompts in the response
+# cache skip the model entirely.
+# Streamed responses are chunked newline-delimited JSON, one object per text piece.
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == "/health":
+            stats = self.server.batcher.stats()
+            if self.server.lookup is not None:
+                stats["lookup"] = self.server.lookup.stats()
+            if self.server.cache is not None:
+                stats["cache"] = self.server.cache.stats()
+            self.send_json(200, {"status": "ok", **stats})
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            prompt = body["prompt"]
+            if not isinstance(prompt, str) or not prompt:
+                raise ValueError("prompt must be a non-empty string")
+            max_new_tokens = int(body.get("max_new_tokens", self.server.max_new_tokens))
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        request = (
+            self.server.lookup_request(prompt)
+            or self.server.cached_request(prompt, max_new_tokens)
+            or self.server.batcher.submit(prompt, max_new_tokens)
+        )
+        if body.get("stream"):
+            self.stream_response(request)
+            self.server.remember(request)
+            return
+        try:
+            completion = request.result()
+        except RuntimeError as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        self.server.remember(request)
+        self.send_json(200, response_body(request, completion))
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_response(self, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            try:
+                for piece in request.stream():
+                    self.write_chunk({"token": piece})
+                self.write_chunk({"done": True, **response_body(request, request.text)})
+            except RuntimeError as e:
+                self.write_chunk({"error": str(e)})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the batch worker finishes the request on its own
+            self.close_connection = True
+
+    def write_chunk(self, payload):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+# Function to wrap a response that needs no generation as an already finished request
+def finished_request(prompt, completion, source):
+    request = GenerationRequest(prompt, 0)
+    request.source = source
+    request.decoded = completion
+    request.finish()
+    return request
+
+# Generation settings the server decodes with, as the response cache key sees them
+def generation_params(max_new_tokens):
+    return {"max_new_tokens": max_new_tokens, "do_sample": False}
+
+# Function to build the JSON body for a finished request
+def response_body(request, completion):
+    return {
+        "text": request.prompt + completion,
+        "completion": completion,
+        "new_tokens": len(request.token_ids),
+        "source": request.source,
+        "latency_ms": (request.finished_at - request.submitted_at) * 1000,
+    }
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, verbose=False, lookup=None, cache=None):
+        super().__init__(address, InferenceHandler)
+        self.batcher = batcher
+        self.lookup = lookup
+        self.cache = cache
+        self.max_new_tokens = max_new_tokens
+        self.verbose = verbose
+
+    # Function to answer a templated question from the lookup index as an already
+    # finished request; returns None when the model has to generate the answer
+    def lookup_request(self, prompt):
+        if self.lookup is None:
+            return None
+        completion = self.lookup.complete(prompt)
+        if completion is None:
+            return None
+        return finished_request(prompt, completion, "lookup")
+
+    # Function to answer a repeated prompt from the response cache; returns None on a miss
+    def cached_request(self, prompt, max_new_tokens):
+        if self.cache is None:
+            return None
+        start = time.perf_counter()
+        completion = self.cache.get(prompt, generation_params(max_new_tokens))
+        if completion is None:
+            return None
+        self.cache.record_latency(True, time.perf_counter() - start)
+        return finished_request(prompt, completion, "cache")
+
+    # Function to cache a completion the model generated successfully; a streamed request
+    # whose client disconnected may still be generating and is not cached
+    def remember(self, request):
+        if self.cache is None or request.source != "model" or not request.finished or request.error is not None:
+            return
+        self.cache.record_latency(False, request.finished_at - request.submitted_at)
+        self.cache.put(request.prompt, generation_params(request.max_new_tokens), request.text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the fine-tuned GPT-2 model over HTTP with dynamic micro-batching.")
+    parser.add_argument("--backend", choices=list(BACKEND_DIRS), default="fp32")
+    parser.add_argument("--model-dir", help="Model directory (default: the backend's export directory)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS, help="How long a batch waits for more requests")
+    parser.add_argument("--max-new-tokens", type=int, default=DEFAULT_MAX_NEW_TOKENS, help="Default generation length per request")
+    parser.add_argument("--threads", type=int, help="Torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--lookup", choices=LOOKUP_SOURCES, default="csv", help="Answer templated questions from this data instead of the model")
+    parser.add_argument("--lookup-path", help="CSV directory or Parquet dataset root for --lookup")
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="Responses kept in the LRU response cache (0 disables it)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="Seconds a cached response stays valid")
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model_dir = args.model_dir or BACKEND_DIRS[args.backend]
+    start = time.perf_counter()
+    model, tokenizer = load_model(model_dir, args.backend)
+    print(f"Loaded {model_dir} ({args.backend}) in {time.perf_counter() - start:.2f}s.")
+
+    lookup = load_lookup_index(args.lookup, args.lookup_path)
+    if lookup is not None:
+        print(f"Indexed {len(lookup)} doctors and hospitals for templated questions.")
+
+    cache = ResponseCache(model_dir, max_entries=args.cache_entries, ttl=args.cache_ttl) if args.cache_entries > 0 else None
+
+    batcher = MicroBatcher(model, tokenizer, args.max_batch_size, args.max_wait_ms, load_url_refs(model_dir))
+    server = InferenceServer((args.host, args.port), batcher, args.max_new_tokens, args.verbose, lookup, cache)
+    print(f"Serving on http://{args.host}:{args.port}/generate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
@@ -0,0 +1,116 @@
+import argparse
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_URL = "http://127.0.0.1:8000/generate"
+
+# Questions are sampled from the training corpus so prompt lengths are realistic
+DEFAULT_PROMPTS_FILE = "training_data.txt"
+QUESTION_PREFIX = "Question: "
+
+# Function to pull up to limit distinct questions out of the Q/A corpus
+def load_prompts(path=DEFAULT_PROMPTS_FILE, limit=200):
+    prompts = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(QUESTION_PREFIX) and "?" in line:
+                    question = line[len(QUESTION_PREFIX):line.index("?") + 1]
+                    if question not in prompts:
+                        prompts.append(question)
+                    if len(prompts) >= limit:
+                        break
+    except OSError as e:
+        print(f"Error reading prompts from {path}: {e}")
+    if not prompts:
+        from deployment_model import DEFAULT_PROMPT
+
+        prompts.append(DEFAULT_PROMPT)
+    return prompts
+
+# Function to get the q-th percentile (nearest rank) of a list of numbers
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+_local = threading.local()
+
+# Function to reuse one keep-alive session per load generator thread
+def thread_session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+# Function to send one request; returns (latency, time to first token) in seconds
+def send_request(url, prompt, max_new_tokens, stream=False, timeout=120):
+    start = time.perf_counter()
+    first_token = None
+    response = thread_session().post(url, json={"prompt": prompt, "max_new_tokens": max_new_tokens, "stream": stream}, stream=stream, timeout=timeout)
+    response.raise_for_status()
+    if stream:
+        for line in response.iter_lines():
+            if line and first_token is None:
+                first_token = time.perf_counter() - start
+    else:
+        response.json()
+    latency = time.perf_counter() - start
+    return latency, first_token if first_token is not None else latency
+
+# Function to fire total requests from concurrency threads and summarize latency and throughput
+def run_load(url, prompts, total=200, concurrency=16, max_new_tokens=32, stream=False):
+    latencies = []
+    first_tokens = []
+    errors = 0
+
+    def one(i):
+        return send_request(url, prompts[i % len(prompts)], max_new_tokens, stream)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(one, i) for i in range(total)]
+        for future in futures:
+            try:
+                latency, first_token = future.result()
+                latencies.append(latency)
+                first_tokens.append(first_token)
+            except Exception as e:
+                errors += 1
+                print(f"Error sending request: {e}")
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "p50_first_token_ms": percentile(first_tokens, 50) * 1000,
+        "p99_first_token_ms": percentile(first_tokens, 99) * 1000,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate load against the inference server and report latency and throughput.")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--requests", type=int, default=200, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--prompts-file", default=DEFAULT_PROMPTS_FILE, help="Q/A text file to take questions from")
+    parser.add_argument("--stream", action="store_true", help="Stream tokens and also report time to first token")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts_file)
+    summary = run_load(args.url, prompts, args.requests, args.concurrency, args.max_new_tokens, args.stream)
+
+    print(f"{summary['requests']} requests ({summary['errors']} errors) at concurrency {summary['concurrency']} in {summary['seconds']:.2f}s: {summary['requests_per_second']:.2f} requests/sec.")
+    print(f"Latency p50 {summary['p50_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms.")
+    if args.stream:
+        print(f"Time to first token p50 {summary['p50_first_token_ms']:.0f} ms, p99 {summary['p99_first_token_ms']:.0f} ms.")
@@ -0,0 +1,257 @@
+import argparse
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Share of trigrams two names must have in common (Dice coefficient) to count as a fuzzy match
+DEFAULT_FUZZY_THRESHOLD = 0.6
+
+# The templates preprocess_csv trains on, accepted with or without the "Question:"
+# prefix, any number of "Dr." titles, and a trailing "Answer:" cue
+DOCTOR_QUESTION = re.compile(
+    r"^\s*(?:question:\s*)?what is the specialization and degree of\s+(?:dr\.?\s+)*(?P<name>.+?)"
+    r"\s+from\s+(?P<hospital>.+?)\s*\?*\s*(?:answer:?)?\s*$",
+    re.IGNORECASE,
+)
+TREATMENT_QUESTION = re.compile(
+    r"^\s*(?:question:\s*)?what is the treatment offered at\s+(?P<hospital>.+?)\s*\?*\s*(?:answer:?)?\s*$",
+    re.IGNORECASE,
+)
+
+ANSWER_CUE = re.compile(r"answer:?\s*$", re.IGNORECASE)
+TITLE = re.compile(r"^(?:dr\.?\s+)+")
+NON_WORD = re.compile(r"[^\w]+")
+
+# Function to tell whether a prompt is one of the templated questions the index answers
+def is_templated(prompt):
+    return DOCTOR_QUESTION.match(prompt) is not None or TREATMENT_QUESTION.match(prompt) is not None
+
+# Function to normalize a name for hashing: casefold, drop titles and punctuation
+def normalize_name(name):
+    name = TITLE.sub("", str(name).casefold().strip())
+    return NON_WORD.sub(" ", name).strip()
+
+# Function to get the set of character trigrams of a normalized name
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# In-memory answers for the templated questions: doctors are found by normalized
+# (hospital, name) in a hash map, falling back to a trigram index for misspelled
+# names; treatment questions are answered with the hospital's treatment list.
+# pandas and preprocess_csv are imported only when the index is built, so serving
+# entry points that import this module do not pay for them at startup.
+class LookupIndex:
+    def __init__(self, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.doctors = {}
+        self.doctor_trigrams = []
+        self.trigram_postings = defaultdict(set)
+        self.treatments = {}
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        # answer() is called from several server threads at once
+        self.stats_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doctors) + len(self.treatments)
+
+    # Function to index doctor rows (name, specialization, degree, hospital_name, link);
+    # the first row of a doctor wins, like the dedup stage
+    def add_doctors(self, df):
+        from preprocess_csv import DOCTOR_COLUMNS, doctor_answers, doctor_names
+
+        df = df.dropna(subset=DOCTOR_COLUMNS)
+        for hospital, name, answer in zip(df['hospital_name'], doctor_names(df), doctor_answers(df)):
+            key = (normalize_name(hospital), normalize_name(name))
+            if key in self.doctors:
+                continue
+            position = len(self.doctor_trigrams)
+            self.doctors[key] = answer
+            grams = trigrams(key[1])
+            self.doctor_trigrams.append((key, grams))
+            for gram in grams:
+                self.trigram_postings[gram].add(position)
+
+    # Function to index treatment rows (treatment_name, treatment_link, hospital_name)
+    def add_treatments(self, df):
+        from preprocess_csv import TREATMENT_COLUMNS
+
+        df = df.dropna(subset=TREATMENT_COLUMNS)
+        for hospital, treatment in zip(df['hospital_name'].astype(str), df['treatment_name'].astype(str)):
+            entry = self.treatments.setdefault(normalize_name(hospital), {"hospital": hospital, "names": {}})
+            entry["names"].setdefault(treatment.casefold(), treatment)
+
+    # Function to find the closest indexed doctor name at a hospital by trigram overlap
+    def fuzzy_doctor(self, hospital_key, name_key):
+        grams = trigrams(name_key)
+        shared = Counter()
+        for gram in grams:
+            for position in self.trigram_postings.get(gram, ()):
+                shared[position] += 1
+        best, best_score = None, 0.0
+        for position, count in shared.items():
+            key, candidate_grams = self.doctor_trigrams[position]
+            if key[0] != hospital_key:
+                continue
+            score = 2 * count / (len(grams) + len(candidate_grams))
+            if score > best_score:
+                best, best_score = key, score
+        if best is not None and best_score >= self.fuzzy_threshold:
+            return self.doctors[best]
+        return None
+
+    # Function to answer a prompt from the index; returns None when it is not a
+    # templated question about an indexed doctor or hospital
+    def answer(self, prompt):
+        match = DOCTOR_QUESTION.match(prompt)
+        if match:
+            hospital_key = normalize_name(match.group("hospital"))
+            name_key = normalize_name(match.group("name"))
+            answer = self.doctors.get((hospital_key, name_key))
+            if answer is not None:
+                return self.count(answer)
+            answer = self.fuzzy_doctor(hospital_key, name_key)
+            return self.count(answer, fuzzy=answer is not None)
+
+        match = TREATMENT_QUESTION.match(prompt)
+        if match:
+            entry = self.treatments.get(normalize_name(match.group("hospital")))
+            if entry is not None:
+                return self.count(f"{entry['hospital']} offers treatment for {', '.join(entry['names'].values())}.")
+        return self.count(None)
+
+    # Function to get the text that follows the prompt when the index can answer it
+    def complete(self, prompt):
+        answer = self.answer(prompt)
+        if answer is None:
+            return None
+        return f" {answer}" if ANSWER_CUE.search(prompt) else f" Answer: {answer}"
+
+    def count(self, answer, fuzzy=False):
+        with self.stats_lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.fuzzy_hits += fuzzy
+        return answer
+
+    def stats(self):
+        with self.stats_lock:
+            return {"hits": self.hits, "fuzzy_hits": self.fuzzy_hits, "misses": self.misses}
+
+    # Function to build the index from the exported doctors/treatments CSV files
+    # (default: preprocess_csv's input directory)
+    @classmethod
+    def from_csv_directory(cls, directory=None, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+        import pandas as pd
+
+        from preprocess_csv import DOCTOR_COLUMNS, TREATMENT_COLUMNS, csv_directory, file_kind
+
+        directory = directory or csv_directory
+        index = cls(fuzzy_threshold)
+        for filename in sorted(os.listdir(directory)):
+            kind = file_kind(filename) if filename.endswith(".csv") else None
+            path = os.path.join(directory, filename)
+            if kind == "doctors":
+                index.add_doctors(pd.read_csv(path, usecols=DOCTOR_COLUMNS))
+            elif kind == "treatments":
+                index.add_treatments(pd.read_csv(path, usecols=TREATMENT_COLUMNS))
+        return index
+
+    # Function to build the index from the partitioned Parquet dataset
+    @classmethod
+    def from_parquet(cls, root=None, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+        from parquet_dataset import DEFAULT_DATASET_ROOT, read_entity
+        from preprocess_csv import DOCTOR_COLUMNS, TREATMENT_COLUMNS
+
+        index = cls(fuzzy_threshold)
+        index.add_doctors(read_entity("doctors", DOCTOR_COLUMNS, root or DEFAULT_DATASET_ROOT))
+        index.add_treatments(read_entity("treatments", TREATMENT_COLUMNS, root or DEFAULT_DATASET_ROOT))
+        return index
+
+    # Function to build the index straight from the doctors and treatments tables
+    @classmethod
+    def from_database(cls, conn, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+        import pandas as pd
+
+        from preprocess_csv import DOCTOR_COLUMNS, TREATMENT_COLUMNS
+
+        index = cls(fuzzy_threshold)
+        for table, columns, add in (("doctors", DOCTOR_COLUMNS, index.add_doctors), ("treatments", TREATMENT_COLUMNS, index.add_treatments)):
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id;")
+                add(pd.DataFrame(cur.fetchall(), columns=columns))
+        return index
+
+# Where the index can be built from
+LOOKUP_SOURCES = ("csv", "parquet", "db", "none")
+
+# Function to build the lookup index from a source; returns None when disabled or unavailable
+def load_lookup_index(source="csv", path=None):
+    if source == "none":
+        return None
+    try:
+        if source == "csv":
+            return LookupIndex.from_csv_directory(path)
+        if source == "parquet":
+            return LookupIndex.from_parquet(path)
+        from doctor_detail_script import connect_to_postgres
+
+        conn = connect_to_postgres()
+        if conn is None:
+            return None
+        try:
+            return LookupIndex.from_database(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Error building the lookup index from {source}: {e}")
+        return None
+
+# Builds the lookup index on the first templated question instead of at startup, so
+# prompts the model answers never wait for pandas and the CSV parse
+class LazyLookupIndex:
+    def __init__(self, source="csv", path=None):
+        self.source = source
+        self.path = path
+        self.index = None
+        self.loaded = False
+        self.build_seconds = 0.0
+        self.lock = threading.Lock()
+
+    # Function to get the index, building it on first use (None if it is unavailable)
+    def get(self):
+        with self.lock:
+            if not self.loaded:
+                start = time.perf_counter()
+                self.index = load_lookup_index(self.source, self.path)
+                self.build_seconds = time.perf_counter() - start
+                self.loaded = True
+        return self.index
+
+    def complete(self, prompt):
+        if not is_templated(prompt):
+            return None
+        index = self.get()
+        return index.complete(prompt) if index is not None else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer templated questions from the doctors/treatments index.")
+    parser.add_argument("prompts", nargs="+")
+    parser.add_argument("--source", choices=LOOKUP_SOURCES[:-1], default="csv")
+    parser.add_argument("--path", help="CSV directory or Parquet dataset root")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_lookup_index(args.source, args.path)
+    print(f"Indexed {len(index) if index else 0} entries in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    if index:
+        for prompt in args.prompts:
+            start = time.perf_counter()
+            answer = index.answer(prompt)
+            print(f"[{(time.perf_counter() - start) * 1e6:.0f} us] {prompt}\n  {answer if answer is not None else '(no match; falls back to the model)'}")
@@ -0,0 +1,199 @@
+import atexit
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Set to a directory to record metrics from any script (same as its --metrics-dir flag)
+METRICS_DIR_ENV = "METRICS_DIR"
+
+# Files written into the metrics directory
+EVENTS_FILE = "metrics.jsonl"
+PROMETHEUS_FILE = "metrics.prom"
+
+# Histogram bucket upper bounds in seconds, from a cached parse to a slow page load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Function to turn label keyword arguments into a hashable, ordered key
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+# Function to format a label key as Prometheus {name="value",...}
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+# Cumulative-style histogram of observed values
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Function to get (upper bound, cumulative count) pairs ending with +Inf
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            yield bound, total
+
+# Counters, gauges and histograms keyed by name and labels, plus a JSONL event log
+# (one line per request, parse or database load). Safe to share between threads.
+class Metrics:
+    enabled = True
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.events = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.events = open(os.path.join(directory, EVENTS_FILE), "a", encoding="utf-8")
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Function to time a block into a histogram of seconds
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # Function to append one structured record to the JSONL log
+    def event(self, kind, **fields):
+        if self.events is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 6), "event": kind, **fields}, ensure_ascii=False)
+        with self.lock:
+            self.events.write(line + "\n")
+
+    # Function to render every metric in the Prometheus text exposition format
+    def prometheus(self):
+        with self.lock:
+            lines = []
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in series}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (series_name, key), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{name}{format_labels(key)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, key), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if series_name != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{format_labels(key, [('le', le)])} {count}")
+                    lines.append(f"{name}_sum{format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{format_labels(key)} {histogram.count}")
+            return "\n".join(lines) + "\n"
+
+    # Function to write the Prometheus file (e.g. for the node exporter textfile collector)
+    # and close the event log
+    def close(self):
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, PROMETHEUS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            if self.events is not None:
+                self.events.close()
+                self.events = None
+
+# Stand-in used when metrics are off: every call returns immediately
+class NullMetrics:
+    enabled = False
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return contextlib.nullcontext()
+
+    def event(self, kind, **fields):
+        pass
+
+    def prometheus(self):
+        return ""
+
+    def close(self):
+        pass
+
+_metrics = NullMetrics()
+
+# Function to get the process-wide metrics (a NullMetrics until configure() is called)
+def get_metrics():
+    return _metrics
+
+# Function to start recording metrics into a directory; the Prometheus file is written
+# when the process exits. Without a directory metrics stay off.
+def configure(directory=None):
+    global _metrics
+    if not directory:
+        return _metrics
+    if isinstance(_metrics, Metrics):
+        _metrics.close()
+    _metrics = Metrics(directory)
+    atexit.register(_metrics.close)
+    return _metrics
+
+# Function to record one HTTP request: latency histogram, bytes downloaded and status
+# per host, plus a JSONL trace line
+def record_request(url, status, size, seconds, **fields):
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    host = urlsplit(url).netloc.lower()
+    metrics.observe("http_request_seconds", seconds, host=host)
+    metrics.inc("http_requests_total", host=host, status=status)
+    metrics.inc("http_response_bytes_total", size, host=host)
+    metrics.event("http_request", url=url, status=status, bytes=size, seconds=round(seconds, 6), **fields)
+
+# Function to record a failed request, page or database load
+def record_error(stage, error, **fields):
+    metrics = get_metrics()
+    metrics.inc("errors_total", stage=stage, error=type(error).__name__)
+    metrics.event("error", stage=stage, error=str(error), **fields)
+
+configure(os.environ.get(METRICS_DIR_ENV))
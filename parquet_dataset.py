@@ -0,0 +1,119 @@
+import argparse
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Root of the Parquet dataset: <root>/<entity>/hospital_name=<hospital>/part-*.parquet
+DEFAULT_DATASET_ROOT = "dataset"
+
+# Rows fetched from PostgreSQL per record batch
+EXPORT_BATCH_SIZE = 10000
+
+# Schema of each entity, matching the doctors/treatments tables
+ENTITY_SCHEMAS = {
+    "doctors": pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("specialization", pa.string()),
+        ("degree", pa.string()),
+        ("hospital_name", pa.string()),
+        ("link", pa.string()),
+    ]),
+    "treatments": pa.schema([
+        ("id", pa.int64()),
+        ("treatment_name", pa.string()),
+        ("treatment_link", pa.string()),
+        ("hospital_name", pa.string()),
+    ]),
+}
+
+# Hive-style partitioning on the hospital column
+HOSPITAL_PARTITIONING = ds.partitioning(pa.schema([("hospital_name", pa.string())]), flavor="hive")
+
+# Function to get the directory holding one entity's partitions
+def entity_path(entity, root=DEFAULT_DATASET_ROOT):
+    return os.path.join(root, entity)
+
+# Function to write record batches of one entity as a fresh set of hospital partitions
+def write_entity(batches, entity, root=DEFAULT_DATASET_ROOT):
+    path = entity_path(entity, root)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    ds.write_dataset(
+        batches,
+        path,
+        schema=ENTITY_SCHEMAS[entity],
+        format="parquet",
+        partitioning=HOSPITAL_PARTITIONING,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+# Function to stream a table out of PostgreSQL as record batches, without loading it whole
+def table_batches(conn, entity, batch_size=EXPORT_BATCH_SIZE):
+    schema = ENTITY_SCHEMAS[entity]
+    columns = ", ".join(schema.names)
+    with conn.cursor(name=f"{entity}_export") as cur:
+        cur.itersize = batch_size
+        cur.execute(f"SELECT {columns} FROM {entity} ORDER BY id;")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)],
+                schema=schema,
+            )
+
+# Function to export the doctors and/or treatments tables to the Parquet dataset
+def export_tables(conn, entities=tuple(ENTITY_SCHEMAS), root=DEFAULT_DATASET_ROOT):
+    for entity in entities:
+        try:
+            write_entity(table_batches(conn, entity), entity, root)
+            print(f"Exported {entity} to {entity_path(entity, root)}.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error exporting {entity} to Parquet: {e}")
+
+# Function to open one entity of the dataset for filtered, projected reads
+def open_entity(entity, root=DEFAULT_DATASET_ROOT):
+    return ds.dataset(entity_path(entity, root), format="parquet", partitioning=HOSPITAL_PARTITIONING)
+
+# Function to build a filter that keeps rows with all required columns set and,
+# optionally, only the given hospitals (pruned at the partition level)
+def build_filter(required_columns=(), hospitals=None):
+    expression = None
+    for column in required_columns:
+        condition = ds.field(column).is_valid()
+        expression = condition if expression is None else expression & condition
+    if hospitals:
+        condition = ds.field("hospital_name").isin(list(hospitals))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+# Function to read only the needed columns and rows of an entity as a pandas DataFrame
+def read_entity(entity, columns, root=DEFAULT_DATASET_ROOT, hospitals=None):
+    dataset = open_entity(entity, root)
+    return dataset.to_table(columns=list(columns), filter=build_filter(columns, hospitals)).to_pandas()
+
+# Function to iterate the needed columns and rows of an entity in record batches
+def iter_entity_batches(entity, columns, root=DEFAULT_DATASET_ROOT, hospitals=None, batch_size=EXPORT_BATCH_SIZE):
+    dataset = open_entity(entity, root)
+    for batch in dataset.to_batches(columns=list(columns), filter=build_filter(columns, hospitals), batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+# Export the database tables to the Parquet dataset
+if __name__ == "__main__":
+    from doctor_detail_script import connect_to_postgres
+
+    parser = argparse.ArgumentParser(description="Export the doctors and treatments tables to a partitioned Parquet dataset.")
+    parser.add_argument("--root", default=DEFAULT_DATASET_ROOT, help="Dataset directory")
+    parser.add_argument("--entities", nargs="+", choices=list(ENTITY_SCHEMAS), default=list(ENTITY_SCHEMAS))
+    args = parser.parse_args()
+
+    conn = connect_to_postgres()
+    if conn:
+        export_tables(conn, args.entities, args.root)
+        conn.close()
@@ -0,0 +1,272 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Where stage fingerprints and cached file hashes are kept between runs
+STATE_FILE = ".pipeline_state.json"
+
+# Bundled CSV export and the Parquet dataset the crawl stages write
+CSV_DIRECTORY = "data_training_files"
+DATASET_ROOT = "dataset"
+
+# preprocess_csv writes the raw corpus; dedup turns it into the training file
+RAW_CORPUS = "training_data_raw.txt"
+TRAINING_FILE = "training_data.txt"
+VALIDATION_FILE = "validation_data.txt"
+MODEL_DIR = "fine_tuned_gpt2"
+
+# Function to hash a file's content a block at a time
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Content hashes of input files, re-read only when a file's size or modification time
+# changes, so a no-op run does not re-hash large inputs
+class HashCache:
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def file(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            entry = [stat.st_size, stat.st_mtime_ns, file_digest(path)]
+            self.entries[key] = entry
+        return entry[2]
+
+    # Function to hash a file, or a directory as the sorted names and hashes of its files;
+    # a missing path hashes to a fixed marker so creating it changes the fingerprint
+    def path(self, path):
+        if os.path.isfile(path):
+            return self.file(path)
+        if not os.path.isdir(path):
+            return "missing"
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(f"{os.path.relpath(full, path)}:{self.file(full)};".encode("utf-8"))
+        return digest.hexdigest()
+
+# Function to tell whether a statement is an `if __name__ == "__main__":` block
+def is_main_block(node):
+    return isinstance(node, ast.If) and isinstance(node.test, ast.Compare) and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__"
+
+# Function to list the repository modules a script imports, directly or through other
+# repository modules (imports inside functions included, the __main__ blocks of
+# imported modules left out); modules are looked up next to the script, so packages
+# installed elsewhere are not included
+def local_modules(script):
+    directory = os.path.dirname(script)
+    modules = set()
+    pending = [script]
+    while pending:
+        path = pending.pop()
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read())
+        if path != script:
+            tree.body = [node for node in tree.body if not is_main_block(node)]
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                path = os.path.join(directory, name.split(".")[0] + ".py")
+                if path != script and path not in modules and os.path.isfile(path):
+                    modules.add(path)
+                    pending.append(path)
+    return sorted(modules)
+
+# One step of the workflow: a script run with arguments, the files/directories it
+# reads and the ones it writes. Stages are linked through those paths.
+class Stage:
+    def __init__(self, name, script, args=(), inputs=(), outputs=()):
+        self.name = name
+        self.script = script
+        self.args = list(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+    def command(self):
+        return [sys.executable, self.script] + self.args
+
+    # Function to fingerprint the stage: its command, its script, the repository modules
+    # the script imports (entry scripts are thin wrappers) and its inputs' content
+    def fingerprint(self, hashes):
+        digest = hashlib.sha256(json.dumps(self.command()[1:]).encode("utf-8"))
+        for path in [self.script] + local_modules(self.script) + self.inputs:
+            digest.update(f"{path}:{hashes.path(path)};".encode("utf-8"))
+        return digest.hexdigest()
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.outputs)
+
+    # Function to run the script, prefixing each line it prints with the stage name
+    def run(self):
+        process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace")
+        for line in process.stdout:
+            print(f"[{self.name}] {line.rstrip()}", flush=True)
+        return process.wait()
+
+# Function to get the directory fine_tunning.py saves the model to with the given
+# arguments; other arguments are left to fine_tunning.py
+def train_output_dir(train_args=()):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--final-dir", default=MODEL_DIR)
+    known, _ = parser.parse_known_args(list(train_args))
+    return os.path.normpath(known.final_dir)
+
+# Function to build the stages. With source "csv" the corpus comes from the bundled CSV
+# export; with "crawl" the doctors and treatments branches scrape the sitemaps, load
+# PostgreSQL and export the Parquet dataset preprocessing reads.
+def build_stages(source="csv", train_args=()):
+    stages = []
+    if source == "crawl":
+        doctors = os.path.join(DATASET_ROOT, "doctors")
+        treatments = os.path.join(DATASET_ROOT, "treatments")
+        stages += [
+            Stage("doctor_list", "doctor_list_script.py", inputs=["hospitals.json"], outputs=["hospital_data.json"]),
+            Stage("doctor_details", "doctor_detail_script.py", ["--parquet-dir", DATASET_ROOT], inputs=["hospital_data.json"], outputs=[doctors]),
+            Stage("treatment_list", "treatment_list.py", inputs=["hospitals.json"], outputs=["treatment_list.json"]),
+            Stage("treatments", "treatments_details.py", ["--parquet-dir", DATASET_ROOT], inputs=["treatment_list.json"], outputs=[treatments]),
+            Stage("preprocess", "preprocess_csv.py", ["--parquet-dir", DATASET_ROOT, "--output", RAW_CORPUS], inputs=[doctors, treatments], outputs=[RAW_CORPUS]),
+        ]
+    else:
+        stages.append(Stage("preprocess", "preprocess_csv.py", ["--input-dir", CSV_DIRECTORY, "--output", RAW_CORPUS], inputs=[CSV_DIRECTORY], outputs=[RAW_CORPUS]))
+    stages += [
+        Stage("dedup", "dedup.py", [RAW_CORPUS, "--output", TRAINING_FILE, "--validation-output", VALIDATION_FILE], inputs=[RAW_CORPUS], outputs=[TRAINING_FILE, VALIDATION_FILE]),
+        Stage("train", "fine_tunning.py", list(train_args), inputs=[TRAINING_FILE, VALIDATION_FILE], outputs=[train_output_dir(train_args)]),
+    ]
+    return stages
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {"stages": {}, "hashes": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_FILE):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+# Function to map each stage to the stages producing its inputs
+def stage_dependencies(stages):
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    return {stage.name: {producers[path] for path in stage.inputs if path in producers} for stage in stages}
+
+# Function to keep only the target stages and everything upstream of them
+def select_stages(stages, targets):
+    if not targets:
+        return stages
+    dependencies = stage_dependencies(stages)
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(dependencies[name])
+    return [stage for stage in stages if stage.name in selected]
+
+# Function to run the stages in dependency order, independent ones in parallel.
+# A stage is only fingerprinted once its upstream stages have finished, and it is
+# skipped when the fingerprint matches the last successful run and its outputs exist.
+# Returns {stage name: (status, seconds)}.
+def run_pipeline(stages, force=(), jobs=2, dry_run=False, state_path=STATE_FILE):
+    state = load_state(state_path)
+    hashes = HashCache(state["hashes"])
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while len(results) < len(stages):
+            for stage in stages:
+                if stage.name in results or stage.name in running.values():
+                    continue
+                upstream = [results.get(name, (None,))[0] for name in dependencies[stage.name]]
+                if any(status in ("failed", "blocked") for status in upstream):
+                    results[stage.name] = ("blocked", 0.0)
+                    continue
+                if not all(status in ("ran", "skipped", "would run") for status in upstream):
+                    continue
+                fingerprint = stage.fingerprint(hashes)
+                previous = state["stages"].get(stage.name, {}).get("fingerprint")
+                if "would run" in upstream or stage.name in force or fingerprint != previous or not stage.outputs_exist():
+                    if dry_run:
+                        results[stage.name] = ("would run", 0.0)
+                        continue
+                    print(f"Running {stage.name}: {' '.join(stage.command()[1:])}")
+                    running[executor.submit(timed_run, stage, fingerprint)] = stage.name
+                else:
+                    results[stage.name] = ("skipped", 0.0)
+                    print(f"Skipping {stage.name}: inputs unchanged.")
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                code, seconds, fingerprint = future.result()
+                if code == 0 and by_name[name].outputs_exist():
+                    results[name] = ("ran", seconds)
+                    state["stages"][name] = {"fingerprint": fingerprint, "finished": time.strftime("%Y-%m-%dT%H:%M:%S"), "seconds": seconds}
+                else:
+                    results[name] = ("failed", seconds)
+                    state["stages"].pop(name, None)
+                    print(f"Error in stage {name}: exit code {code}" + ("" if code else ", outputs missing"))
+                state["hashes"] = hashes.entries
+                save_state(state, state_path)
+
+    state["hashes"] = hashes.entries
+    if not dry_run:
+        save_state(state, state_path)
+    return results
+
+def timed_run(stage, fingerprint):
+    start = time.perf_counter()
+    code = stage.run()
+    return code, time.perf_counter() - start, fingerprint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the scrape -> preprocess -> dedup -> train workflow, skipping stages whose inputs did not change.")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date, with everything upstream (default: all)")
+    parser.add_argument("--source", choices=["csv", "crawl"], default="csv", help="Build the corpus from the bundled CSV export or by crawling the hospital sites")
+    parser.add_argument("--force", nargs="*", default=[], help="Run these stages even if their inputs are unchanged")
+    parser.add_argument("--jobs", type=int, default=2, help="Stages run at the same time")
+    parser.add_argument("--train-args", default="", help="Extra arguments for fine_tunning.py, e.g. \"--mode lora\"")
+    parser.add_argument("--dry-run", action="store_true", help="Only show which stages would run")
+    args = parser.parse_args()
+
+    stages = build_stages(args.source, shlex.split(args.train_args))
+    names = [stage.name for stage in stages]
+    unknown = [name for name in args.targets + args.force if name not in names]
+    if unknown:
+        parser.error(f"unknown stage(s) {', '.join(unknown)}; choose from {', '.join(names)}")
+
+    start = time.perf_counter()
+    selected = select_stages(stages, args.targets)
+    results = run_pipeline(selected, set(args.force), args.jobs, args.dry_run)
+    for stage in selected:
+        status, seconds = results[stage.name]
+        print(f"{stage.name:<16} {status:<10} {seconds:>8.1f}s")
+    print(f"Pipeline finished in {time.perf_counter() - start:.1f}s.")
+    if any(status in ("failed", "blocked") for status, _ in results.values()):
+        sys.exit(1)
@@ -1,38 +1,100 @@
 import pandas as pd
+import argparse
 import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then not reported
+    resource = None
 
 # Specify the directory containing CSV files
-csv_directory = "D:\Web_scraping_and_Ai_model_traing\data_training_files"
+csv_directory = "data_training_files"
 
 # Specify the output file for the preprocessed text
 output_file = "training_data.txt"
 
-# Initialize a list to hold processed data
-processed_data = []
+# Number of CSV rows read (and formatted) at a time
+CHUNK_SIZE = 50000
+
+# Columns that must be present and non-empty for a row to be used
+DOCTOR_REQUIRED_COLUMNS = ['id', 'name', 'specialization', 'degree', 'hospital_name', 'link']
+TREATMENT_REQUIRED_COLUMNS = ['id', 'treatment_name', 'treatment_link', 'hospital_name']
+
+# Columns each Q/A template reads (the Parquet reader projects only these)
+DOCTOR_COLUMNS = ['name', 'specialization', 'degree', 'hospital_name', 'link']
+TREATMENT_COLUMNS = ['treatment_name', 'treatment_link', 'hospital_name']
+
+# Function to get doctor names without the "Dr." title most scraped names already carry,
+# so the templates' "Dr. " is not doubled
+def doctor_names(df):
+    return df['name'].astype(str).str.replace(r"^(?:Dr\.?\s+)+", "", regex=True)
+
+# Functions to build the doctor template's question and answer for every row
+def doctor_questions(df):
+    return "What is the specialization and degree of Dr. " + doctor_names(df) + " from " + df['hospital_name'].astype(str) + "?"
+
+def doctor_answers(df):
+    return (
+        "Dr. " + doctor_names(df) + " specializes in " + df['specialization'].astype(str)
+        + " and holds the degree " + df['degree'].astype(str) + ". Find more at " + df['link'].astype(str) + "."
+    )
+
+# Function to format doctor rows into Q/A strings, one vectorized column operation per piece
+def format_doctors(df):
+    return "Question: " + doctor_questions(df) + " Answer: " + doctor_answers(df)
+
+# Functions to build the treatment template's question and answer for every row
+def treatment_questions(df):
+    return "What is the treatment offered at " + df['hospital_name'].astype(str) + "?"
+
+def treatment_answers(df):
+    return (
+        df['hospital_name'].astype(str) + " offers treatment for " + df['treatment_name'].astype(str)
+        + ". Learn more at " + df['treatment_link'].astype(str) + "."
+    )
+
+# Function to format treatment rows into Q/A strings, one vectorized column operation per piece
+def format_treatments(df):
+    return "Question: " + treatment_questions(df) + " Answer: " + treatment_answers(df)
+
+# Required columns and formatter for each kind of input file
+FILE_KINDS = {
+    "doctors": (DOCTOR_REQUIRED_COLUMNS, format_doctors),
+    "treatments": (TREATMENT_REQUIRED_COLUMNS, format_treatments),
+}
+
+# Function to tell the kind of a CSV file from its name
+def file_kind(filename):
+    if "doctors" in filename.lower():
+        return "doctors"
+    if "treatments" in filename.lower():
+        return "treatments"
+    return None
+
+# Function to read a CSV file in chunks and yield (rows read, formatted Q/A lines)
+def iter_csv_chunks(file_path, kind, chunksize=CHUNK_SIZE):
+    required_columns, format_rows = FILE_KINDS[kind]
+
+    # Check if required columns exist
+    header = pd.read_csv(file_path, nrows=0).columns
+    if not all(column in header for column in required_columns):
+        print(f"Skipping file {file_path}: Missing required columns.")
+        return
+
+    for chunk in pd.read_csv(file_path, usecols=required_columns, chunksize=chunksize):
+        rows = len(chunk)
+        # Drop rows with missing values in the required columns
+        chunk = chunk.dropna(subset=required_columns)
+        yield rows, format_rows(chunk)
 
 # Function to process doctors' data
 def process_doctors_data(file_path):
     try:
-        df = pd.read_csv(file_path)
-        
-        # Check if required columns exist
-        required_columns = ['id', 'name', 'specialization', 'degree', 'hospital_name', 'link']
-        if all(column in df.columns for column in required_columns):
-            # Drop rows with missing values in the required columns
-            df = df.dropna(subset=required_columns)
-            
-            # Format data into Q/A
-            data = df.apply(
-                lambda row: (
-                    f"Question: What is the specialization and degree of Dr. {row['name']} from {row['hospital_name']}?"
-                    f" Answer: Dr. {row['name']} specializes in {row['specialization']} and holds the degree {row['degree']}. Find more at {row['link']}."
-                ),
-                axis=1
-            )
-            return data.tolist()
-        else:
-            print(f"Skipping file {file_path}: Missing required columns.")
-            return []
+        return [line for _, lines in iter_csv_chunks(file_path, "doctors") for line in lines]
     except Exception as e:
         print(f"Error processing doctors' file {file_path}: {e}")
         return []
@@ -40,48 +102,139 @@ def process_doctors_data(file_path):
 # Function to process treatments' data
 def process_treatments_data(file_path):
     try:
-        df = pd.read_csv(file_path)
-        
-        # Check if required columns exist
-        required_columns = ['id', 'treatment_name', 'treatment_link', 'hospital_name']
-        if all(column in df.columns for column in required_columns):
-            # Drop rows with missing values in the required columns
-            df = df.dropna(subset=required_columns)
-            
-            # Format data into Q/A
-            data = df.apply(
-                lambda row: (
-                    f"Question: What is the treatment offered at {row['hospital_name']}?"
-                    f" Answer: {row['hospital_name']} offers treatment for {row['treatment_name']}. Learn more at {row['treatment_link']}."
-                ),
-                axis=1
-            )
-            return data.tolist()
-        else:
-            print(f"Skipping file {file_path}: Missing required columns.")
-            return []
+        return [line for _, lines in iter_csv_chunks(file_path, "treatments") for line in lines]
     except Exception as e:
         print(f"Error processing treatments' file {file_path}: {e}")
         return []
 
-# Iterate through all CSV files in the directory
-for filename in os.listdir(csv_directory):
-    if filename.endswith(".csv"):
-        file_path = os.path.join(csv_directory, filename)
-        print(f"Processing file: {filename}")
-        
-        # Process based on file type
-        if "doctors" in filename.lower():
-            processed_data.extend(process_doctors_data(file_path))
-        elif "treatments" in filename.lower():
-            processed_data.extend(process_treatments_data(file_path))
+# Writes lines separated by "\n" (no trailing newline) as they are produced, into
+# path + ".tmp"; path itself is replaced only if at least one line was written,
+# so a run that produced nothing leaves the previous output in place
+class LineWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path + ".tmp", "w", encoding="utf-8")
+        self.lines = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is None and self.lines:
+            os.replace(self.path + ".tmp", self.path)
         else:
-            print(f"Skipping file {filename}: Unknown file type.")
-
-# Save all processed data to a single text file
-if processed_data:
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(processed_data))
-    print(f"Preprocessed data saved to {output_file}.")
-else:
-    print("No valid data processed. Check your files and directory.")
+            os.remove(self.path + ".tmp")
+
+    def write_lines(self, lines):
+        lines = list(lines)
+        if not lines:
+            return
+        if self.lines:
+            self.file.write("\n")
+        self.file.write("\n".join(lines))
+        self.lines += len(lines)
+
+    # Function to append another LineWriter's output file
+    def append_file(self, path, lines):
+        if not lines:
+            return
+        if self.lines:
+            self.file.write("\n")
+        with open(path, "r", encoding="utf-8") as part:
+            shutil.copyfileobj(part, self.file)
+        self.lines += lines
+
+# Function to process one CSV file into its own part file (runs in a worker process)
+def process_file_to_part(file_path, kind, part_path, chunksize=CHUNK_SIZE):
+    rows = 0
+    with LineWriter(part_path) as writer:
+        try:
+            for chunk_rows, lines in iter_csv_chunks(file_path, kind, chunksize):
+                rows += chunk_rows
+                writer.write_lines(lines)
+        except Exception as e:
+            print(f"Error processing {kind} file {file_path}: {e}")
+        return rows, writer.lines
+
+# Function to process every CSV file in a directory, several files in parallel,
+# streaming the Q/A lines into the output file; returns (rows read, lines written)
+def process_csv_directory(directory, output_path, workers=None, chunksize=CHUNK_SIZE):
+    jobs = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".csv"):
+            kind = file_kind(filename)
+            if kind is None:
+                print(f"Skipping file {filename}: Unknown file type.")
+                continue
+            print(f"Processing file: {filename}")
+            part_path = f"{output_path}.part{len(jobs)}"
+            jobs.append((os.path.join(directory, filename), kind, part_path, chunksize))
+
+    if workers == 1 or len(jobs) <= 1:
+        results = [process_file_to_part(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process_file_to_part, *zip(*jobs)))
+
+    # Concatenate the parts in file order
+    with LineWriter(output_path) as writer:
+        for job, (_, lines) in zip(jobs, results):
+            # Parts without lines were never written
+            if lines:
+                writer.append_file(job[2], lines)
+                os.remove(job[2])
+        return sum(rows for rows, _ in results), writer.lines
+
+# Function to process the doctors and treatments of a Parquet dataset, reading only
+# the template columns and letting the reader drop incomplete rows / other hospitals
+def process_parquet_dataset(root, output_path, hospitals=None, chunksize=CHUNK_SIZE):
+    from parquet_dataset import iter_entity_batches
+
+    rows = 0
+    with LineWriter(output_path) as writer:
+        for entity, columns, format_rows in (("doctors", DOCTOR_COLUMNS, format_doctors), ("treatments", TREATMENT_COLUMNS, format_treatments)):
+            try:
+                for batch in iter_entity_batches(entity, columns, root, hospitals, chunksize):
+                    rows += len(batch)
+                    writer.write_lines(format_rows(batch))
+            except Exception as e:
+                print(f"Error processing {entity} in {root}: {e}")
+        return rows, writer.lines
+
+# Function to get the peak resident set size in MB of this process and of its workers
+def peak_rss_mb():
+    if resource is None:
+        return None, None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn doctors/treatments data into Q/A training text.")
+    parser.add_argument("--input-dir", default=csv_directory, help="Directory containing the exported CSV files")
+    parser.add_argument("--output", default=output_file, help="Output text file")
+    parser.add_argument("--parquet-dir", help="Read the partitioned Parquet dataset instead of the CSV directory")
+    parser.add_argument("--hospital", action="append", help="Only include this hospital (Parquet input, repeatable)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read and formatted at a time")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used for CSV files (default: one per CPU)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.parquet_dir:
+        rows, lines = process_parquet_dataset(args.parquet_dir, args.output, args.hospital, args.chunk_size)
+    else:
+        rows, lines = process_csv_directory(args.input_dir, args.output, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    # Report throughput and memory
+    own_rss, worker_rss = peak_rss_mb()
+    print(f"Read {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/sec).")
+    if own_rss is not None:
+        print(f"Peak RSS: {own_rss:.0f} MB (main), {worker_rss:.0f} MB (largest worker).")
+
+    if lines:
+        print(f"Preprocessed data saved to {args.output}.")
+    else:
+        print("No valid data processed. Check your files and directory.")
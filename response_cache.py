@@ -0,0 +1,149 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Bounds on what the cache holds; the least recently used entries go first
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 3600
+
+# How often (seconds) the checkpoint directory is re-checked for a new model
+CHECKPOINT_CHECK_INTERVAL = 5
+
+WHITESPACE = re.compile(r"\s+")
+
+# Function to normalize a prompt for the cache key: trim and collapse whitespace
+def normalize_prompt(prompt):
+    return WHITESPACE.sub(" ", prompt).strip()
+
+# Function to tell whether generation parameters always give the same output;
+# sampled decoding is never cached
+def is_deterministic(params):
+    return not params.get("do_sample", False)
+
+# Function to identify a checkpoint by the names, sizes and modification times of its files
+def checkpoint_fingerprint(model_dir):
+    digest = hashlib.sha256()
+    try:
+        for entry in sorted(os.scandir(model_dir), key=lambda entry: entry.name):
+            if entry.is_file():
+                stat = entry.stat()
+                digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+# In-memory LRU cache of generated responses keyed by normalized prompt and generation
+# parameters, with a TTL, entry/byte bounds and invalidation when the checkpoint in
+# model_dir changes. Safe to share between server threads.
+class ResponseCache:
+    def __init__(self, model_dir=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.model_dir = model_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.fingerprint = checkpoint_fingerprint(model_dir) if model_dir else None
+        self.checked_at = time.monotonic()
+        self.counters = {"hits": 0, "misses": 0, "uncacheable": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def key(self, prompt, params):
+        return (normalize_prompt(prompt), tuple(sorted(params.items())))
+
+    # Function to drop every entry when the checkpoint on disk has changed
+    def _check_checkpoint(self):
+        now = time.monotonic()
+        if self.model_dir is None or now - self.checked_at < CHECKPOINT_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        fingerprint = checkpoint_fingerprint(self.model_dir)
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.entries.clear()
+            self.bytes = 0
+            self.counters["invalidations"] += 1
+
+    def _remove(self, key):
+        _, response = self.entries.pop(key)
+        self.bytes -= len(response.encode("utf-8"))
+
+    # Function to look up a response; returns None on a miss
+    def get(self, prompt, params):
+        if not is_deterministic(params):
+            with self.lock:
+                self.counters["uncacheable"] += 1
+            return None
+        key = self.key(prompt, params)
+        with self.lock:
+            self._check_checkpoint()
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                self._remove(key)
+                self.counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    # Function to store a response, evicting least recently used entries past the bounds
+    def put(self, prompt, params, response):
+        if not is_deterministic(params):
+            return
+        key = self.key(prompt, params)
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic(), response)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.counters["evictions"] += 1
+
+    # Function to return the cached response or generate, time and store it
+    def get_or_generate(self, prompt, params, generate):
+        start = time.perf_counter()
+        response = self.get(prompt, params)
+        if response is not None:
+            self.record_latency(True, time.perf_counter() - start)
+            return response
+        response = generate()
+        self.record_latency(False, time.perf_counter() - start)
+        self.put(prompt, params, response)
+        return response
+
+    def record_latency(self, hit, seconds):
+        with self.lock:
+            if hit:
+                self.hit_seconds += seconds
+            else:
+                self.miss_seconds += seconds
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            hits, misses = self.counters["hits"], self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "mean_hit_ms": self.hit_seconds / hits * 1000 if hits else 0.0,
+                "mean_miss_ms": self.miss_seconds / misses * 1000 if misses else 0.0,
+            }
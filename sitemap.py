@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import time
+
+from crawler import Crawler, UNCHANGED, DEFAULT_MAX_WORKERS
+from extractors import extract_listing, parse_page
+from frontier import canonicalize_url
+from http_cache import DEFAULT_CACHE_PATH, ResponseCache
+from metrics import configure as configure_metrics, get_metrics
+
+# Registry of hospitals to scrape (name, sitemap URL and one XPath per section)
+REGISTRY_PATH = "hospitals.json"
+
+# Output JSON file and key for each sitemap section
+SECTION_OUTPUTS = {
+    "doctors": ("hospital_data.json", "doctors"),
+    "departments": ("hospital_data.json", "departments"),
+    "treatments": ("treatment_list.json", "treatments"),
+}
+
+# Function to load and validate the hospital registry
+def load_registry(path=REGISTRY_PATH):
+    with open(path, "r", encoding="utf-8") as file:
+        hospitals = json.load(file)["hospitals"]
+    for hospital in hospitals:
+        for key in ("name", "sitemap_url", "sections"):
+            if key not in hospital:
+                raise ValueError(f"Hospital entry {hospital!r} in {path} is missing '{key}'")
+    return hospitals
+
+# Function to extract every requested section from one parse of a sitemap page
+def extract_sections(page_content, hospital, sections):
+    metrics = get_metrics()
+    start = time.perf_counter()
+    tree = parse_page(page_content)
+    extracted = {}
+    for section in sections:
+        container_xpath = hospital["sections"].get(section)
+        if not container_xpath:
+            continue
+        items = extract_listing(None, container_xpath, tree=tree)
+        for item in items:
+            item["Link"] = canonicalize_url(item["Link"], base=hospital["sitemap_url"])
+            item["Hospital"] = hospital["name"]
+        extracted[section] = items
+        metrics.inc("scraped_items_total", len(items), section=section)
+        print(f"Scraped {len(items)} {section} for {hospital['name']}.")
+    seconds = time.perf_counter() - start
+    metrics.observe("parse_seconds", seconds, page="sitemap")
+    metrics.event("parse", page="sitemap", hospital=hospital["name"], seconds=round(seconds, 6), records={section: len(items) for section, items in extracted.items()})
+    return extracted
+
+# Function to read the items already saved for each section, grouped by hospital
+def load_existing_items(sections):
+    existing = {section: {} for section in sections}
+    for section in sections:
+        path, key = SECTION_OUTPUTS[section]
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                items = json.load(file).get(key, [])
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            continue
+        for item in items:
+            if "Hospital" in item:
+                existing[section].setdefault(item["Hospital"], []).append(item)
+    return existing
+
+# Function to fetch every hospital's sitemap once, in parallel, and extract all sections.
+# Returns the results by hospital and the callbacks that record the fetched sitemaps in
+# the response cache, to run once the outputs are written.
+def scrape_sitemaps(hospitals, sections, cache=None, max_workers=DEFAULT_MAX_WORKERS, force=False):
+    hospitals_by_url = {hospital["sitemap_url"]: hospital for hospital in hospitals}
+    results = {}
+    commits = []
+    with Crawler(max_workers=max_workers, cache=cache, force=force) as crawler:
+        handler = lambda url, page: extract_sections(page.content, hospitals_by_url[url], sections)
+        for url, extracted, commit in crawler.crawl(hospitals_by_url, handler):
+            name = hospitals_by_url[url]["name"]
+            if extracted is UNCHANGED:
+                print(f"Sitemap for {name} unchanged since the last crawl.")
+            results[name] = extracted
+            if commit is not None:
+                commits.append(commit)
+    return results, commits
+
+# Function to merge fresh results with saved items and write the section files
+def write_outputs(hospitals, sections, results, existing):
+    outputs = {}
+    for section in sections:
+        path, key = SECTION_OUTPUTS[section]
+        items = []
+        for hospital in hospitals:
+            extracted = results.get(hospital["name"])
+            if isinstance(extracted, dict) and section in extracted:
+                items.extend(extracted[section])
+            else:
+                # Unchanged or failed sitemap: keep what the previous crawl saved
+                items.extend(existing[section].get(hospital["name"], []))
+        outputs.setdefault(path, {})[key] = items
+
+    for path, data in outputs.items():
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    data = {**json.load(file), **data}
+            except Exception as e:
+                print(f"Error reading {path}, overwriting it: {e}")
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file, indent=4, ensure_ascii=False)
+        print(f"Data saved to {path}.")
+
+# Function to run the whole sitemap stage for the registry
+def run_sitemap_stage(registry_path=REGISTRY_PATH, sections=tuple(SECTION_OUTPUTS), cache_path=DEFAULT_CACHE_PATH, max_workers=DEFAULT_MAX_WORKERS, full=False):
+    hospitals = load_registry(registry_path)
+    existing = load_existing_items(sections)
+
+    # Without saved items for a hospital there is nothing to fall back on, so refetch
+    force = full or any(
+        hospital["name"] not in existing[section]
+        for hospital in hospitals
+        for section in sections
+        if section in hospital["sections"]
+    )
+
+    start = time.perf_counter()
+    # Each set of sections keeps its own cache entries: a run for other sections
+    # refreshing the sitemap must not hide the change from this one
+    cache = ResponseCache(cache_path, namespace=f"sitemap:{','.join(sorted(sections))}:")
+    try:
+        results, commits = scrape_sitemaps(hospitals, sections, cache, max_workers, force)
+        print(f"Processed {len(hospitals)} sitemaps in {time.perf_counter() - start:.1f}s.")
+
+        write_outputs(hospitals, sections, results, existing)
+        # Only now that the outputs are saved may later runs treat these sitemaps as seen
+        for commit in commits:
+            commit()
+    finally:
+        cache.close()
+
+# Main scraping logic
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape doctors, departments and treatments from every hospital sitemap.")
+    parser.add_argument("--registry", default=REGISTRY_PATH, help="JSON registry of hospitals and their sitemap selectors")
+    parser.add_argument("--sections", nargs="+", choices=list(SECTION_OUTPUTS), default=list(SECTION_OUTPUTS))
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Number of sitemaps fetched in parallel")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="On-disk HTTP response cache")
+    parser.add_argument("--full", action="store_true", help="Re-process every sitemap even if unchanged")
+    parser.add_argument("--metrics-dir", help="Write request/parse metrics here as metrics.jsonl and metrics.prom (default: $METRICS_DIR)")
+    args = parser.parse_args()
+    configure_metrics(args.metrics_dir)
+
+    run_sitemap_stage(args.registry, args.sections, args.cache, args.workers, args.full)
@@ -0,0 +1,100 @@
+import functools
+import os
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The scripts live at the repository root and import each other as top-level modules
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIXTURES_DIR = os.path.join(ROOT, "fixtures")
+
+# Static file handler that does not log every request to stderr
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+# Function to start an HTTP server with the given handler class on a free local port
+def start_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Serves directories over local HTTP; returns the base URL of each one
+@pytest.fixture
+def serve_directory():
+    servers = []
+
+    def serve(directory):
+        server = start_server(functools.partial(QuietHandler, directory=directory))
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+# Base URL of a local server for the fixture pages
+@pytest.fixture
+def fixture_server(serve_directory):
+    return serve_directory(FIXTURES_DIR)
+
+# Function to save a small randomly initialized GPT-2 with a byte-level BPE tokenizer
+# trained on the repository's training text, the way fine_tunning.py saves a model
+def save_tiny_gpt2(directory, tied=True, domain_tokens=(" Medanta, IN", "? Answer:")):
+    import torch
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+
+    with open(os.path.join(ROOT, "training_data.txt"), "r", encoding="utf-8") as file:
+        text = file.read().split("\n")[:500]
+    bpe = tokenizers.ByteLevelBPETokenizer()
+    bpe.train_from_iterator(text, vocab_size=600, special_tokens=["<|endoftext|>"], show_progress=False)
+    bpe.save_model(directory)
+    tokenizer = transformers.GPT2Tokenizer(os.path.join(directory, "vocab.json"), os.path.join(directory, "merges.txt"))
+    # Domain tokens as corpus_encoding adds them
+    tokenizer.add_tokens(list(domain_tokens))
+    tokenizer.save_pretrained(directory)
+
+    eos = tokenizer.convert_tokens_to_ids("<|endoftext|>")
+    config = transformers.GPT2Config(
+        vocab_size=len(tokenizer), n_positions=96, n_embd=64, n_layer=2, n_head=4,
+        bos_token_id=eos, eos_token_id=eos, tie_word_embeddings=tied,
+    )
+    torch.manual_seed(0)
+    transformers.GPT2LMHeadModel(config).save_pretrained(directory)
+    return directory
+
+# Directory of a tiny GPT-2, shared by the tests of a module
+@pytest.fixture(scope="module")
+def tiny_gpt2_dir(tmp_path_factory):
+    return save_tiny_gpt2(str(tmp_path_factory.mktemp("gpt2")))
+
+# PostgreSQL for the loader tests: $TEST_DATABASE_URL, else a throwaway server started
+# with pgserver if it is installed; the tests are skipped without either
+@pytest.fixture(scope="session")
+def postgres_uri(tmp_path_factory):
+    uri = os.environ.get("TEST_DATABASE_URL")
+    if uri:
+        yield uri
+        return
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")))
+    yield server.get_uri()
+    server.cleanup()
+
+# Connection to the test database with the scraper tables dropped
+@pytest.fixture
+def pg_conn(postgres_uri):
+    psycopg2 = pytest.importorskip("psycopg2")
+    conn = psycopg2.connect(postgres_uri)
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS doctors, treatments;")
+    conn.commit()
+    yield conn
+    conn.close()
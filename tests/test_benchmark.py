@@ -0,0 +1,22 @@
+from benchmark import compare_results, print_comparison
+
+def metrics(**values):
+    return {name.replace("__", "."): {"value": value, "better": "higher"} for name, value in values.items()}
+
+BASELINE = {"metrics": metrics(doctor_pages__pages_per_sec=100.0, preprocess__rows_per_sec=50.0, generation__tokens_per_sec=10.0, retired__items_per_sec=1.0)}
+
+def test_missing_metrics_are_regressions(capsys):
+    results = {"benchmarks": ["doctor_pages", "preprocess", "generation"], "metrics": metrics(doctor_pages__pages_per_sec=95.0, doctor_pages__bytes_per_sec=7.0)}
+    rows = {row[0]: row for row in compare_results(results, BASELINE, 0.1)}
+    assert rows["doctor_pages.pages_per_sec"][4] is False
+    assert rows["doctor_pages.bytes_per_sec"][3] is None and rows["doctor_pages.bytes_per_sec"][4] is False
+    # Crashed benchmarks and ones that no longer exist
+    for metric in ("preprocess.rows_per_sec", "generation.tokens_per_sec", "retired.items_per_sec"):
+        assert rows[metric][1] is None and rows[metric][4] is True
+    print_comparison(list(rows.values()), 0.1)
+    assert "3 regression(s)" in capsys.readouterr().out
+
+def test_benchmarks_left_out_with_only_are_not_regressions():
+    results = {"benchmarks": ["doctor_pages"], "metrics": metrics(doctor_pages__pages_per_sec=100.0)}
+    rows = compare_results(results, BASELINE, 0.1)
+    assert [row[0] for row in rows if row[4]] == ["retired.items_per_sec"]
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+import browser_pool
+import departments_list
+from browser_pool import BrowserPool
+
+# Stands in for a WebDriver: records the pages it was sent to and whether it was quit
+class StandInDriver:
+    def __init__(self, page_source=""):
+        self.visited = []
+        self.cookies_cleared = 0
+        self.quit_called = False
+        self.page_source = page_source
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def delete_all_cookies(self):
+        self.cookies_cleared += 1
+
+    def execute_script(self, script, *args):
+        return []
+
+    def find_elements(self, by, selector):
+        return []
+
+    def quit(self):
+        self.quit_called = True
+
+@pytest.fixture
+def drivers(monkeypatch):
+    started = []
+
+    def start_browser(blocked_urls=browser_pool.BLOCKED_URL_PATTERNS):
+        started.append(StandInDriver())
+        return started[-1]
+
+    monkeypatch.setattr(browser_pool, "start_browser", start_browser)
+    return started
+
+def test_sessions_are_reused_and_recycled(drivers):
+    with BrowserPool(size=1, pages_per_session=3) as pool:
+        for _ in range(4):
+            with pool.driver() as driver:
+                driver.get("http://example.org/")
+        assert len(drivers) == 2
+        assert pool.started == 2 and pool.recycled == 1
+        assert drivers[0].quit_called and drivers[0].visited.count("http://example.org/") == 3
+        # Each page is followed by a reset, except the one retiring the session
+        assert drivers[0].cookies_cleared == 2
+    assert drivers[1].quit_called
+
+def test_broken_session_is_replaced(drivers):
+    with BrowserPool(size=1) as pool:
+        with pytest.raises(WebDriverException):
+            with pool.driver():
+                raise WebDriverException("tab crashed")
+        with pool.driver() as driver:
+            pass
+        assert drivers[0].quit_called and driver is drivers[1]
+        assert pool.recycled == 1
+
+def test_map_runs_size_pages_at_a_time(drivers):
+    # Both pages must be open at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def scrape(url, driver):
+        barrier.wait()
+        return url, driver
+
+    with BrowserPool(size=2) as pool:
+        results = pool.map(scrape, ["a", "b"])
+    assert [url for url, _ in results] == ["a", "b"]
+    assert {id(driver) for _, driver in results} == {id(driver) for driver in drivers}
+    assert len(drivers) == 2 and all(driver.quit_called for driver in drivers)
+
+def test_load_more_without_a_driver_starts_a_headless_browser(monkeypatch):
+    started = []
+
+    def start_browser():
+        started.append(StandInDriver('<div class="speciality-title font700"><a href="/cardiology">Cardiology</a></div>'))
+        return started[-1]
+
+    monkeypatch.setattr(departments_list, "start_browser", start_browser)
+    links = departments_list.scrape_links_with_load_more("http://example.org/speciality/", "speciality-title font700", "button.theme-button", max_wait=0.1)
+    assert [link["Name"] for link in links] == ["Cardiology"]
+    assert len(started) == 1 and started[0].quit_called
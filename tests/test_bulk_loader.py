@@ -0,0 +1,96 @@
+import psycopg2
+import pytest
+
+from bulk_loader import migrate_canonical_links
+from doctor_detail_script import crawl_doctor_details, create_doctors_table, doctor_loader, load_doctor_pages
+from http_cache import ResponseCache
+
+DOCTOR_PAGES = ["dr-abha-thakur", "dr-arvinder-singh-soin", "dr-chhavi-kohli"]
+
+# Function to crawl the links into the doctors table; returns the finished loader
+def crawl_into_table(conn, links, cache, batch_size=1):
+    with doctor_loader(conn, batch_size) as loader:
+        load_doctor_pages(loader, crawl_doctor_details(links, max_workers=2, requests_per_second=0, cache=cache))
+    return loader
+
+def count_doctors(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM doctors;")
+        return cur.fetchone()[0]
+
+def test_pages_are_cached_only_after_their_rows_are_committed(pg_conn, fixture_server, tmp_path):
+    create_doctors_table(pg_conn)
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    links = [f"{fixture_server}/doctor_pages/{name}.html" for name in DOCTOR_PAGES]
+
+    # Every insert fails: no page may be recorded as seen
+    with pg_conn.cursor() as cur:
+        cur.execute("ALTER TABLE doctors ADD CONSTRAINT reject_all CHECK (false) NOT VALID;")
+    pg_conn.commit()
+    with pytest.raises(psycopg2.Error):
+        crawl_into_table(pg_conn, links, cache)
+    assert count_doctors(pg_conn) == 0
+    assert all(cache.get(link) is None for link in links)
+
+    # The next run still sees every page as changed and loads it
+    with pg_conn.cursor() as cur:
+        cur.execute("ALTER TABLE doctors DROP CONSTRAINT reject_all;")
+    pg_conn.commit()
+    loader = crawl_into_table(pg_conn, links, cache)
+    assert loader.rows_loaded == len(links) == count_doctors(pg_conn)
+    assert all(cache.get(link) is not None for link in links)
+
+    # Once loaded, unchanged pages are skipped
+    loader = crawl_into_table(pg_conn, links, cache)
+    assert loader.rows_loaded == 0
+    cache.close()
+
+def test_after_flush_waits_for_the_pending_batch(pg_conn):
+    create_doctors_table(pg_conn)
+    calls = []
+    with doctor_loader(pg_conn, batch_size=2) as loader:
+        loader.after_flush(lambda: calls.append("empty"))
+        loader.add(("A", "B", "C", "D", "https://example.org/doctor/a"))
+        loader.after_flush(lambda: calls.append("a"))
+        assert calls == ["empty"]
+        loader.add(("A", "B", "C", "D", "https://example.org/doctor/b"))
+        assert calls == ["empty", "a"]
+        loader.add(("A", "B", "C", "D", "https://example.org/doctor/c"))
+        loader.after_flush(lambda: calls.append("c"))
+        assert calls == ["empty", "a"]
+    assert calls == ["empty", "a", "c"]
+
+def test_last_duplicate_wins_and_reloads_change_nothing(pg_conn):
+    create_doctors_table(pg_conn)
+    link = "https://example.org/doctor/a"
+    rows = [("Dr. A", "Old", "MBBS", "H", link), ("Dr. B", "X", "MD", "H", "https://example.org/doctor/b"), ("Dr. A", "New", "MBBS, MD", "H", link)]
+    with doctor_loader(pg_conn, batch_size=100) as loader:
+        loader.add_many(rows)
+    assert loader.rows_changed == 2
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT specialization, degree FROM doctors WHERE link = %s;", (link,))
+        assert cur.fetchall() == [("New", "MBBS, MD")]
+
+    with doctor_loader(pg_conn, batch_size=100) as loader:
+        loader.add_many(rows)
+    assert loader.rows_changed == 0
+    assert count_doctors(pg_conn) == 2
+
+def test_rows_saved_from_raw_hrefs_are_canonicalized(pg_conn):
+    branch = "https://www.medanta.org/hospitals-near-me/gurugram-hospital"
+    with pg_conn.cursor() as cur:
+        cur.execute("CREATE TABLE doctors (id SERIAL PRIMARY KEY, name TEXT, specialization TEXT, degree TEXT, hospital_name TEXT, link TEXT);")
+        cur.executemany(
+            "INSERT INTO doctors (name, specialization, degree, hospital_name, link) VALUES (%s, %s, %s, %s, %s);",
+            [
+                ("Dr. X", "Old", "MBBS", "H", f"{branch}/speciality/urology/doctor/dr-x/"),
+                ("Dr. X", "New", "MBBS", "H", f"{branch.upper().replace('HOSPITALS-NEAR-ME/GURUGRAM-HOSPITAL', 'hospitals-near-me/gurugram-hospital')}/speciality/cardiology/doctor/dr-x?utm_source=mail"),
+                ("Dr. Y", "Y", "MD", "H", f"{branch}/speciality/cardiology/doctor/dr-y"),
+            ],
+        )
+    pg_conn.commit()
+    create_doctors_table(pg_conn)
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT specialization, link FROM doctors ORDER BY link;")
+        assert cur.fetchall() == [("New", f"{branch}/speciality/cardiology/doctor/dr-x"), ("Y", f"{branch}/speciality/cardiology/doctor/dr-y")]
+    assert migrate_canonical_links(pg_conn, "doctors", "link") == 0
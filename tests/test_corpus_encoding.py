@@ -0,0 +1,99 @@
+import pytest
+
+from corpus_encoding import TEMPLATE_PHRASES, UrlRefs, apply_encoding, domain_tokens, encoded_path, extend_tokenizer, init_token_embeddings, load_url_refs
+
+BRANCH = "https://www.medanta.org/hospitals-near-me/gurugram-hospital"
+
+# Function to build a doctor and a treatment record for a hospital
+def records(hospital, doctor):
+    return [
+        f"Question: What is the specialization and degree of Dr. {doctor} from {hospital}? Answer: Dr. {doctor} specializes in Cardiology "
+        f"and holds the degree MBBS. Find more at {BRANCH}/speciality/cardiology/doctor/{doctor.lower().replace(' ', '-')}.",
+        f"Question: What is the treatment offered at {hospital}? Answer: {hospital} offers treatment for Angioplasty. "
+        f"Learn more at {BRANCH}/speciality/cardiology/treatment/angioplasty.",
+    ]
+
+@pytest.fixture
+def corpus(tmp_path):
+    lines = []
+    for i in range(5):
+        lines += records("Medanta, IN", f"Asha Rao{i}")
+    lines += records("Rare Hospital", "Vikram Mehta")
+    path = tmp_path / "training_data.txt"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+def test_domain_tokens_keep_frequent_hospitals_and_url_prefixes(corpus):
+    tokens = domain_tokens([corpus], min_count=5)
+    assert tokens[:len(TEMPLATE_PHRASES)] == TEMPLATE_PHRASES
+    assert " Medanta, IN" in tokens and " Rare Hospital" not in tokens
+    assert f" {BRANCH}/speciality/" in tokens and "/doctor/" in tokens and "/treatment/" in tokens
+
+    # With URL references the prefixes are not needed, the reference start is
+    tokens = domain_tokens([corpus], refs=True, min_count=5)
+    assert " <ref" in tokens and not any("https://" in token or token == "/doctor/" for token in tokens)
+
+def test_url_references_expand_back(tmp_path):
+    refs = UrlRefs()
+    text = f"Find more at {BRANCH}/doctor/a. Or at {BRANCH}/doctor/b, and again {BRANCH}/doctor/a!"
+    encoded = refs.encode(text)
+    assert encoded == "Find more at <ref0>. Or at <ref1>, and again <ref0>!"
+    assert refs.expand(encoded) == text
+    # References the model made up are left as they are
+    assert refs.expand("See <ref7>.") == "See <ref7>."
+
+    refs.save(str(tmp_path))
+    assert load_url_refs(str(tmp_path)).urls == refs.urls
+    assert load_url_refs(str(tmp_path / "missing")) is None
+
+@pytest.mark.parametrize("text,partial", [
+    ("Find more at <", True),
+    ("Find more at <r", True),
+    ("Find more at <re", True),
+    ("Find more at <ref", True),
+    ("Find more at <ref12", True),
+    ("Find more at <ref12>", False),
+    ("Find more at <b", False),
+    ("Find more at", False),
+])
+def test_partial_references_are_held_back(text, partial):
+    assert UrlRefs().is_partial(text) == partial
+
+def test_refs_encoding_writes_encoded_copies(corpus):
+    # Only the vocabulary calls of a tokenizer are used
+    class Tokenizer:
+        def __init__(self):
+            self.added = []
+
+        def get_vocab(self):
+            return {"? Answer:": 0}
+
+        def add_tokens(self, tokens):
+            self.added += tokens
+
+    tokenizer = Tokenizer()
+    paths, refs, added = apply_encoding("both", [corpus], tokenizer, min_count=5)
+    assert paths == [encoded_path(corpus, "both")] and len(refs) == 7
+    with open(paths[0], "r", encoding="utf-8") as file:
+        encoded = file.read()
+    with open(corpus, "r", encoding="utf-8") as file:
+        assert "https://" not in encoded and refs.expand(encoded) == file.read()
+    # Tokens already in the vocabulary are not added again
+    assert "? Answer:" not in added and added == tokenizer.added and " <ref" in added
+
+def test_new_tokens_start_at_the_mean_of_their_pieces(tiny_gpt2_dir):
+    transformers = pytest.importorskip("transformers")
+    base = transformers.GPT2Tokenizer.from_pretrained(tiny_gpt2_dir)
+    tokenizer = transformers.GPT2Tokenizer.from_pretrained(tiny_gpt2_dir)
+    model = transformers.GPT2LMHeadModel.from_pretrained(tiny_gpt2_dir)
+    original = model.get_input_embeddings().weight.detach().clone()
+
+    added = extend_tokenizer(tokenizer, [" Medanta, IN", " Find more at"])
+    assert added == [" Find more at"]
+    init_token_embeddings(model, tokenizer, base, added)
+    embeddings = model.get_input_embeddings().weight
+    assert embeddings.shape[0] == len(tokenizer) == len(base) + 1
+    pieces = base.encode(" Find more at", add_special_tokens=False)
+    assert len(pieces) > 1
+    assert embeddings[-1].tolist() == original[pieces].mean(dim=0).tolist()
+    assert tokenizer.encode("Dr. X. Find more at", add_special_tokens=False)[-1] == len(base)
@@ -0,0 +1,88 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from conftest import start_server
+from crawler import Crawler, RateLimiter
+from doctor_detail_script import crawl_doctor_details
+
+DOCTOR_PAGES = ["dr-abha-thakur", "dr-arvinder-singh-soin", "dr-chhavi-kohli"]
+
+# Answers every GET after a short delay, recording the most requests in flight at once
+class SlowHandler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        body = f"<html><body>{self.path}</body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_crawl_yields_doctor_tuples_for_every_page(fixture_server):
+    links = [f"{fixture_server}/doctor_pages/{name}.html" for name in DOCTOR_PAGES]
+    doctors = [doctor for details, _ in crawl_doctor_details(links, max_workers=4, requests_per_second=0) for doctor in details]
+    assert sorted(doctor[4] for doctor in doctors) == sorted(links)
+    assert all(len(doctor) == 5 for doctor in doctors)
+    assert "Dr. Arvinder Singh Soin" in {doctor[0] for doctor in doctors}
+
+def test_failed_pages_yield_none(fixture_server):
+    urls = [f"{fixture_server}/doctor_pages/{DOCTOR_PAGES[0]}.html", f"{fixture_server}/missing.html"]
+    with Crawler(requests_per_second=0, max_retries=0) as crawler:
+        results = {url: result for url, result, _ in crawler.crawl(urls, lambda url, page: page.status_code)}
+    assert results == {urls[0]: 200, urls[1]: None}
+
+def test_per_host_concurrency_is_capped():
+    handler = type("Handler", (SlowHandler,), {"lock": threading.Lock()})
+    server = start_server(handler)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [f"{base}/page/{i}" for i in range(24)]
+        with Crawler(max_workers=16, per_host_concurrency=3, requests_per_second=0, max_per_host_concurrency=3) as crawler:
+            results = {url: result for url, result, _ in crawler.crawl(urls, lambda url, page: page.content)}
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert all(results[url] for url in urls)
+    assert handler.peak <= 3
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(20)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.wait()
+    assert time.monotonic() - start >= 4 / 20 - 0.01
+
+def test_closing_the_crawl_cancels_pending_fetches():
+    handler = type("Handler", (SlowHandler,), {"lock": threading.Lock(), "requests": 0})
+    original = handler.do_GET
+
+    def do_GET(self):
+        with handler.lock:
+            handler.requests += 1
+        original(self)
+
+    handler.do_GET = do_GET
+    server = start_server(handler)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with Crawler(max_workers=2, requests_per_second=0) as crawler:
+            results = crawler.crawl([f"{base}/page/{i}" for i in range(40)], lambda url, page: page.content)
+            next(results)
+            results.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert handler.requests <= 4
@@ -0,0 +1,71 @@
+import numpy as np
+
+from dedup import LSHIndex, deduplicate, is_validation, iter_records, minhash_signature, normalize
+
+DEGREES = "MBBS , MD (Internal Medicine) , DM (Cardiology) , Fellowship in Interventional Cardiology , FACC , FESC"
+DOCTOR = (
+    "Question: What is the specialization and degree of Dr. Asha Rao from Medanta, IN? "
+    f"Answer: Dr. Asha Rao specializes in Cardiology and holds the degree {DEGREES}. "
+    "Find more at https://www.medanta.org/hospitals-near-me/gurugram-hospital/speciality/cardiology/doctor/dr-asha-rao."
+)
+
+# Function to write records one per line and return the path
+def write_records(tmp_path, records):
+    path = tmp_path / "training_data.txt"
+    path.write_text("\n".join(records), encoding="utf-8")
+    return str(path)
+
+def test_exact_and_near_duplicates_are_removed(tmp_path):
+    records = [
+        DOCTOR,
+        # Same record with other spacing, case and a doubled title
+        DOCTOR.replace("Dr. Asha", "Dr. Dr. Asha").replace(" specializes", "  SPECIALIZES"),
+        # Near duplicate: one degree differs
+        DOCTOR.replace("FESC", "FRCP"),
+        # Another doctor
+        DOCTOR.replace("Asha Rao", "Vikram Mehta").replace("asha-rao", "vikram-mehta").replace("Cardiology and", "Neurology and"),
+        "Question: What is the treatment offered at Medanta, IN? Answer: Medanta, IN offers treatment for Sports Injuries.",
+    ]
+    output = tmp_path / "deduped.txt"
+    stats = deduplicate(write_records(tmp_path, records), str(output))
+    assert output.read_text(encoding="utf-8").split("\n") == [records[0], records[3], records[4]]
+    assert (stats["records"], stats["exact"], stats["near"]) == (5, 1, 1)
+    assert stats["tokens_removed"] == len(records[1].split()) + len(records[2].split())
+
+    # Without the MinHash pass only the exact copy goes
+    stats = deduplicate(write_records(tmp_path, records), str(output), near=False)
+    assert (stats["exact"], stats["near"]) == (1, 0)
+
+def test_minhash_estimates_jaccard_similarity():
+    base = normalize(DOCTOR)
+    index = LSHIndex(threshold=0.8)
+    assert not index.is_near_duplicate(minhash_signature(base))
+    assert index.is_near_duplicate(minhash_signature(base.replace("fesc", "frcp")))
+    # Half the shingles differ: neither a candidate match nor close enough
+    words = base.split()
+    half = " ".join(words[:len(words) // 2] + [f"other{i}" for i in range(len(words) // 2)])
+    assert not index.is_near_duplicate(minhash_signature(half))
+    assert len(index.signatures) == 2
+    assert np.mean(minhash_signature(base) == minhash_signature(half)) < 0.8
+
+def test_continuation_lines_belong_to_their_record(tmp_path):
+    path = write_records(tmp_path, ["Question: a? Answer: line one", "line two", "Question: b? Answer: c."])
+    assert list(iter_records(path)) == ["Question: a? Answer: line one\nline two", "Question: b? Answer: c."]
+
+def test_validation_split_keeps_each_entity_on_one_side(tmp_path):
+    branch = "https://www.medanta.org/hospitals-near-me/gurugram-hospital"
+    records = []
+    for i in range(200):
+        for speciality in ("cardiology", "urology"):
+            # The same doctor listed under two specialities, with different answers
+            records.append(f"Question: What is the specialization and degree of Dr. Doctor {i} from Medanta, IN? Answer: Dr. Doctor {i} specializes in {speciality}. Find more at {branch}/speciality/{speciality}/doctor/dr-{i}.")
+    output, validation = tmp_path / "train.txt", tmp_path / "valid.txt"
+    stats = deduplicate(write_records(tmp_path, records), str(output), near=False, validation_path=str(validation), validation_share=0.25)
+
+    doctors = lambda path: [line.rsplit("/", 1)[1] for line in path.read_text(encoding="utf-8").split("\n")]
+    train, held_out = doctors(output), doctors(validation)
+    assert len(train) + len(held_out) == 400 and stats["validation"] == len(held_out)
+    assert not set(train) & set(held_out)
+    assert 60 <= len(held_out) <= 140
+    # The side is fixed by the entity alone, whatever else is in the corpus
+    assert all(is_validation(record, normalize(record), 0.25) == (record.rsplit("/", 1)[1] in held_out) for record in records[::7])
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from conftest import FIXTURES_DIR
+from departments_list import merge_links, pagination_template, scrape_links_via_endpoint, scrape_links_with_load_more
+from extractors import extract_departments
+
+CLASS_NAME = "speciality-title font700"
+
+# Function to extract the listing items of a fixture page
+def fixture_links(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as file:
+        return extract_departments(file.read(), CLASS_NAME)
+
+# Every item of the fixture listing: the landing page plus each "Load More" batch
+def all_fixture_links():
+    links = fixture_links("speciality.html")
+    for page in (2, 3, 4):
+        links = merge_links(links, fixture_links(f"speciality_pages/{page}.html"))
+    return links
+
+def test_pagination_template_from_query_or_path():
+    assert pagination_template("https://example.org/load-more?cat=7&page=2") == ("https://example.org/load-more?cat=7&page={page}", 2)
+    assert pagination_template("https://example.org/speciality_pages/3.html") == ("https://example.org/speciality_pages/{page}.html", 3)
+    assert pagination_template("https://example.org/speciality/") is None
+
+def test_endpoint_fast_path_loads_every_batch(fixture_server):
+    links = scrape_links_via_endpoint(f"{fixture_server}/speciality_pages/2.html", CLASS_NAME, landing_url=f"{fixture_server}/speciality.html")
+    assert [link["Name"] for link in links] == [link["Name"] for link in all_fixture_links()]
+
+def test_endpoint_stops_when_a_page_adds_nothing(fixture_server):
+    links = scrape_links_via_endpoint(f"{fixture_server}/speciality_pages/2.html", CLASS_NAME, first_page=4, max_pages=10)
+    assert len(links) == len(fixture_links("speciality_pages/4.html"))
+
+# Headless Chrome, or a skip where no browser is installed
+@pytest.fixture
+def browser():
+    from browser_pool import start_browser
+
+    try:
+        driver = start_browser()
+    except Exception as e:
+        pytest.skip(f"Chrome is not available: {e}")
+    yield driver
+    driver.quit()
+
+def test_load_more_clicks_until_the_listing_is_complete(fixture_server, browser):
+    links = scrape_links_with_load_more(f"{fixture_server}/speciality_load_more.html", CLASS_NAME, "button.theme-button", max_wait=5, driver=browser)
+    assert {link["Name"] for link in links} == {link["Name"] for link in all_fixture_links()}
@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+transformers = pytest.importorskip("transformers")
+
+from evaluation import EvalSet, Evaluator, split_record
+from fine_tunning import HeldOutTrainer, build_parser, training_arguments, training_callbacks
+
+RECORDS = [
+    "Question: What is the treatment offered at Medanta, IN? Answer: Medanta, IN offers treatment for Sports Injuries.",
+    "Question: What is the specialization and degree of Dr. A from Medanta, IN? Answer: Dr. A specializes in Urology\nand holds the degree MBBS.",
+    "Question: a record without an answer",
+]
+
+@pytest.fixture(scope="module")
+def tiny_model(tiny_gpt2_dir):
+    tokenizer = transformers.GPT2Tokenizer.from_pretrained(tiny_gpt2_dir)
+    model = transformers.GPT2LMHeadModel.from_pretrained(tiny_gpt2_dir).eval()
+    return model, tokenizer
+
+def test_eval_set_is_cached_with_its_answer_starts(tiny_model, tmp_path):
+    _, tokenizer = tiny_model
+    path = tmp_path / "validation_data.txt"
+    path.write_text("\n".join(RECORDS), encoding="utf-8")
+    cache_dir = str(tmp_path / "shards")
+
+    built = EvalSet.from_file(str(path), tokenizer, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    cached = EvalSet.from_file(str(path), tokenizer, cache_dir)
+    for eval_set in (built, cached):
+        assert len(eval_set) == 3
+        for record, ids, start in zip(RECORDS, eval_set.records, eval_set.answer_starts):
+            prompt, answer = split_record(record)
+            assert ids.tolist() == tokenizer.encode(prompt) + tokenizer.encode(answer)
+            assert start == (len(tokenizer.encode(prompt)) if answer else len(ids))
+
+def test_empty_validation_file_stays_empty_when_cached(tiny_model, tmp_path):
+    _, tokenizer = tiny_model
+    path = tmp_path / "validation_data.txt"
+    path.write_text("", encoding="utf-8")
+    for _ in range(2):
+        eval_set = EvalSet.from_file(str(path), tokenizer, str(tmp_path / "shards"))
+        assert len(eval_set) == 0 and not eval_set and len(eval_set.answer_starts) == 0
+
+# Function to greedily continue a prompt by n tokens
+def greedy(model, ids, n):
+    output = model.generate(torch.tensor([ids]), max_new_tokens=n, min_new_tokens=n, do_sample=False, pad_token_id=0)
+    return output[0, len(ids):].tolist()
+
+def test_scores_match_records_scored_one_by_one(tiny_model):
+    model, tokenizer = tiny_model
+    prompts = [tokenizer.encode(split_record(record)[0]) for record in RECORDS[:2]] + [tokenizer.encode("Question: Who? Answer:")]
+    # The first two answers are what the model generates, the third is not
+    answers = [greedy(model, prompts[0], 5), greedy(model, prompts[1], 3), [(greedy(model, prompts[2], 1)[0] + 1) % len(tokenizer), 7, 9]]
+    records = [np.asarray(p + a, dtype=np.int64) for p, a in zip(prompts, answers)]
+    # A record without an answer counts for perplexity only
+    records.append(np.asarray(tokenizer.encode(RECORDS[2]), dtype=np.int64))
+    starts = np.asarray([len(p) for p in prompts] + [len(records[3])], dtype=np.int64)
+    evaluator = Evaluator(EvalSet(records, starts), tokenizer.eos_token_id, batch_size=3)
+    metrics = evaluator.evaluate(model)
+
+    nll = tokens = correct = answer_tokens = 0
+    with torch.no_grad():
+        for ids, start in zip(records, starts):
+            input_ids = torch.from_numpy(ids)[None]
+            output = model(input_ids=input_ids, labels=input_ids)
+            nll += output.loss.item() * (len(ids) - 1)
+            tokens += len(ids) - 1
+            predicted = output.logits[0, :-1].argmax(-1)
+            correct += int((predicted[start - 1:] == input_ids[0, start:]).sum())
+            answer_tokens += len(ids) - start
+    assert metrics["eval_loss"] == pytest.approx(nll / tokens, rel=1e-5)
+    assert metrics["eval_perplexity"] == pytest.approx(np.exp(nll / tokens), rel=1e-5)
+    assert metrics["eval_answer_token_accuracy"] == correct / answer_tokens
+    assert metrics["eval_exact_match"] == 2 / 3
+    assert metrics["eval_samples"] == 4
+    assert not model.training
+
+# Stands in for the held-out Evaluator: the eval loss gets worse at every evaluation
+class WorseningEvaluator:
+    def __init__(self):
+        self.calls = 0
+
+    def evaluate(self, model, prefix="eval"):
+        self.calls += 1
+        return {f"{prefix}_loss": float(self.calls)}
+
+def test_early_stopping_restores_the_best_checkpoint(tiny_gpt2_dir, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tokenizer = transformers.GPT2Tokenizer.from_pretrained(tiny_gpt2_dir)
+    model = transformers.GPT2LMHeadModel.from_pretrained(tiny_gpt2_dir)
+    args = build_parser().parse_args(["--output-dir", str(tmp_path / "out"), "--max-steps", "10", "--eval-steps", "2", "--batch-size", "2", "--early-stopping-patience", "2"])
+    evaluator = WorseningEvaluator()
+    training_args = training_arguments(args, evaluator)
+    training_args.report_to = []
+    torch.manual_seed(0)
+    train_dataset = [torch.randint(0, len(tokenizer), (16,)) for _ in range(8)]
+    trainer = HeldOutTrainer(
+        model=model,
+        args=training_args,
+        data_collator=transformers.DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False),
+        train_dataset=train_dataset,
+        # Required by Trainer, unused: the evaluator scores the model
+        eval_dataset=train_dataset[:2],
+        callbacks=training_callbacks(args, evaluator),
+        evaluator=evaluator,
+    )
+    trainer.train()
+    # Steps 4 and 6 did not improve on step 2, so training stops after step 6
+    assert evaluator.calls == 3 and trainer.state.global_step == 6
+    assert trainer.state.best_metric == 1.0
+    assert trainer.state.best_model_checkpoint.endswith("checkpoint-2")
+    best = transformers.GPT2LMHeadModel.from_pretrained(trainer.state.best_model_checkpoint)
+    for (name, expected), actual in zip(best.state_dict().items(), trainer.model.state_dict().values()):
+        assert torch.equal(expected, actual), name
+
+def test_best_model_selection_needs_an_evaluator(tmp_path):
+    args = build_parser().parse_args(["--output-dir", str(tmp_path)])
+    training_args = training_arguments(args)
+    assert not training_args.load_best_model_at_end and training_args.eval_strategy == "no"
+    assert training_callbacks(args) == []
+
+    training_args = training_arguments(args, WorseningEvaluator())
+    assert training_args.load_best_model_at_end and training_args.eval_strategy == "steps"
+    assert training_args.save_steps == training_args.eval_steps == 100
+    assert [type(callback) for callback in training_callbacks(args, WorseningEvaluator())] == [transformers.EarlyStoppingCallback]
+    args = build_parser().parse_args(["--output-dir", str(tmp_path), "--early-stopping-patience", "0"])
+    assert training_callbacks(args, WorseningEvaluator()) == []
@@ -0,0 +1,54 @@
+import pytest
+import torch
+
+transformers = pytest.importorskip("transformers")
+
+from deployment_model import load_model
+from export_model import conv1d_to_linear, export_int8, export_onnx, load_int8_model, quantize_model
+
+PROMPT = "Question: What is the treatment offered at Medanta, IN? Answer:"
+
+# Function to get the logits a model gives the tokenized prompt
+def prompt_logits(model, tokenizer):
+    inputs = tokenizer(PROMPT, return_tensors="pt")
+    with torch.inference_mode():
+        return model(**inputs).logits.float()
+
+# Function to greedily decode the prompt's continuation token IDs
+def greedy_tokens(model, tokenizer, max_new_tokens=16):
+    inputs = tokenizer(PROMPT, return_tensors="pt")
+    outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+    return outputs[0, inputs["input_ids"].shape[1]:].tolist()
+
+def test_conv1d_layers_become_equivalent_linear_layers(tiny_gpt2_dir):
+    model, tokenizer = load_model(tiny_gpt2_dir)
+    expected = prompt_logits(model, tokenizer)
+    model = conv1d_to_linear(model)
+    assert not any(isinstance(module, transformers.pytorch_utils.Conv1D) for module in model.modules())
+    torch.testing.assert_close(prompt_logits(model, tokenizer), expected, rtol=1e-5, atol=1e-5)
+
+def test_int8_export_loads_back_the_quantized_model(tiny_gpt2_dir, tmp_path):
+    model, tokenizer = load_model(tiny_gpt2_dir)
+    expected = prompt_logits(model, tokenizer)
+    output_dir = str(tmp_path / "int8")
+    export_int8(tiny_gpt2_dir, output_dir)
+
+    int8, int8_tokenizer = load_model(output_dir, "int8")
+    assert any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in int8.modules())
+    assert int8_tokenizer.get_vocab() == tokenizer.get_vocab()
+    logits = prompt_logits(int8, tokenizer)
+    # Same weights as quantizing in memory, and close to the fp32 model
+    torch.testing.assert_close(logits, prompt_logits(quantize_model(load_model(tiny_gpt2_dir)[0]), tokenizer))
+    assert (logits - expected).abs().max() < 0.05 * expected.abs().max()
+    assert torch.equal(load_int8_model(output_dir).lm_head.weight(), int8.lm_head.weight())
+
+def test_onnx_export_matches_fp32(tiny_gpt2_dir, tmp_path):
+    pytest.importorskip("optimum.onnxruntime")
+    model, tokenizer = load_model(tiny_gpt2_dir)
+    output_dir = str(tmp_path / "onnx")
+    export_onnx(tiny_gpt2_dir, output_dir)
+
+    onnx, onnx_tokenizer = load_model(output_dir, "onnx")
+    torch.testing.assert_close(prompt_logits(onnx, onnx_tokenizer), prompt_logits(model, tokenizer), rtol=1e-4, atol=1e-4)
+    # Generation through the exported KV-cache graph gives the fp32 answer
+    assert greedy_tokens(onnx, onnx_tokenizer) == greedy_tokens(model, tokenizer)
@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+from lxml import html
+
+from conftest import FIXTURES_DIR, ROOT
+from extractors import MISSING, bs4_doctor_details, extract_departments, extract_doctor_details, extract_listing
+
+DOCTOR_PAGES = os.path.join(FIXTURES_DIR, "doctor_pages")
+
+# Function to read a fixture page as bytes
+def read_fixture(path):
+    with open(os.path.join(FIXTURES_DIR, path), "rb") as file:
+        return file.read()
+
+@pytest.mark.parametrize("filename", sorted(os.listdir(DOCTOR_PAGES)))
+def test_doctor_rule_matches_beautifulsoup(filename):
+    pytest.importorskip("bs4")
+    page = read_fixture(os.path.join("doctor_pages", filename))
+    details = extract_doctor_details(page, filename, "Medanta, IN")
+    assert details == bs4_doctor_details(page, filename, "Medanta, IN")
+    assert details and all(MISSING not in doctor for doctor in details)
+
+def test_missing_fields_are_reported_as_missing():
+    page = '<div class="dr-details"><h1 class="dr-details-name"> Dr. X </h1></div>'
+    assert extract_doctor_details(page, "u", "H") == [("Dr. X", MISSING, MISSING, "H", "u")]
+
+# Every section of the registry, as the sitemap scraper reads them
+def registry_sections():
+    with open(os.path.join(ROOT, "hospitals.json"), "r", encoding="utf-8") as file:
+        return sorted(json.load(file)["hospitals"][0]["sections"].items())
+
+@pytest.mark.parametrize("section,container_xpath", registry_sections())
+def test_listing_rule_matches_the_per_item_lxml_loop(section, container_xpath):
+    page = read_fixture("sitemap.html")
+    # The loop the sitemap scrapers used before the shared rules
+    expected = []
+    for item in html.fromstring(page).xpath(container_xpath)[0].xpath(".//li"):
+        anchor = item.xpath(".//a")
+        if anchor:
+            expected.append({"Name": anchor[0].text.strip(), "Link": anchor[0].get("href").strip()})
+    assert expected
+    assert extract_listing(page, container_xpath) == expected
+
+def test_department_cards_need_a_link():
+    page = """
+    <div class="speciality-title font700"><a href="/cardiology"> Cardiology </a></div>
+    <div class="font700 speciality-title extra"><a href="/urology"></a></div>
+    <div class="speciality-title font700">No link</div>
+    <div class="speciality-title"><a href="/other">Other</a></div>
+    """
+    assert extract_departments(page) == [{"Name": "Cardiology", "Link": "/cardiology"}, {"Name": "Unnamed", "Link": "/urology"}]
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+
+import pytest
+import torch
+
+from conftest import ROOT, save_tiny_gpt2
+
+transformers = pytest.importorskip("transformers")
+
+import fast_gpt2
+from deployment_model import generate_answer, load_model
+
+PROMPTS = [
+    "Question: What is the treatment offered at Medanta, IN? Answer:",
+    "Question: What is the specialization and degree of Dr. Arvinder Singh Soin from Medanta, IN? Answer:",
+    "naïve café — 東京 ü",
+]
+
+# A tiny GPT-2 saved with tied and with untied output embeddings
+@pytest.fixture(scope="module", params=["tied", "untied"])
+def model_dir(request, tmp_path_factory):
+    return save_tiny_gpt2(str(tmp_path_factory.mktemp(f"gpt2-{request.param}")), tied=request.param == "tied")
+
+def test_logits_match_gpt2lmheadmodel(model_dir):
+    reference = transformers.GPT2LMHeadModel.from_pretrained(model_dir).eval()
+    model = fast_gpt2.FastGPT2.from_pretrained(model_dir)
+    input_ids = torch.randint(0, reference.config.vocab_size, (2, 12))
+    with torch.no_grad():
+        expected = reference(input_ids).logits
+        # Whole prompt at once, then token by token through the KV cache
+        logits, past = model.forward(input_ids[:, :8])
+        torch.testing.assert_close(logits[:, -1], expected[:, 7], rtol=1e-4, atol=1e-4)
+        for position in range(8, 12):
+            logits, past = model.forward(input_ids[:, position:position + 1], past)
+            torch.testing.assert_close(logits[:, -1], expected[:, position], rtol=1e-4, atol=1e-4)
+
+def test_tokenizer_matches_gpt2tokenizer(model_dir):
+    reference = transformers.GPT2Tokenizer.from_pretrained(model_dir)
+    tokenizer = fast_gpt2.FastTokenizer.from_pretrained(model_dir)
+    assert tokenizer.eos_token_id == reference.eos_token_id
+    for prompt in PROMPTS:
+        ids = reference.encode(prompt)
+        assert tokenizer.encode(prompt) == ids
+        ids = ids + [reference.eos_token_id]
+        for skip in (False, True):
+            assert tokenizer.decode(ids, skip_special_tokens=skip) == reference.decode(ids, skip_special_tokens=skip, spaces_between_special_tokens=False)
+
+def test_answers_match_transformers_generate(model_dir):
+    assert fast_gpt2.supports(model_dir)
+    fast = load_model(model_dir, fast=True)
+    reference = load_model(model_dir, fast=False)
+    assert isinstance(fast[0], fast_gpt2.FastGPT2)
+    for prompt in PROMPTS:
+        assert generate_answer(*fast, prompt, max_length=60) == generate_answer(*reference, prompt, max_length=60)
+
+# Function to run code in a fresh interpreter; it exits with the heavy modules it loaded
+def heavy_modules_after(code, modules=("numpy", "pandas", "torch", "transformers")):
+    code += f"; sys.exit(' '.join(sorted(set({list(modules)!r}) & set(sys.modules))) or None)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    return result.returncode, result.stderr, result.stdout
+
+# Function to build the code that runs deployment_model's entry point with the given arguments
+def run_deployment(*args):
+    return f"import runpy, sys; sys.argv = ['deployment_model.py', *{list(args)!r}]; runpy.run_path('deployment_model.py', run_name='__main__')"
+
+def test_deployment_imports_stay_light():
+    returncode, stderr, _ = heavy_modules_after("import sys, deployment_model")
+    assert returncode == 0, stderr
+
+def test_default_lookup_is_built_only_for_templated_questions(model_dir):
+    # A free-form prompt goes straight to the model: the default CSV lookup is never parsed
+    returncode, stderr, stdout = heavy_modules_after(run_deployment("Hello", "--model-dir", model_dir, "--max-length", "12", "--no-cache"), ("pandas", "transformers"))
+    assert returncode == 0, stderr
+    assert stdout.startswith("Hello")
+
+    # A templated question is answered from the index without loading any model
+    question = "What is the treatment offered at Medanta, IN?"
+    returncode, stderr, stdout = heavy_modules_after(run_deployment(question, "--model-dir", "missing-model", "--timings"), ("torch", "transformers"))
+    assert returncode == 0, stderr
+    assert stdout.startswith(f"{question} Answer: Medanta, IN offers treatment for ")
+    assert "lookup index" in stdout
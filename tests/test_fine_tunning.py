@@ -0,0 +1,51 @@
+import pytest
+import torch
+
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("peft")
+
+from fine_tunning import add_lora_adapters, merge_lora_adapters
+
+PROMPT = "Question: What is the treatment offered at Medanta, IN? Answer:"
+
+# Function to take a few optimizer steps on the trainable parameters, so the adapters
+# (whose B matrices start at zero) actually change the model
+def train_steps(model, input_ids, steps=3):
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=1e-2)
+    model.train()
+    for _ in range(steps):
+        loss = model(input_ids=input_ids, labels=input_ids).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    return model.eval()
+
+@pytest.mark.parametrize("train_new_tokens", [False, True])
+def test_merged_lora_checkpoint_loads_in_plain_transformers(tiny_gpt2_dir, tmp_path, train_new_tokens):
+    tokenizer = transformers.GPT2Tokenizer.from_pretrained(tiny_gpt2_dir)
+    base = transformers.GPT2LMHeadModel.from_pretrained(tiny_gpt2_dir)
+    base_weights = {name: p.detach().clone() for name, p in base.named_parameters()}
+    new_token_ids = tokenizer.convert_tokens_to_ids([" Medanta, IN", "? Answer:"]) if train_new_tokens else None
+    input_ids = tokenizer(PROMPT, return_tensors="pt")["input_ids"]
+
+    model = add_lora_adapters(base, r=4, alpha=8, dropout=0.0, new_token_ids=new_token_ids)
+    trainable = [name for name, p in model.named_parameters() if p.requires_grad]
+    assert trainable and all("lora_" in name or "trainable_tokens" in name for name in trainable)
+    assert any("trainable_tokens" in name for name in trainable) == train_new_tokens
+    model = train_steps(model, input_ids)
+    with torch.no_grad():
+        expected = model(input_ids=input_ids).logits
+
+    merged = merge_lora_adapters(model)
+    assert type(merged) is transformers.GPT2LMHeadModel
+    merged.save_pretrained(str(tmp_path))
+    loaded = transformers.GPT2LMHeadModel.from_pretrained(str(tmp_path)).eval()
+    with torch.no_grad():
+        logits = loaded(input_ids=input_ids).logits
+    torch.testing.assert_close(logits, expected, rtol=1e-4, atol=1e-4)
+
+    # The adapters changed the attention weights; the embeddings only for the new tokens
+    loaded_weights = dict(loaded.named_parameters())
+    assert not torch.equal(loaded_weights["transformer.h.0.attn.c_attn.weight"], base_weights["transformer.h.0.attn.c_attn.weight"])
+    changed_rows = (loaded_weights["transformer.wte.weight"] != base_weights["transformer.wte.weight"]).any(dim=1).nonzero().flatten().tolist()
+    assert changed_rows == (sorted(new_token_ids) if train_new_tokens else [])
@@ -0,0 +1,25 @@
+from frontier import Frontier, canonicalize_url, entity_key
+
+BRANCH = "https://www.medanta.org/hospitals-near-me/gurugram-hospital"
+
+def test_doctor_listed_under_several_specialities_is_one_entity():
+    links = [f"{BRANCH}/speciality/cardiology/doctor/dr-x/", f"{BRANCH}/speciality/anaesthesiology/doctor/dr-x?utm_source=mail", f"{BRANCH}/speciality/cardiology/doctor/dr-y"]
+    frontier = Frontier()
+    assert frontier.add_links(links) == [f"{BRANCH}/speciality/anaesthesiology/doctor/dr-x", f"{BRANCH}/speciality/cardiology/doctor/dr-y"]
+    assert frontier.duplicates == 1
+    assert canonicalize_url("HTTPS://WWW.Medanta.org:443/a//b/../c/?b=2&a=1#top") == "https://www.medanta.org/a/c?a=1&b=2"
+    assert entity_key(f"{BRANCH}/speciality/cardiology/doctor/dr-x") == entity_key(f"http://medanta.org/hospitals-near-me/gurugram-hospital/speciality/urology/doctor/dr-x/")
+
+def test_earlier_crawls_are_skipped_only_on_request(tmp_path):
+    path = str(tmp_path / "frontier.bin")
+    links = [f"{BRANCH}/speciality/cardiology/doctor/dr-x", f"{BRANCH}/speciality/cardiology/doctor/dr-y"]
+    frontier = Frontier(path)
+    frontier.add_links(links)
+    frontier.mark_crawled(links[0])
+    frontier.save()
+
+    # By default every entity is queued again and the HTTP cache decides what changed
+    assert Frontier(path).add_links(links) == links
+    frontier = Frontier(path)
+    assert frontier.add_links(links, skip_crawled=True) == links[1:]
+    assert frontier.already_crawled == 1
@@ -0,0 +1,76 @@
+import json
+import threading
+
+import pytest
+import requests
+
+pytest.importorskip("transformers")
+
+from deployment_model import load_model
+from inference_server import GenerationRequest, InferenceServer, MicroBatcher, generation_params
+from response_cache import ResponseCache
+
+PROMPTS = [
+    "Question: What is the treatment offered at Medanta, IN? Answer:",
+    "Question: What is the specialization and degree of Dr. Arvinder Singh Soin from Medanta, IN? Answer:",
+    "Hello",
+]
+
+def test_only_finished_completions_are_cached():
+    server = InferenceServer(("127.0.0.1", 0), batcher=None, cache=ResponseCache())
+    try:
+        # A streamed request whose client went away before generation finished
+        request = GenerationRequest("Question: unfinished?", 8)
+        request.decoded = " partial"
+        request.publish()
+        server.remember(request)
+        assert server.cache.get(request.prompt, generation_params(8)) is None
+
+        request.decoded = " complete answer"
+        request.finish()
+        server.remember(request)
+        assert server.cache.get(request.prompt, generation_params(8)) == " complete answer"
+    finally:
+        server.server_close()
+
+
+# Function to greedily decode one prompt on its own, as the batch must reproduce
+def greedy_completion(model, tokenizer, prompt, max_new_tokens):
+    inputs = tokenizer(prompt, return_tensors="pt")
+    outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+    return tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True, spaces_between_special_tokens=False)
+
+@pytest.fixture
+def batcher(tiny_gpt2_dir):
+    model, tokenizer = load_model(tiny_gpt2_dir)
+    batcher = MicroBatcher(model, tokenizer, max_batch_size=4, max_wait_ms=200)
+    yield batcher
+    batcher.close()
+
+def test_micro_batches_decode_like_single_prompts(batcher):
+    prompts = PROMPTS + ["Question: What is the treatment offered at Medanta, IN? Answer: Medanta, IN offers"]
+    requests = [batcher.submit(prompt, 12) for prompt in prompts]
+    completions = [request.result() for request in requests]
+    # Prompts of different lengths share one left-padded batch
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["requests"] == 4
+    for prompt, completion, request in zip(prompts, completions, requests):
+        assert completion == greedy_completion(batcher.model, batcher.tokenizer, prompt, 12)
+        assert 0 < len(request.token_ids) <= 12
+
+def test_http_generate_streams_and_answers_repeats_from_the_cache(batcher):
+    server = InferenceServer(("127.0.0.1", 0), batcher, max_new_tokens=8, cache=ResponseCache())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        streamed = requests.post(f"{url}/generate", json={"prompt": PROMPTS[0], "stream": True}, stream=True, timeout=30)
+        events = [json.loads(line) for line in streamed.iter_lines() if line]
+        assert events[-1]["done"] and events[-1]["source"] == "model"
+        assert "".join(event["token"] for event in events[:-1]) == events[-1]["completion"]
+
+        response = requests.post(f"{url}/generate", json={"prompt": PROMPTS[0]}, timeout=30).json()
+        assert response["source"] == "cache" and response["completion"] == events[-1]["completion"]
+        assert requests.post(f"{url}/generate", json={"prompt": ""}, timeout=30).status_code == 400
+        assert requests.get(f"{url}/health", timeout=30).json()["requests"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import threading
+
+from conftest import ROOT
+from lookup_index import LookupIndex
+
+def test_import_does_not_load_pandas():
+    code = "import sys, lookup_index; sys.exit('pandas' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode == 0
+
+def test_counters_are_exact_under_concurrent_lookups():
+    index = LookupIndex.from_csv_directory(os.path.join(ROOT, "data_training_files"))
+    hospital, name = next(iter(index.doctors))
+    prompts = [
+        f"What is the specialization and degree of Dr. {name} from {hospital}?",
+        f"What is the specialization and degree of Dr. {name}x from {hospital}?",
+        "What is the capital of France?",
+    ]
+    assert all(index.answer(prompt) is not None for prompt in prompts[:2])
+    index = LookupIndex.from_csv_directory(os.path.join(ROOT, "data_training_files"))
+
+    def ask():
+        for _ in range(300):
+            for prompt in prompts:
+                index.answer(prompt)
+
+    threads = [threading.Thread(target=ask) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert index.stats() == {"hits": 8 * 300 * 2, "fuzzy_hits": 8 * 300, "misses": 8 * 300}
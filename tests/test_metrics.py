@@ -0,0 +1,57 @@
+import json
+
+import metrics
+from metrics import EVENTS_FILE, PROMETHEUS_FILE, Metrics, NullMetrics, record_error, record_request
+
+def test_prometheus_text_format(tmp_path):
+    recorder = Metrics(str(tmp_path))
+    recorder.inc("http_requests_total", host="a.org", status=200)
+    recorder.inc("http_requests_total", 2, host="a.org", status=200)
+    recorder.inc("errors_total", stage="fetch", error='Say "hi"\n')
+    recorder.set("db_rows_per_second", 1500.5, table="doctors")
+    for seconds in (0.0005, 0.003, 0.003, 60):
+        recorder.observe("parse_seconds", seconds, page="doctor")
+    recorder.close()
+
+    text = (tmp_path / PROMETHEUS_FILE).read_text(encoding="utf-8")
+    assert text == recorder.prometheus()
+    lines = text.splitlines()
+    assert lines[:5] == [
+        "# TYPE errors_total counter",
+        'errors_total{error="Say \\"hi\\"\\n",stage="fetch"} 1',
+        "# TYPE http_requests_total counter",
+        'http_requests_total{host="a.org",status="200"} 3',
+        "# TYPE db_rows_per_second gauge",
+    ]
+    assert 'db_rows_per_second{table="doctors"} 1500.5' in lines
+    assert "# TYPE parse_seconds histogram" in lines
+    # Buckets are cumulative and end with +Inf
+    assert 'parse_seconds_bucket{page="doctor",le="0.001"} 1' in lines
+    assert 'parse_seconds_bucket{page="doctor",le="0.0025"} 1' in lines
+    assert 'parse_seconds_bucket{page="doctor",le="0.005"} 3' in lines
+    assert 'parse_seconds_bucket{page="doctor",le="30.0"} 3' in lines
+    assert 'parse_seconds_bucket{page="doctor",le="+Inf"} 4' in lines
+    assert 'parse_seconds_sum{page="doctor"} 60.0065' in lines
+    assert lines[-1] == 'parse_seconds_count{page="doctor"} 4'
+
+def test_requests_and_errors_are_logged_as_jsonl(tmp_path, monkeypatch):
+    recorder = Metrics(str(tmp_path))
+    monkeypatch.setattr(metrics, "_metrics", recorder)
+    record_request("https://WWW.Example.org/doctor/a", 304, 0, 0.0123456789, cached=True)
+    record_error("fetch_doctor_details", TimeoutError("timed out"), url="https://www.example.org/doctor/b")
+    recorder.close()
+
+    events = [json.loads(line) for line in (tmp_path / EVENTS_FILE).read_text(encoding="utf-8").splitlines()]
+    assert [event.pop("ts") > 0 for event in events] == [True, True]
+    assert events == [
+        {"event": "http_request", "url": "https://WWW.Example.org/doctor/a", "status": 304, "bytes": 0, "seconds": 0.012346, "cached": True},
+        {"event": "error", "stage": "fetch_doctor_details", "error": "timed out", "url": "https://www.example.org/doctor/b"},
+    ]
+    assert recorder.counters[("http_requests_total", (("host", "www.example.org"), ("status", "304")))] == 1
+    assert recorder.counters[("errors_total", (("error", "TimeoutError"), ("stage", "fetch_doctor_details")))] == 1
+
+def test_metrics_are_off_until_configured(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", NullMetrics())
+    record_request("https://example.org/", 200, 10, 0.1)
+    assert metrics.configure(None) is metrics.get_metrics()
+    assert not metrics.get_metrics().enabled and list(tmp_path.iterdir()) == []
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from conftest import ROOT
+from parquet_dataset import ENTITY_SCHEMAS, entity_path, export_tables, iter_entity_batches, read_entity, write_entity
+from preprocess_csv import DOCTOR_COLUMNS, process_csv_directory, process_parquet_dataset
+
+DOCTORS = [
+    (1, "Dr. A", "Cardiology", "MBBS", "Medanta, IN", "https://example.org/a"),
+    (2, "Dr. B", "Urology", None, "Medanta, IN", "https://example.org/b"),
+    (3, "Dr. C", "Oncology", "MD", "Other Hospital / Delhi", "https://example.org/c"),
+]
+
+# Function to write rows of an entity as one record batch
+def write_rows(rows, entity, root):
+    schema = ENTITY_SCHEMAS[entity]
+    write_entity([pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)], schema=schema)], entity, root)
+
+def test_hospital_partitions_round_trip(tmp_path):
+    root = str(tmp_path)
+    write_rows(DOCTORS, "doctors", root)
+    assert sorted(os.listdir(entity_path("doctors", root))) == ["hospital_name=Medanta%2C%20IN", "hospital_name=Other%20Hospital%20%2F%20Delhi"]
+
+    # Rows missing a required column are dropped, hospitals are pruned by partition
+    df = read_entity("doctors", DOCTOR_COLUMNS, root)
+    assert sorted(df.itertuples(index=False, name=None)) == sorted(row[1:] for row in DOCTORS if None not in row)
+    df = read_entity("doctors", ["name", "hospital_name"], root, hospitals=["Medanta, IN"])
+    assert df.values.tolist() == [["Dr. A", "Medanta, IN"], ["Dr. B", "Medanta, IN"]]
+    assert [len(batch) for batch in iter_entity_batches("doctors", ["name"], root, batch_size=1)] == [1, 1, 1]
+
+    # A new export replaces the old partitions
+    write_rows(DOCTORS[:1], "doctors", root)
+    assert os.listdir(entity_path("doctors", root)) == ["hospital_name=Medanta%2C%20IN"]
+
+def test_exported_tables_give_the_same_training_text_as_the_csvs(pg_conn, tmp_path):
+    import pandas as pd
+
+    data = os.path.join(ROOT, "data_training_files")
+    with pg_conn.cursor() as cur:
+        for entity, schema in ENTITY_SCHEMAS.items():
+            columns = [f"{name} BIGINT" if name == "id" else f"{name} TEXT" for name in schema.names]
+            cur.execute(f"CREATE TABLE {entity} ({', '.join(columns)});")
+            df = pd.read_csv(os.path.join(data, f"{entity}.csv"))
+            cur.executemany(f"INSERT INTO {entity} ({', '.join(df.columns)}) VALUES ({', '.join(['%s'] * len(df.columns))});", df.astype(object).where(df.notna(), None).values.tolist())
+    pg_conn.commit()
+
+    export_tables(pg_conn, root=str(tmp_path / "dataset"))
+    # The Parquet reader drops incomplete rows before they are counted, the CSV path after
+    _, parquet_lines = process_parquet_dataset(str(tmp_path / "dataset"), str(tmp_path / "parquet.txt"))
+    _, csv_lines = process_csv_directory(data, str(tmp_path / "csv.txt"), workers=1)
+    assert parquet_lines == csv_lines > 0
+    assert sorted((tmp_path / "parquet.txt").read_text(encoding="utf-8").split("\n")) == sorted((tmp_path / "csv.txt").read_text(encoding="utf-8").split("\n"))
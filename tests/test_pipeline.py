@@ -0,0 +1,37 @@
+import os
+
+from conftest import ROOT
+from pipeline import MODEL_DIR, HashCache, Stage, build_stages, local_modules
+
+def test_entry_scripts_depend_on_the_modules_doing_the_work():
+    modules = {os.path.basename(path) for path in local_modules(os.path.join(ROOT, "doctor_list_script.py"))}
+    assert {"sitemap.py", "extractors.py", "crawler.py", "http_cache.py"} <= modules
+    modules = {os.path.basename(path) for path in local_modules(os.path.join(ROOT, "fine_tunning.py"))}
+    assert {"token_shards.py", "corpus_encoding.py", "dedup.py", "evaluation.py"} <= modules
+    # parquet_dataset only imports doctor_detail_script when run as a script
+    assert "doctor_detail_script.py" not in modules
+
+def test_fingerprint_changes_with_an_imported_module(tmp_path):
+    (tmp_path / "stage.py").write_text("import helper\n", encoding="utf-8")
+    (tmp_path / "helper.py").write_text("def work():\n    from inner import run\n", encoding="utf-8")
+    (tmp_path / "inner.py").write_text("run = 1\n", encoding="utf-8")
+    (tmp_path / "tool.py").write_text("x = 1\n", encoding="utf-8")
+    with open(tmp_path / "helper.py", "a", encoding="utf-8") as f:
+        f.write("if __name__ == \"__main__\":\n    import tool\n")
+    stage = Stage("stage", str(tmp_path / "stage.py"))
+    assert local_modules(stage.script) == [str(tmp_path / "helper.py"), str(tmp_path / "inner.py")]
+
+    before = stage.fingerprint(HashCache())
+    (tmp_path / "tool.py").write_text("x = 2\n", encoding="utf-8")
+    assert stage.fingerprint(HashCache()) == before
+    (tmp_path / "inner.py").write_text("run = 2\n", encoding="utf-8")
+    assert stage.fingerprint(HashCache()) != before
+
+# Function to get the declared outputs of the train stage
+def train_outputs(train_args):
+    return [stage for stage in build_stages(train_args=train_args) if stage.name == "train"][0].outputs
+
+def test_train_stage_outputs_follow_final_dir():
+    assert train_outputs([]) == [MODEL_DIR]
+    assert train_outputs(["--mode", "lora", "--final-dir", "models/lora"]) == [os.path.normpath("models/lora")]
+    assert train_outputs(["--final-dir=./models/full/", "--epochs", "1"]) == [os.path.normpath("models/full")]
@@ -0,0 +1,87 @@
+import os
+import re
+import shutil
+
+import pandas as pd
+
+from conftest import ROOT
+from preprocess_csv import process_csv_directory
+
+# Function to drop the "Dr." title of scraped names, as the templates now do
+def strip_title(name):
+    return re.sub(r"^(?:Dr\.?\s+)+", "", str(name))
+
+# The per-row df.apply formatting the vectorized templates replaced
+def per_row_lines(directory):
+    lines = []
+    for filename in sorted(os.listdir(directory)):
+        df = pd.read_csv(os.path.join(directory, filename))
+        if "doctors" in filename:
+            df = df.dropna(subset=['id', 'name', 'specialization', 'degree', 'hospital_name', 'link'])
+            lines += df.apply(
+                lambda row: (
+                    f"Question: What is the specialization and degree of Dr. {strip_title(row['name'])} from {row['hospital_name']}?"
+                    f" Answer: Dr. {strip_title(row['name'])} specializes in {row['specialization']} and holds the degree {row['degree']}. Find more at {row['link']}."
+                ),
+                axis=1,
+            ).tolist()
+        else:
+            df = df.dropna(subset=['id', 'treatment_name', 'treatment_link', 'hospital_name'])
+            lines += df.apply(
+                lambda row: (
+                    f"Question: What is the treatment offered at {row['hospital_name']}?"
+                    f" Answer: {row['hospital_name']} offers treatment for {row['treatment_name']}. Learn more at {row['treatment_link']}."
+                ),
+                axis=1,
+            ).tolist()
+    return lines
+
+# Function to write a doctors and a treatments CSV with incomplete and numeric values
+def write_csvs(directory):
+    directory.mkdir()
+    pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "name": ["Dr. A", "B", "Dr Dr. C", None],
+        "specialization": ["Cardiology", "Urology", None, "X"],
+        "degree": ["MBBS", 5, "MD", "MD"],
+        "hospital_name": ["Medanta, IN"] * 4,
+        "link": ["https://example.org/a", "https://example.org/b", "https://example.org/c", "https://example.org/d"],
+    }).to_csv(directory / "doctors.csv", index=False)
+    pd.DataFrame({
+        "id": range(7),
+        "treatment_name": [f"Treatment {i}" if i != 3 else None for i in range(7)],
+        "treatment_link": [f"https://example.org/t/{i}" for i in range(7)],
+        "hospital_name": ["Medanta, IN", "Other"] * 3 + ["Medanta, IN"],
+    }).to_csv(directory / "treatments.csv", index=False)
+
+def test_matches_the_per_row_output_in_chunks_and_in_parallel(tmp_path):
+    data = tmp_path / "data"
+    write_csvs(data)
+    expected = per_row_lines(data)
+    assert len(expected) == 8
+    for workers, chunksize in ((1, 50000), (1, 2), (2, 3)):
+        output = tmp_path / f"out-{workers}-{chunksize}.txt"
+        rows, lines = process_csv_directory(str(data), str(output), workers=workers, chunksize=chunksize)
+        assert (rows, lines) == (11, 8)
+        assert output.read_text(encoding="utf-8").split("\n") == expected
+
+def test_writes_the_qa_lines_of_every_csv(tmp_path):
+    data = tmp_path / "data"
+    shutil.copytree(os.path.join(ROOT, "data_training_files"), data)
+    output = tmp_path / "training_data.txt"
+    rows, lines = process_csv_directory(str(data), str(output), workers=1)
+    assert lines > 0
+    written = output.read_text(encoding="utf-8")
+    assert written.startswith("Question: ") and written.count("Question: ") == lines
+    assert sorted(os.listdir(tmp_path)) == ["data", "training_data.txt"]
+
+def test_no_usable_csv_keeps_the_previous_output(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "doctors.csv").write_text("id,name\n1,Someone\n", encoding="utf-8")
+    (data / "notes.csv").write_text("a,b\n1,2\n", encoding="utf-8")
+    output = tmp_path / "training_data.txt"
+    output.write_text("Question: kept? Answer: yes.", encoding="utf-8")
+    assert process_csv_directory(str(data), str(output), workers=1) == (0, 0)
+    assert output.read_text(encoding="utf-8") == "Question: kept? Answer: yes."
+    assert sorted(os.listdir(tmp_path)) == ["data", "training_data.txt"]
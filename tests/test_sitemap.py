@@ -0,0 +1,45 @@
+import json
+import os
+import shutil
+
+from conftest import FIXTURES_DIR
+from sitemap import REGISTRY_PATH, run_sitemap_stage
+
+# Function to read the names saved for a section file
+def saved_names(path, key):
+    with open(path, "r", encoding="utf-8") as file:
+        return {item["Name"] for item in json.load(file)[key]}
+
+def test_each_section_sees_a_sitemap_change(serve_directory, tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    site.mkdir()
+    sitemap = site / "sitemap.html"
+    shutil.copyfile(os.path.join(FIXTURES_DIR, "sitemap.html"), sitemap)
+    base = serve_directory(str(site))
+
+    with open(REGISTRY_PATH, "r", encoding="utf-8") as file:
+        registry = json.load(file)
+    registry["hospitals"] = registry["hospitals"][:1]
+    registry["hospitals"][0]["sitemap_url"] = f"{base}/sitemap.html"
+    registry_path = tmp_path / "hospitals.json"
+    registry_path.write_text(json.dumps(registry), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    cache_path = str(tmp_path / "cache.sqlite3")
+
+    # doctor_list_script and treatment_list share the cache and the sitemap
+    run_sitemap_stage(str(registry_path), ["doctors"], cache_path)
+    run_sitemap_stage(str(registry_path), ["treatments"], cache_path)
+    assert "Sports Injuries" in saved_names("treatment_list.json", "treatments")
+
+    html = sitemap.read_text(encoding="utf-8")
+    html = html.replace("Sports Injuries<", "Sports Injury Care<").replace("Dr. Arvinder Singh Soin<", "Dr. A. S. Soin<")
+    sitemap.write_text(html, encoding="utf-8")
+    # Last-Modified has a resolution of one second
+    modified = os.path.getmtime(sitemap) + 10
+    os.utime(sitemap, (modified, modified))
+
+    run_sitemap_stage(str(registry_path), ["doctors"], cache_path)
+    run_sitemap_stage(str(registry_path), ["treatments"], cache_path)
+    assert "Dr. A. S. Soin" in saved_names("hospital_data.json", "doctors")
+    treatments = saved_names("treatment_list.json", "treatments")
+    assert "Sports Injury Care" in treatments and "Sports Injuries" not in treatments
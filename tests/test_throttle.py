@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import throttle
+from crawler import Crawler
+from throttle import CircuitBreaker, CircuitOpenError, HostThrottle, run_throttling_server
+
+# Function to build the error raise_for_status gives for a status (and Retry-After)
+def http_error(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return requests.HTTPError(f"{status} error", response=response)
+
+# Function to get a send() that raises the given errors in turn, then returns "ok"
+def failing_send(*errors):
+    errors = list(errors)
+
+    def send():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    return send
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(throttle, "BACKOFF_BASE", 0.001)
+
+def test_crawl_gets_every_page_from_a_throttling_server():
+    server, state = run_throttling_server(0, capacity=2, failure_rate=0.05, latency=0.02)
+    try:
+        urls = [f"http://127.0.0.1:{server.server_address[1]}/page/{i}" for i in range(80)]
+        with Crawler(max_workers=32, per_host_concurrency=16, requests_per_second=0, max_per_host_concurrency=16) as crawler:
+            results = {url: page for url, page, _ in crawler.crawl(urls, lambda url, page: page.content)}
+            breaker = crawler.host_pool(urls[0]).throttle.breaker
+    finally:
+        server.shutdown()
+        server.server_close()
+    # The burst above capacity was answered with 429s, yet nothing was dropped
+    assert state["rejected"] > 0
+    assert all(results[url] for url in urls)
+    assert breaker.opened_at is None
+
+def test_throttle_responses_do_not_open_the_circuit():
+    host = HostThrottle("example.org", 4, max_retries=0)
+    send = failing_send(*[http_error(429, "0") for _ in range(8)], http_error(503, "0"))
+    assert host.run(send)[0] == "ok"
+    assert host.breaker.failures == 0 and host.breaker.opened_at is None
+
+def test_open_circuit_waits_for_a_trial_instead_of_failing():
+    host = HostThrottle("example.org", 4, max_retries=5)
+    host.breaker = CircuitBreaker(threshold=2, reset_timeout=0.1)
+    send = failing_send(requests.ConnectionError(), http_error(503), http_error(500))
+    start = time.monotonic()
+    assert host.run(send)[0] == "ok"
+    # Opened after two failures, then one failed and one successful trial
+    assert time.monotonic() - start >= 0.2
+    assert host.breaker.opened_at is None
+
+def test_requests_queue_behind_the_trial():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.acquire("example.org") is True
+    waiting = []
+    thread = threading.Thread(target=lambda: waiting.append(breaker.acquire("example.org")))
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    breaker.record_success()
+    thread.join(1)
+    assert waiting == [False]
+
+def test_host_counts_as_down_after_failed_trials():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.01, max_trials=2)
+    breaker.record_failure()
+    for _ in range(2):
+        assert breaker.acquire("example.org") is True
+        breaker.record_failure(trial=True)
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire("example.org")
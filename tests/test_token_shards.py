@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from token_shards import ShardedBlockDataset, build_shards, load_index
+
+# Stands in for a Hugging Face tokenizer: every character is one token, with IDs near
+# the top of the uint16 range (beyond what a signed 16-bit shard could hold)
+class CharTokenizer:
+    name_or_path = "chars"
+
+    def __init__(self, vocab_size=65536):
+        self.vocab_size = vocab_size
+
+    def __len__(self):
+        return self.vocab_size
+
+    def get_added_vocab(self):
+        return {}
+
+    def ids(self, text):
+        return [self.vocab_size - 1 - ord(char) % 1000 for char in text]
+
+    def __call__(self, lines, add_special_tokens=True):
+        return {"input_ids": [self.ids(line) for line in lines]}
+
+# Function to write a text file and return its path
+def write_text(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.write(text)
+    return path
+
+def test_blocks_are_the_token_stream_cut_per_file(tmp_path):
+    tokenizer = CharTokenizer()
+    first = write_text(tmp_path, "a.txt", "Question: one?\nAnswer: yes.\n" * 3)
+    second = write_text(tmp_path, "b.txt", "short")
+    third = write_text(tmp_path, "c.txt", "Question: two?\nAnswer: no.")
+    shard_dir = str(tmp_path / "shards")
+    dataset = ShardedBlockDataset.from_files([first, second, third], tokenizer, shard_dir, block_size=8)
+
+    # Blocks never span files; a file's trailing partial block is dropped
+    expected = []
+    for path in (first, second, third):
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            ids = tokenizer.ids(file.read())
+        expected += [ids[start:start + 8] for start in range(0, len(ids) - 7, 8)]
+    assert len(dataset) == len(expected) == 84 // 8 + 0 + 26 // 8
+    assert dataset.block_offsets == [0, 84 // 8]
+    assert [dataset[i].tolist() for i in range(len(dataset))] == expected
+    assert dataset[-1].tolist() == expected[-1]
+    assert dataset[0].dtype == torch.int64 and min(map(min, expected)) > np.iinfo(np.int16).max
+    with pytest.raises(IndexError):
+        dataset[len(dataset)]
+
+    # Shards hold the raw tokens as uint16
+    entry = load_index(shard_dir)["files"][os.path.abspath(first)]
+    assert entry["tokens"] == 84
+    assert os.path.getsize(os.path.join(shard_dir, entry["shard"])) == 84 * np.dtype(np.uint16).itemsize
+
+def test_only_changed_files_are_tokenized_again(tmp_path, capsys):
+    tokenizer = CharTokenizer()
+    first = write_text(tmp_path, "a.txt", "first file")
+    second = write_text(tmp_path, "b.txt", "second file")
+    shard_dir = str(tmp_path / "shards")
+    old = build_shards([first, second], tokenizer, shard_dir)
+    capsys.readouterr()
+
+    write_text(tmp_path, "b.txt", "second file, edited")
+    new = build_shards([first, second], tokenizer, shard_dir)
+    assert capsys.readouterr().out.count("Tokenizing") == 1
+    assert new[0] == old[0] and new[1]["tokens"] == 19
+    assert sorted(os.listdir(shard_dir)) == sorted(["index.json", new[0]["shard"], new[1]["shard"]])
+
+def test_vocabulary_beyond_uint16_is_rejected(tmp_path):
+    path = write_text(tmp_path, "a.txt", "text")
+    with pytest.raises(ValueError):
+        build_shards([path], CharTokenizer(65537), str(tmp_path / "shards"))
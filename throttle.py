@@ -0,0 +1,363 @@
+import argparse
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import get_metrics
+
+# Retry settings: up to DEFAULT_MAX_RETRIES more attempts, waiting a random time up to
+# BACKOFF_BASE * 2^attempt (capped at BACKOFF_MAX), or longer when the host sends Retry-After
+DEFAULT_MAX_RETRIES = 3
+# Extra attempts for throttle responses (429 or Retry-After): the host is up and only
+# asks us to wait, so these do not use up the retries for failures
+THROTTLE_RETRIES = 10
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+MAX_RETRY_AFTER = 120.0
+
+# Responses that mean "slow down" and responses worth another try
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Per-host concurrency moves between these bounds
+MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 16
+
+# A response slower than this multiple of the host's usual latency counts as congestion
+LATENCY_FACTOR = 3.0
+
+# Consecutive failures that open a host's circuit, and how long it stays open
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30.0
+# Failed trial requests in a row after which the host counts as down
+BREAKER_MAX_TRIALS = 3
+
+# Raised instead of sending a request to a host that counts as down
+class CircuitOpenError(Exception):
+    pass
+
+# Function to parse a Retry-After header (seconds or an HTTP date) into seconds
+def parse_retry_after(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+# AIMD concurrency limit for one host: each success adds 1/limit (about +1 per round
+# of requests) while latency stays near the host's usual level; a 429/503, a timeout
+# or a latency spike halves it, at most once per round trip.
+class AdaptiveConcurrency:
+    def __init__(self, initial, maximum=DEFAULT_MAX_CONCURRENCY, minimum=MIN_CONCURRENCY, latency_factor=LATENCY_FACTOR):
+        self.maximum = max(maximum, initial)
+        self.minimum = minimum
+        self.limit = float(initial)
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.smoothed = None
+        self.baseline = None
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def on_success(self, seconds):
+        with self.condition:
+            self.smoothed = seconds if self.smoothed is None else 0.8 * self.smoothed + 0.2 * seconds
+            # The baseline follows the fastest latency seen, drifting up slowly so a host
+            # that became slower for good is not treated as congested forever
+            if self.baseline is None or self.smoothed < self.baseline:
+                self.baseline = self.smoothed
+            else:
+                self.baseline += 0.01 * (self.smoothed - self.baseline)
+            if seconds > self.latency_factor * self.baseline:
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self.condition.notify_all()
+
+    def on_congestion(self):
+        with self.condition:
+            self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self.last_decrease < (self.smoothed or 0.0):
+            return
+        self.limit = max(self.minimum, self.limit / 2)
+        self.last_decrease = now
+
+# Stops sending requests to a host after `threshold` consecutive failures. Requests
+# for the host wait while the circuit is open; after `reset_timeout` seconds one of
+# them is let through as a trial, and its outcome closes the circuit again (the
+# others go ahead) or re-opens it. Once `max_trials` trials in a row failed the host
+# counts as down and the waiting requests fail with CircuitOpenError.
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET, max_trials=BREAKER_MAX_TRIALS):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_trials = max_trials
+        self.failures = 0
+        self.failed_trials = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.condition = threading.Condition()
+
+    # Function to wait until a request may be sent; returns True when it is the trial
+    # request of an open circuit, which must report back with trial=True
+    def acquire(self, host):
+        with self.condition:
+            while self.opened_at is not None:
+                if self.failed_trials >= self.max_trials:
+                    raise CircuitOpenError(f"Circuit open for {host} after {self.failures} consecutive failures")
+                remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                if remaining <= 0 and not self.trial_running:
+                    self.trial_running = True
+                    return True
+                self.condition.wait(remaining if remaining > 0 else None)
+            return False
+
+    def record_success(self):
+        with self.condition:
+            self.failures = 0
+            self.failed_trials = 0
+            self.opened_at = None
+            self.trial_running = False
+            self.condition.notify_all()
+
+    # Function to count a failure; returns True when it opened the circuit
+    def record_failure(self, trial=False):
+        with self.condition:
+            self.failures += 1
+            if trial:
+                self.trial_running = False
+                self.failed_trials += 1
+                self.opened_at = time.monotonic()
+                self.condition.notify_all()
+                return True
+            if self.opened_at is None and self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    # Function to note a throttle response: it says nothing about the host failing, but
+    # a trial that got one has to hand the trial on
+    def record_throttled(self, trial=False):
+        if trial:
+            with self.condition:
+                self.trial_running = False
+                self.condition.notify_all()
+
+# Function to get the HTTP status behind a failed request, if there was a response
+def error_status(error):
+    response = getattr(error, "response", None)
+    return response.status_code if response is not None else None
+
+# Function to tell whether a failed response asks us to slow down (429, or anything
+# sent with Retry-After) rather than showing that the host is failing
+def is_throttle_response(status, retry_after):
+    return status == 429 or retry_after is not None
+
+# Function to tell whether a failed request is worth retrying
+def is_retryable(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return error_status(error) in RETRY_STATUSES
+
+# Throttling state for one host: adaptive concurrency, circuit breaker, and a shared
+# pause when the host asks for one with Retry-After
+class HostThrottle:
+    def __init__(self, host, initial_concurrency, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES):
+        self.host = host
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, max_concurrency)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_for_pause(self):
+        with self.lock:
+            delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    # Function to get the wait before retry number `attempt` (0-based): full-jitter
+    # exponential backoff, but never shorter than the host's Retry-After
+    def backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, MAX_RETRY_AFTER))
+        return delay
+
+    # Function to run send() (one request that raises on failure, e.g. after
+    # raise_for_status) under this host's limits, retrying transient failures.
+    # Throttle responses lower the concurrency and pause the host but do not count
+    # toward its circuit breaker. before() runs inside the concurrency slot, right
+    # before each attempt. Returns (result, seconds taken by the successful attempt).
+    def run(self, send, before=None):
+        metrics = get_metrics()
+        attempt = 0
+        throttled_attempts = 0
+        while True:
+            trial = self.breaker.acquire(self.host)
+            self.wait_for_pause()
+            with self.concurrency:
+                if before is not None:
+                    before()
+                start = time.perf_counter()
+                try:
+                    result = send()
+                    error = None
+                except Exception as e:
+                    result = None
+                    error = e
+                seconds = time.perf_counter() - start
+
+            if error is None or not is_retryable(error):
+                # Any response below 500 (a 404 included) shows the host is healthy
+                self.breaker.record_success()
+                if error is None:
+                    self.concurrency.on_success(seconds)
+                metrics.set("host_concurrency_limit", self.concurrency.limit, host=self.host)
+                if error is not None:
+                    raise error
+                return result, seconds
+
+            status = error_status(error)
+            retry_after = parse_retry_after(error.response.headers.get("Retry-After")) if status else None
+            throttled = is_throttle_response(status, retry_after)
+            if throttled or status in THROTTLE_STATUSES or isinstance(error, requests.Timeout):
+                self.concurrency.on_congestion()
+            metrics.set("host_concurrency_limit", self.concurrency.limit, host=self.host)
+            if throttled:
+                self.breaker.record_throttled(trial)
+            elif self.breaker.record_failure(trial):
+                metrics.inc("circuit_opened_total", host=self.host)
+                metrics.event("circuit_open", host=self.host, failures=self.breaker.failures, error=str(error))
+            if retry_after is not None:
+                self.pause(min(retry_after, MAX_RETRY_AFTER))
+            if throttled and throttled_attempts < THROTTLE_RETRIES:
+                delay = self.backoff(throttled_attempts, retry_after)
+                throttled_attempts += 1
+            elif attempt >= self.max_retries:
+                raise error
+            else:
+                delay = self.backoff(attempt, retry_after)
+                attempt += 1
+            metrics.inc("http_retries_total", host=self.host, reason=status or type(error).__name__)
+            time.sleep(delay)
+
+# Throttles for one-off requests made outside a Crawler, shared per host in this process
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+def host_throttle(url, initial_concurrency=4, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES):
+    host = urlsplit(url).netloc.lower()
+    with _hosts_lock:
+        throttle = _hosts.get(host)
+        if throttle is None:
+            throttle = _hosts[host] = HostThrottle(host, initial_concurrency, max_concurrency, max_retries)
+        return throttle
+
+# Function to GET a URL through its host's throttle; raises like raise_for_status
+def throttled_get(url, session=None, timeout=10, **kwargs):
+    get = session.get if session is not None else requests.get
+
+    def send():
+        response = get(url, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    return host_throttle(url).run(send)[0]
+
+# Local test server: serves small pages, but answers 429 with Retry-After whenever
+# more than `capacity` requests are in flight, and fails a share of requests with a
+# plain 503 (no Retry-After, so they count as failures)
+def run_throttling_server(port, capacity, failure_rate, latency):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"in_flight": 0, "rejected": 0, "served": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                state["in_flight"] += 1
+                overloaded = state["in_flight"] > capacity
+            try:
+                if overloaded or random.random() < failure_rate:
+                    with lock:
+                        state["rejected"] += 1
+                    self.send_response(429 if overloaded else 503)
+                    if overloaded:
+                        self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(latency)
+                body = f"<html><body><p>{self.path}</p></body></html>".encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    state["served"] += 1
+            finally:
+                with lock:
+                    state["in_flight"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+# Crawl a local server that throttles above a fixed concurrency and report how the
+# adaptive limit settles
+if __name__ == "__main__":
+    from crawler import Crawler
+
+    parser = argparse.ArgumentParser(description="Crawl a local throttling server to check adaptive concurrency, retries and backoff.")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--capacity", type=int, default=6, help="Concurrent requests the server accepts before answering 429")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="Share of requests failed with 503")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the server takes per page")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--per-host", type=int, default=2, help="Initial per-host concurrency")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+
+    server, state = run_throttling_server(args.port, args.capacity, args.failure_rate, args.latency)
+    urls = [f"http://127.0.0.1:{args.port}/page/{i}" for i in range(args.pages)]
+    start = time.perf_counter()
+    with Crawler(args.workers, args.per_host, requests_per_second=0, max_per_host_concurrency=DEFAULT_MAX_CONCURRENCY) as crawler:
+        fetched = sum(1 for _, page, _ in crawler.crawl(urls, lambda url, page: page) if page is not None)
+        limit = crawler.host_pool(urls[0]).throttle.concurrency.limit
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    print(f"Fetched {fetched}/{args.pages} pages in {elapsed:.1f}s ({fetched / elapsed:.1f} pages/sec); "
+          f"server rejected {state['rejected']} requests; final concurrency limit {limit:.1f} (server capacity {args.capacity}).")
@@ -0,0 +1,141 @@
+import bisect
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+# Directory holding the token shards and their index
+DEFAULT_SHARD_DIR = "token_shards"
+INDEX_FILE = "index.json"
+
+# Lines tokenized per batch call
+TOKENIZE_BATCH_LINES = 1000
+
+# Function to hash a file's content without reading it into memory at once
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to identify a tokenizer, so shards are rebuilt when the vocabulary changes
+def tokenizer_fingerprint(tokenizer):
+    fingerprint = f"{tokenizer.name_or_path}:{len(tokenizer)}"
+    added = tokenizer.get_added_vocab()
+    if len(added) > 1:
+        # Domain tokens (beyond <|endoftext|>) change how text splits, not just the size
+        fingerprint += ":" + hashlib.sha256(json.dumps(added, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return fingerprint
+
+# Function to load the shard index (or an empty one)
+def load_index(shard_dir):
+    path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Function to save the shard index atomically
+def save_index(shard_dir, index):
+    path = os.path.join(shard_dir, INDEX_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+# Function to yield token ID arrays for a text file, a batch of lines at a time
+def iter_token_ids(path, tokenizer):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = []
+        for line in f:
+            lines.append(line)
+            if len(lines) == TOKENIZE_BATCH_LINES:
+                yield from tokenizer(lines, add_special_tokens=False)["input_ids"]
+                lines = []
+        if lines:
+            yield from tokenizer(lines, add_special_tokens=False)["input_ids"]
+
+# Function to tokenize one text file into a uint16 shard; returns the number of tokens
+def write_shard(path, tokenizer, shard_path):
+    if len(tokenizer) > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"Vocabulary of {len(tokenizer)} tokens does not fit in uint16 shards")
+    tokens = 0
+    with open(shard_path + ".tmp", "wb") as shard:
+        for ids in iter_token_ids(path, tokenizer):
+            np.asarray(ids, dtype=np.uint16).tofile(shard)
+            tokens += len(ids)
+    os.replace(shard_path + ".tmp", shard_path)
+    return tokens
+
+# Function to make sure every input file has an up-to-date shard; only files whose
+# content hash (or the tokenizer) changed are re-tokenized. Returns the shard entries.
+def build_shards(paths, tokenizer, shard_dir=DEFAULT_SHARD_DIR):
+    os.makedirs(shard_dir, exist_ok=True)
+    index = load_index(shard_dir)
+    fingerprint = tokenizer_fingerprint(tokenizer)
+    entries = []
+    for path in paths:
+        key = os.path.abspath(path)
+        content_hash = file_hash(path)
+        entry = index["files"].get(key)
+        shard_name = f"{content_hash[:16]}-{hashlib.sha256(fingerprint.encode()).hexdigest()[:8]}.bin"
+        up_to_date = (
+            entry is not None
+            and entry["hash"] == content_hash
+            and entry["tokenizer"] == fingerprint
+            and os.path.exists(os.path.join(shard_dir, entry["shard"]))
+        )
+        if up_to_date:
+            print(f"Token shard for {path} is up to date ({entry['tokens']} tokens).")
+        else:
+            print(f"Tokenizing {path}...")
+            tokens = write_shard(path, tokenizer, os.path.join(shard_dir, shard_name))
+            if entry is not None and entry["shard"] != shard_name:
+                stale = os.path.join(shard_dir, entry["shard"])
+                if os.path.exists(stale):
+                    os.remove(stale)
+            entry = {"hash": content_hash, "tokenizer": fingerprint, "shard": shard_name, "tokens": tokens}
+            index["files"][key] = entry
+            save_index(shard_dir, index)
+        entries.append(entry)
+    return entries
+
+# Fixed-size blocks of token IDs served straight out of memory-mapped shards.
+# Each shard contributes tokens // block_size blocks; block_offsets[i] is the
+# global index of shard i's first block.
+class ShardedBlockDataset(Dataset):
+    def __init__(self, entries, shard_dir=DEFAULT_SHARD_DIR, block_size=128):
+        self.block_size = block_size
+        self.shards = []
+        self.block_offsets = []
+        total_blocks = 0
+        for entry in entries:
+            blocks = entry["tokens"] // block_size
+            if not blocks:
+                continue
+            self.shards.append(np.memmap(os.path.join(shard_dir, entry["shard"]), dtype=np.uint16, mode="r"))
+            self.block_offsets.append(total_blocks)
+            total_blocks += blocks
+        self.total_blocks = total_blocks
+
+    # Function to build (or reuse) the shards for the given files and open them
+    @classmethod
+    def from_files(cls, paths, tokenizer, shard_dir=DEFAULT_SHARD_DIR, block_size=128):
+        return cls(build_shards(paths, tokenizer, shard_dir), shard_dir, block_size)
+
+    def __len__(self):
+        return self.total_blocks
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.total_blocks
+        if not 0 <= i < self.total_blocks:
+            raise IndexError(i)
+        shard_index = bisect.bisect_right(self.block_offsets, i) - 1
+        start = (i - self.block_offsets[shard_index]) * self.block_size
+        # The memmap slice is a view; only this block is widened to int64 for the model
+        block = self.shards[shard_index][start:start + self.block_size]
+        return torch.from_numpy(block.astype(np.int64))
@@ -1,6 +1,12 @@
+import argparse
 import json
 import psycopg2
 
+from bulk_loader import BulkLoader, DEFAULT_BATCH_SIZE, migrate_canonical_links
+from frontier import Frontier, canonicalize_url
+from metrics import configure as configure_metrics, record_error
+from parquet_dataset import export_tables
+
 # PostgreSQL Configuration
 DB_CONFIG = {
     "dbname": "postgres",
@@ -10,7 +16,7 @@ DB_CONFIG = {
     "port": 5432,
 }
 
-# Hardcoded hospital name
+# Hospital used for treatments saved before the registry recorded one per entry
 HOSPITAL_NAME = "Medanta, IN"
 
 # Function to connect to PostgreSQL
@@ -33,29 +39,45 @@ def create_treatments_table(conn):
             hospital_name TEXT
         );
         """
+        # Keep only the newest row per link so re-runs can upsert on it
+        dedupe_query = """
+        DELETE FROM treatments a USING treatments b
+        WHERE a.treatment_link = b.treatment_link AND a.id < b.id;
+        """
+        index_query = "CREATE UNIQUE INDEX IF NOT EXISTS treatments_link_key ON treatments (treatment_link);"
         with conn.cursor() as cur:
             cur.execute(query)
+            cur.execute(dedupe_query)
+            cur.execute(index_query)
             conn.commit()
+        # Links are stored canonicalized; rewrite rows saved from raw hrefs
+        migrated = migrate_canonical_links(conn, "treatments", "treatment_link")
+        if migrated:
+            print(f"Canonicalized the links of {migrated} existing treatment rows.")
         print("Treatments table created successfully.")
     except Exception as e:
         print(f"Error creating treatments table: {e}")
 
-# Function to insert data into the treatments table
-def insert_treatments_data(conn, treatments):
+# Function to insert data into the treatments table; existing links are
+# updated only when one of their fields actually changed
+def insert_treatments_data(conn, treatments, batch_size=DEFAULT_BATCH_SIZE):
     try:
-        query = """
-        INSERT INTO treatments (treatment_name, treatment_link, hospital_name)
-        VALUES (%s, %s, %s);
-        """
-        with conn.cursor() as cur:
-            cur.executemany(query, treatments)
-            conn.commit()
-        print(f"Inserted {len(treatments)} treatment records successfully.")
+        columns = ("treatment_name", "treatment_link", "hospital_name")
+        with BulkLoader(conn, "treatments", columns, "treatment_link", batch_size) as loader:
+            loader.add_many(treatments)
+        loader.report()
     except Exception as e:
         print(f"Error inserting data into treatments table: {e}")
+        record_error("insert_treatments_data", e)
 
 # Main Function
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load treatment_list.json into PostgreSQL.")
+    parser.add_argument("--parquet-dir", help="Also export the treatments table to this partitioned Parquet dataset")
+    parser.add_argument("--metrics-dir", help="Write DB metrics here as metrics.jsonl and metrics.prom (default: $METRICS_DIR)")
+    args = parser.parse_args()
+    configure_metrics(args.metrics_dir)
+
     # Load treatments from JSON file
     try:
         with open("treatment_list.json", "r", encoding="utf-8") as file:
@@ -68,11 +90,16 @@ if __name__ == "__main__":
     if not treatments:
         print("No treatments found in the JSON file.")
     else:
-        # Prepare data with hardcoded hospital_name
-        treatments_data = [
-            (treatment["Name"], treatment["Link"], HOSPITAL_NAME) 
-            for treatment in treatments
-        ]
+        # Prepare data with the hospital recorded by the sitemap stage, one row per
+        # treatment even when several specialities list it
+        links = set(Frontier().add_links(treatment["Link"] for treatment in treatments))
+        treatments_data = []
+        for treatment in treatments:
+            link = canonicalize_url(treatment["Link"])
+            if link in links:
+                links.discard(link)
+                treatments_data.append((treatment["Name"], link, treatment.get("Hospital", HOSPITAL_NAME)))
+        print(f"Loading {len(treatments_data)} of {len(treatments)} treatments after removing duplicate links.")
 
         # Connect to PostgreSQL
         conn = connect_to_postgres()
@@ -82,5 +109,9 @@ if __name__ == "__main__":
             # Insert treatments data into the table
             insert_treatments_data(conn, treatments_data)
 
+            # Hand the full table over to preprocessing as Parquet
+            if args.parquet_dir:
+                export_tables(conn, ["treatments"], args.parquet_dir)
+
             # Close the connection
             conn.close()